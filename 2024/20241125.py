@@ -2,6 +2,8 @@
 #import requests
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 import pytz
 
@@ -26,6 +28,11 @@ headers = {
 # Add debug prints
 print("Headers being sent:", headers)
 
+# One pooled keep-alive session for every Notion request, retrying 429/5xx with backoff (honours Retry-After)
+session = requests.Session()
+session.mount("https://", HTTPAdapter(max_retries=Retry(
+    total=5, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=None)))
+
 # Rest of your code...
 
 def fetch_tasks():
@@ -42,7 +49,7 @@ def fetch_tasks():
     # Add debug prints
     print("Payload being sent:", payload)
 
-    response = requests.post(url, json=payload, headers=headers)
+    response = session.post(url, json=payload, headers=headers)
     print("Response status:", response.status_code)
     print("Response body:", response.text)
     response.raise_for_status()
@@ -96,12 +103,12 @@ def fetch_completed_tasks_by_date(target_date):
         'page_size': 100
     }
     
-    response = requests.post(f"https://api.notion.com/v1/databases/{DATABASE_ID}/query", 
-                           json=payload, 
-                           headers=headers)
+    response = session.post(f"https://api.notion.com/v1/databases/{DATABASE_ID}/query", 
+                            json=payload, headers=headers)
     response.raise_for_status()
+    result = response.json()
     
-    tasks = response.json()['results']
+    tasks = result['results']
     print(f"\nTasks completed on {target_date.strftime('%Y-%m-%d')} (Austin, TX time):")
     for task in tasks:
         try:
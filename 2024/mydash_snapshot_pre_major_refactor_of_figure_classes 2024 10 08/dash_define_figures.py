@@ -45,26 +45,23 @@ def make_weather_figures(hourly_dataframe, daily_dataframe):
     fig_day.update_layout(title="Daily Sunrise")
     return(fig_hr, fig_hr2, fig_day)
 
-def habits_from_df_to_figures(dfs_habits):
-
-    #define a class to contain all the habit figures
-    class figs_habits:
-        def __init__(self):
-            self.heatmap = None
-            self.bars = None
-            self.line_LxD = None
-            self.perhabit_lines_LxD = None
-            self.wkday_summary = None
-            self.perhabit_summary = None
-
-    figs_habits = figs_habits()  #Create an instance of the class
+def loading_figure():
+    #empty placeholder shown in a grid cell until its data has been loaded
+    fig_loading = go.Figure()
+    fig_loading.update_layout(
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        annotations=[dict(text='Loading...', showarrow=False, font=dict(size=20, color='#888888'))]
+    )
+    return fig_loading
 
+def habits_heatmap_figure(z):
+    #heatmap figure from a list of lists (rows: month in year, columns: day in month)
     month = list(range(1, 13)) # 12 months
     day = list(range(1, 32)) # 31 days
 
-    #define the heatmap figure
-    figs_habits.heatmap = go.Figure(data=go.Heatmap(
-                    z=dfs_habits.heatmap.values.tolist(),  # convert to list of lists
+    fig_heatmap = go.Figure(data=go.Heatmap(
+                    z=z,
                     x=day,  
                     y=month,    
                     #set a continuous custom color scale where low values are white and high values are the default plotly dark mode purple
@@ -72,11 +69,30 @@ def habits_from_df_to_figures(dfs_habits):
                     #colorscale='RdYlGn',  # Red is loss, Green is win
                     hoverongaps=False))
 
-    figs_habits.heatmap.update_layout(
+    fig_heatmap.update_layout(
         title='Habit Heatmap',
         xaxis=dict(title='Day', range=[1, 31]),
         yaxis=dict(title='Month', range=[12, 1])  # Reverse the range to match the calendar
     )
+    return fig_heatmap
+
+def habits_from_df_to_figures(dfs_habits):
+
+    #define a class to contain all the habit figures
+    class figs_habits:
+        def __init__(self):
+            self.heatmap = None
+            self.bars = None
+            self.line_LxD = None
+            self.perhabit_lines_LxD = None
+            self.wkday_summary = None
+            self.perhabit_summary = None
+
+    figs_habits = figs_habits()  #Create an instance of the class
+
+    #define the heatmap figure (left as None when process_habits skipped the heatmap)
+    if dfs_habits.heatmap is not None:
+        figs_habits.heatmap = habits_heatmap_figure(dfs_habits.heatmap.values.tolist())  # convert to list of lists
 
     #define the bars figure
     #transform the bars dataframe columns to lists
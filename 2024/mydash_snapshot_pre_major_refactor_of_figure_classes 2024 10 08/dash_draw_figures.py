@@ -6,10 +6,21 @@ import plotly.io as pio #for style themes
 import dash #for plot layouts
 from dash import dcc, html
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output
+from dash import Patch
+from dash.dependencies import Input, Output, State
 import pandas as pd
 import datetime
-#import threading
+import json
+import sys
+import time
+import re
+import threading
+import flask
+from plotly.io.json import to_json_plotly
+from types import SimpleNamespace
+from figure_cache import SerializedOutput, content_hash
+from refresh_scheduler import resolve_output
+import dash_define_figures
 
 def make_fake_weather_data():
     # Create some tiny placeholder data to test the code below
@@ -25,6 +36,102 @@ def make_fake_weather_data():
 
 pio.templates.default = "plotly_dark"  # Set default style template for plots
 
+#components the background refresh can replace from the refresh DAG results: component id -> property
+#(the habits heatmap is published by habits_incremental once per ingest)
+LIVE_OUTPUTS = {
+    'habits-wkday-summary': 'figure',
+    'habits-perhabit-summary': 'figure',
+    'fit-weight': 'figure',
+    'fit-run': 'figure',
+    'weather-temp-hr': 'figure',
+    'finmkts': 'figure',
+    'habits-bars': 'figure',
+    'habits-line-lxd': 'figure',
+    'time-avg': 'figure',
+    'quotes': 'children',
+    'fin-pers': 'figure',
+    'finmkts-lxd': 'figure',
+    'habits-perhabit-lines-lxd': 'figure',
+    'goals': 'figure',
+}
+
+#components filled by their own loader callback once the startup refresh has produced them
+LAZY_OUTPUTS = dict(LIVE_OUTPUTS, **{'habits-heatmap': 'figure'})
+
+def half_width(fig):
+    #for half-width figures, shrink the margins around each chart
+    return fig.update_layout(margin=dict(l=3, r=3))
+
+#time/day/date panel, computed in the browser: the 1 s interval never reaches the server
+CLIENTSIDE_CLOCK = """
+function(n) {
+    const now = new Date();
+    const pad = (value) => String(value).padStart(2, '0');
+    const time = pad(now.getHours()) + ':' + pad(now.getMinutes()) + ':' + pad(now.getSeconds());
+    const weekday = now.toLocaleDateString('en-US', {weekday: 'long'});
+    const day = now.getFullYear() + ' ' + pad(now.getMonth() + 1) + ' ' + pad(now.getDate());
+    return [time, weekday + '\\n' + day];
+}
+"""
+
+LIVE_OUTPUT_PLACEHOLDER = re.compile(rb'"__live_output__:([\w-]+)"')
+
+def layout_template(dash_app):
+    #serialize the layout once with a placeholder string in place of every lazy output (and of the browser's
+    #figure versions), and split it into [layout bytes, component id, layout bytes, ..., layout bytes].
+    #Also returns the serialized values drawn in the layout, used for outputs the store doesn't have yet
+    spliced = dict(LAZY_OUTPUTS, **{'figure-versions': 'data'})
+    layout = dash_app.get_layout()
+    components = [component for component in layout._traverse() if getattr(component, 'id', None) in spliced]
+    originals = []
+    for component in components:
+        prop = spliced[component.id]
+        originals.append((component, prop, getattr(component, prop, None)))
+        setattr(component, prop, f'__live_output__:{component.id}')
+    try:
+        layout_json = to_json_plotly(layout).encode()
+    finally:
+        for component, prop, value in originals:
+            setattr(component, prop, value)
+    parts = LIVE_OUTPUT_PLACEHOLDER.split(layout_json)
+    defaults = {component.id: to_json_plotly(value).encode() for component, prop, value in originals}
+    return [part.decode() if i % 2 else part for i, part in enumerate(parts)], defaults
+
+def serve_cached_layout(dash_app, figure_store):
+    #serve /_dash-layout from the figures the store already serialized: the page payload is spliced together
+    #and compressed once per store change, then every page load and viewer gets the same bytes (or a 304)
+    cached = {'template': None, 'defaults': None, 'keys': None, 'payload': None, 'etag': None}
+    lock = threading.Lock()
+
+    def serve_layout():
+        versions, keys, serialized = figure_store.serialized_snapshot()
+        with lock:
+            if cached['template'] is None:
+                cached['template'], cached['defaults'] = layout_template(dash_app)
+            if cached['keys'] != keys:
+                values = dict(cached['defaults'])
+                values.update({component_id: entry.json for component_id, entry in serialized.items()})
+                values['figure-versions'] = json.dumps(versions).encode()
+                template = cached['template']
+                body = b''.join(part if i % 2 == 0 else values[part] for i, part in enumerate(template))
+                cached['payload'] = SerializedOutput(body, compress=True)
+                cached['etag'] = content_hash(body)
+                cached['keys'] = keys
+            payload, etag = cached['payload'], cached['etag']
+        request = flask.request
+        if etag in request.if_none_match:
+            response = flask.Response(status=304)
+        else:
+            body, encoding = payload.encoded(request.headers.get('Accept-Encoding', ''))
+            response = flask.Response(body, mimetype='application/json')
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.set_etag(etag)
+        return response
+
+    dash_app.server.view_functions[dash_app.config.routes_pathname_prefix + '_dash-layout'] = serve_layout
+
 def get_time_day_date_styles():
     return {
         'marginTop': '0px',
@@ -38,51 +145,69 @@ def get_time_day_date_styles():
         'backgroundColor': '#111111'
     }
 
-def draw_figures(figs_habits, figs_time, fig_goals, text_quotes, fig_fit_run, fig_fit_weight,
-                 fig_temp_hr, fig_hr2, fig_day, fig_finmkts, fig_finmkts_LxD, fig_fin_pers):
+def draw_figures(figs_habits=None, figs_time=None, fig_goals=None, text_quotes=None, fig_fit_run=None, fig_fit_weight=None,
+                 fig_temp_hr=None, fig_hr2=None, fig_day=None, fig_finmkts=None, fig_finmkts_LxD=None, fig_fin_pers=None,
+                 output_patches=None, figure_store=None, figure_poll_interval=60 * 1000, clientside_clock=True,
+                 lazy_load_interval=1000):
+    #figures left as None are drawn as placeholders. With a figure_store, each LAZY_OUTPUTS cell has its own loader
+    #callback, polled every lazy_load_interval milliseconds until the store has its data, so cells fill in as
+    #their ingest stages finish instead of the page waiting for the slowest one
+    #figure_store: optional refresh_scheduler.FigureStore holding the LAZY_OUTPUTS; every figure_poll_interval
+    #milliseconds each browser receives the outputs that were refreshed since its last poll. If the store has a
+    #figure cache, page loads are served from its pre-serialized figures
+    #output_patches: optional callable (component id, browser's version, store version) returning a Patch from
+    #the browser's version to the store's, or None to send the full value from the store
+    #clientside_clock: tick the clock in the browser; False keeps the old server callback (one request per second per tab)
     
     dash_app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
     
-    #for half-width figures, shrink the margins around each chart
-    figs_habits.wkday_summary.update_layout(margin=dict(l=3, r=3))
-    figs_habits.perhabit_summary.update_layout(margin=dict(l=3, r=3))
+    def shown(fig):
+        return fig if fig is not None else dash_define_figures.loading_figure()
+
+    if figs_habits is None:
+        figs_habits = SimpleNamespace(heatmap=None, wkday_summary=None, perhabit_summary=None,
+                                      bars=None, line_LxD=None, perhabit_lines_LxD=None)
+    if figs_time is None:
+        figs_time = SimpleNamespace(fig_avg=None)
+    wkday_summary = half_width(shown(figs_habits.wkday_summary))
+    perhabit_summary = half_width(shown(figs_habits.perhabit_summary))
 
     dash_app.layout = html.Div([
         dbc.Row([
             dbc.Col([
                 # Left column content
                 dbc.Row([
-                    dbc.Col(html.Div(dcc.Graph(figure=figs_habits.heatmap)), width=2),
+                    dbc.Col(html.Div(dcc.Graph(id='habits-heatmap', figure=shown(figs_habits.heatmap))), width=2),
                     dbc.Col(dbc.Row([
-                        dbc.Col(html.Div(dcc.Graph(figure=figs_habits.wkday_summary))),
-                        dbc.Col(html.Div(dcc.Graph(figure=figs_habits.perhabit_summary)))
+                        dbc.Col(html.Div(dcc.Graph(id='habits-wkday-summary', figure=wkday_summary))),
+                        dbc.Col(html.Div(dcc.Graph(id='habits-perhabit-summary', figure=perhabit_summary)))
                     ]), width=2),
-                    dbc.Col(html.Div(dcc.Graph(figure=fig_fit_weight)), width=2),
-                    dbc.Col(html.Div(dcc.Graph(figure=fig_fit_run)), width=2),
-                    dbc.Col(html.Div(dcc.Graph(figure=fig_temp_hr)), width=2),
-                    dbc.Col(html.Div(dcc.Graph(figure=fig_finmkts)), width=2)
+                    dbc.Col(html.Div(dcc.Graph(id='fit-weight', figure=shown(fig_fit_weight))), width=2),
+                    dbc.Col(html.Div(dcc.Graph(id='fit-run', figure=shown(fig_fit_run))), width=2),
+                    dbc.Col(html.Div(dcc.Graph(id='weather-temp-hr', figure=shown(fig_temp_hr))), width=2),
+                    dbc.Col(html.Div(dcc.Graph(id='finmkts', figure=shown(fig_finmkts))), width=2)
                 ]),
                 dbc.Row([
-                    dbc.Col(html.Div(dcc.Graph(figure=figs_habits.bars)), width=2),
-                    dbc.Col(html.Div(dcc.Graph(figure=figs_habits.line_LxD)), width=2),
-                    dbc.Col(html.Div(dcc.Graph(figure=figs_time.fig_avg)), width=2),
+                    dbc.Col(html.Div(dcc.Graph(id='habits-bars', figure=shown(figs_habits.bars))), width=2),
+                    dbc.Col(html.Div(dcc.Graph(id='habits-line-lxd', figure=shown(figs_habits.line_LxD))), width=2),
+                    dbc.Col(html.Div(dcc.Graph(id='time-avg', figure=shown(figs_time.fig_avg))), width=2),
                     dbc.Col([
                         dbc.Row([
                             dbc.Col(html.Div(id='live-update-time', style={'fontSize': 70})),
-                            dbc.Col(html.Div(id='live-update-day-date', style={'fontSize': 35}))
+                            dbc.Col(html.Div(id='live-update-day-date', style={'fontSize': 35, 'whiteSpace': 'pre-line'}))
                         ], style=get_time_day_date_styles()),
-                        dbc.Row(html.Div(text_quotes))
+                        dbc.Row(html.Div(text_quotes, id='quotes'))
                     ], width=2),
-                    dbc.Col(html.Div(dcc.Graph(figure=fig_fin_pers)), width=2),
-                    dbc.Col(html.Div(dcc.Graph(figure=fig_finmkts_LxD)), width=2)
+                    dbc.Col(html.Div(dcc.Graph(id='fin-pers', figure=shown(fig_fin_pers))), width=2),
+                    dbc.Col(html.Div(dcc.Graph(id='finmkts-lxd', figure=shown(fig_finmkts_LxD))), width=2)
                 ]),
                 dbc.Row([
-                    dbc.Col(html.Div(dcc.Graph(figure=figs_habits.perhabit_lines_LxD)))
+                    dbc.Col(html.Div(dcc.Graph(id='habits-perhabit-lines-lxd', figure=shown(figs_habits.perhabit_lines_LxD))))
                 ])
             ], width=9, className="d-flex flex-column", style={'padding': '0', 'margin': '0'}),
             dbc.Col([ #right column
                 html.Div(
-                    dcc.Graph(figure=fig_goals, style={'height': '100%', 'width': '100%'}),
+                    dcc.Graph(id='goals', figure=shown(fig_goals), style={'height': '100%', 'width': '100%'}),
                     style={'height': '100%'}
                 )
             ], width=3, style={'padding': '0', 'margin': '0'})
@@ -91,7 +216,19 @@ def draw_figures(figs_habits, figs_time, fig_goals, text_quotes, fig_fit_run, fi
             id='interval-component',
             interval=1 * 1000,  # In milliseconds
             n_intervals=0
-        )
+        ),
+        dcc.Interval(
+            id='figure-poll-interval',
+            interval=figure_poll_interval,  # In milliseconds
+            n_intervals=0,
+            disabled=figure_store is None
+        ),
+        #versions of the outputs this browser is showing
+        dcc.Store(id='figure-versions', data=dict(figure_store.snapshot()[1]) if figure_store is not None else {})
+    ] + [
+        #one loader per lazily filled cell; it disables itself once the cell has its data
+        dcc.Interval(id=f'{component_id}-loader', interval=lazy_load_interval, n_intervals=0)
+        for component_id in (LAZY_OUTPUTS if figure_store is not None else [])
     ], className="g-0", style={
         'backgroundColor': '#000000',
         #align the layout to the top left of the screen
@@ -109,14 +246,146 @@ def draw_figures(figs_habits, figs_time, fig_goals, text_quotes, fig_fit_run, fi
         #'zoom': '0.8',  # Not a great feature.  Inconsistent across browsers, seeing some issues with it.
     })
     
-    @dash_app.callback([Output('live-update-time', 'children'),
-                       Output('live-update-day-date', 'children')],
-              [Input('interval-component', 'n_intervals')])
-    
-    def update_metrics(n):
-        current_time = datetime.datetime.now().strftime("%H:%M:%S")
-        current_weekday = datetime.datetime.now().strftime("%A")
-        current_day = datetime.datetime.now().strftime("%Y %m %d")
-        return current_time, [current_weekday, html.Br(), current_day]
+    clock_outputs = [Output('live-update-time', 'children'), Output('live-update-day-date', 'children')]
+    if clientside_clock:
+        dash_app.clientside_callback(CLIENTSIDE_CLOCK, clock_outputs, [Input('interval-component', 'n_intervals')])
+    else:
+        @dash_app.callback(clock_outputs,
+                  [Input('interval-component', 'n_intervals')])
+
+        def update_metrics(n):
+            current_time = datetime.datetime.now().strftime("%H:%M:%S")
+            current_weekday = datetime.datetime.now().strftime("%A")
+            current_day = datetime.datetime.now().strftime("%Y %m %d")
+            return current_time, f"{current_weekday}\n{current_day}"
+
+    if figure_store is not None:
+        pushed = LAZY_OUTPUTS
+
+        @dash_app.callback([Output(component_id, prop) for component_id, prop in pushed.items()]
+                  + [Output('figure-versions', 'data')],
+                  [Input('figure-poll-interval', 'n_intervals')],
+                  [State('figure-versions', 'data')],
+                  prevent_initial_call=True)
+
+        def push_refreshed_figures(n, client_versions):
+            changed, versions = figure_store.changed_since(client_versions)
+            changed = {component_id: value for component_id, value in changed.items() if component_id in pushed}
+            if not changed:
+                return [dash.no_update] * (len(pushed) + 1)
+            if output_patches is not None:
+                #cells the browser already shows get only what changed since its version, if the server still has it
+                for component_id in changed:
+                    client_version = (client_versions or {}).get(component_id, 0)
+                    patch = output_patches(component_id, client_version, versions[component_id]) if client_version else None
+                    if patch is not None:
+                        changed[component_id] = patch
+            #the rest get the full value, built now if it was published lazily
+            changed = {component_id: resolve_output(value) for component_id, value in changed.items()}
+            #only mark what was sent: cells still waiting for their loader must stay unseen
+            seen = Patch()
+            for component_id in changed:
+                seen[component_id] = versions[component_id]
+            return [changed.get(component_id, dash.no_update) for component_id in pushed] + [seen]
+
+        for component_id, prop in LAZY_OUTPUTS.items():
+            register_loader(dash_app, figure_store, component_id, prop)
+
+        if figure_store.cache is not None:
+            serve_cached_layout(dash_app, figure_store)
         
     return dash_app
+
+def register_loader(dash_app, figure_store, component_id, prop):
+    #fill one cell as soon as the store has it (or has a newer version than the page was served with),
+    #then stop polling; later refreshes come through push_refreshed_figures
+    @dash_app.callback([Output(component_id, prop, allow_duplicate=True),
+                        Output('figure-versions', 'data', allow_duplicate=True),
+                        Output(f'{component_id}-loader', 'disabled')],
+              [Input(f'{component_id}-loader', 'n_intervals')],
+              [State('figure-versions', 'data')],
+              prevent_initial_call='initial_duplicate')
+
+    def load_cell(n, client_versions):
+        outputs, versions = figure_store.snapshot()
+        if component_id not in versions:
+            return dash.no_update, dash.no_update, dash.no_update  # Keep polling
+        if (client_versions or {}).get(component_id, 0) >= versions[component_id]:
+            return dash.no_update, dash.no_update, True
+        seen = Patch()
+        seen[component_id] = versions[component_id]
+        return resolve_output(outputs[component_id]), seen, True
+
+def server_polling(dash_app):
+    #(output key, callback, interval ms) for every server callback fired by an enabled dcc.Interval of the layout.
+    #Cell loaders are left out: they disable their interval as soon as the cell has data
+    intervals = {component.id: component for component in dash_app.layout._traverse()
+                 if isinstance(component, dcc.Interval) and not getattr(component, 'disabled', False)}
+    polling = []
+    for output_key, callback in dash_app.callback_map.items():
+        if 'callback' not in callback:
+            continue  # Clientside callback, runs in the browser
+        callback_outputs = callback['output'] if isinstance(callback['output'], list) else [callback['output']]
+        if any(output.component_property == 'disabled' for output in callback_outputs):
+            continue
+        for callback_input in callback['inputs']:
+            if callback_input['id'] in intervals and callback_input['property'] == 'n_intervals':
+                polling.append((output_key, callback, intervals[callback_input['id']].interval))
+    return polling
+
+def callback_request(dash_app, output_key, callback, n):
+    #the body the browser posts to /_dash-update-component when the interval ticks for the n-th time
+    callback_outputs = callback['output'] if isinstance(callback['output'], list) else [callback['output']]
+    outputs = [{'id': output.component_id, 'property': output.component_property} for output in callback_outputs]
+    layout = {component.id: component for component in dash_app.layout._traverse() if getattr(component, 'id', None)}
+    return {
+        'output': output_key,
+        'outputs': outputs if len(outputs) > 1 else outputs[0],
+        'inputs': [dict(callback_input, value=n) for callback_input in callback['inputs']],
+        'changedPropIds': [f"{callback_input['id']}.{callback_input['property']}" for callback_input in callback['inputs']],
+        'state': [dict(state, value=getattr(layout[state['id']], state['property'], None)) for state in callback['state']],
+    }
+
+def benchmark_tab_load(tabs=(1, 5, 20), minutes=1):
+    #server requests per minute and server time they cost for N open tabs, server clock vs clientside clock.
+    #Each tab's interval ticks for one simulated minute are replayed through the Flask test client
+    from refresh_scheduler import FigureStore
+    from figure_cache import FigureCache
+
+    def fake_figure():
+        return go.Figure(go.Scatter(x=list(range(30)), y=list(range(30))))
+
+    def make_app(clientside):
+        figs_habits = SimpleNamespace(heatmap=fake_figure(), wkday_summary=fake_figure(), perhabit_summary=fake_figure(),
+                                      bars=fake_figure(), line_LxD=fake_figure(), perhabit_lines_LxD=fake_figure())
+        figs_time = SimpleNamespace(fig_avg=fake_figure())
+        figures = [fake_figure() for _ in range(9)]
+        store = FigureStore(cache=FigureCache())
+        store.publish({component_id: (fake_figure() if prop == 'figure' else 'quote')
+                       for component_id, prop in LIVE_OUTPUTS.items()})
+        return draw_figures(figs_habits, figs_time, figures[0], 'quote', *figures[1:],
+                            figure_store=store, clientside_clock=clientside)
+
+    print(f"Server load of open dashboard tabs over {minutes} simulated minute(s)")
+    for clientside in (False, True):
+        dash_app = make_app(clientside)
+        client = dash_app.server.test_client()
+        polling = server_polling(dash_app)
+        label = 'clientside clock' if clientside else 'server clock'
+        for n_tabs in tabs:
+            requests, busy = 0, 0.0
+            for _ in range(n_tabs):
+                for output_key, callback, interval in polling:
+                    for n in range(1, int(minutes * 60 * 1000 // interval) + 1):
+                        body = callback_request(dash_app, output_key, callback, n)
+                        t0 = time.perf_counter()
+                        response = client.post('/_dash-update-component', json=body)
+                        busy += time.perf_counter() - t0
+                        assert response.status_code in (200, 204), response.status_code
+                        requests += 1
+            print(f"  {label:<16} {n_tabs:>3} tab(s): {requests / minutes:7.0f} requests/min, "
+                  f"server busy {busy / minutes * 1000:8.1f} ms/min")
+
+if __name__ == '__main__':
+    if '--benchmark' in sys.argv:
+        benchmark_tab_load()
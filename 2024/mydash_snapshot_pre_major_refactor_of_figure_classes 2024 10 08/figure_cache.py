@@ -0,0 +1,138 @@
+#file: figure_cache.py
+#Server-side cache of serialized dashboard outputs. Figures are turned into JSON once per change of their
+#source data (keyed by a content hash of that data), not on every page load or for every viewer.
+#The page payload built from them is kept gzip (and brotli, if installed) compressed and served as is.
+
+import gzip
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from plotly.io.json import to_json_plotly
+try:
+    import brotli
+except ImportError:
+    brotli = None  # Optional: gzip is always available
+
+def update_hash(h, obj):
+    # Feed a type tag plus the content, so e.g. [1, 2] and (1, 2) or "1" and 1 hash differently
+    h.update(type(obj).__name__.encode())
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        h.update(repr(obj.columns.tolist() if isinstance(obj, pd.DataFrame) else obj.name).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(repr((obj.dtype.str, obj.shape)).encode())
+        h.update(np.ascontiguousarray(obj).tobytes() if obj.dtype != object else pickle.dumps(obj.tolist()))
+    elif isinstance(obj, pa.Table):
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, obj.schema) as writer:
+            writer.write_table(obj)
+        h.update(sink.getvalue())
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        h.update(obj)
+    elif isinstance(obj, str):
+        h.update(obj.encode())
+    elif isinstance(obj, (list, tuple)):
+        h.update(str(len(obj)).encode())
+        for item in obj:
+            update_hash(h, item)
+    elif isinstance(obj, dict):
+        h.update(str(len(obj)).encode())
+        for key, value in obj.items():
+            update_hash(h, key)
+            update_hash(h, value)
+    elif hasattr(obj, '__dict__') and not callable(obj):
+        update_hash(h, vars(obj))  # e.g. the dfs_habits namespace of dataframes
+    else:
+        h.update(repr(obj).encode())
+
+def content_hash(obj):
+    """Hex digest of the content of ingest results: dataframes, arrays, Arrow tables, nested lists/dicts."""
+    h = hashlib.blake2b(digest_size=16)
+    update_hash(h, obj)
+    return h.hexdigest()
+
+class SerializedOutput:
+    """
+    JSON bytes of one value, plus compressed copies made once when requested.
+
+    Args:
+        json_bytes: Serialized value.
+        compress: Also keep gzip (and brotli, if installed) encodings.
+    """
+    def __init__(self, json_bytes, compress=False):
+        self.json = json_bytes
+        self.encodings = {}
+        if compress:
+            self.encodings['gzip'] = gzip.compress(json_bytes, compresslevel=6)
+            if brotli is not None:
+                self.encodings['br'] = brotli.compress(json_bytes, quality=5)
+
+    def encoded(self, accept_encoding=''):
+        """(body, content encoding or None) for a request's Accept-Encoding header."""
+        accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.encodings:
+                return self.encodings[encoding], encoding
+        return self.json, None
+
+class FigureCache:
+    """
+    LRU cache of SerializedOutput keyed by content hash.
+
+    Args:
+        max_entries: Entries kept; older ones are dropped first.
+        compress: Compress the cached figures too (the page payload is always compressed).
+    """
+    def __init__(self, max_entries=128, compress=False):
+        self.max_entries = max_entries
+        self.compress = compress
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def serialize(self, value, key=None):
+        """
+        Serialized form of a figure (or any Dash component/value), reusing the cached bytes when possible.
+
+        Args:
+            value: Plotly figure, Dash component or plain JSON-able value.
+            key: Content hash of the data the value was built from. Without one the JSON
+                itself is hashed, which still dedupes identical figures.
+
+        Returns:
+            (key, SerializedOutput)
+        """
+        if key is not None:
+            entry = self.get(key)
+            if entry is not None:
+                self.hits += 1
+                return key, entry
+        self.misses += 1
+        json_bytes = to_json_plotly(value).encode()
+        if key is None:
+            key = content_hash(json_bytes)
+            entry = self.get(key)
+            if entry is not None:
+                return key, entry
+        entry = SerializedOutput(json_bytes, self.compress)
+        self.put(key, entry)
+        return key, entry
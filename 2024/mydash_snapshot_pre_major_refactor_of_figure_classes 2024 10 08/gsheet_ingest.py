@@ -13,14 +13,22 @@ import pandas as pd
 import datetime
 import numpy as np
 
-def get_gsheet_data():
+def open_dashboard_sheet():
     #use credentials to create a client to interact with the Google Drive API
     scope = ['https://spreadsheets.google.com/feeds','https://www.googleapis.com/auth/drive']
     creds = ServiceAccountCredentials.from_json_keyfile_name('my-dashboard-426016-058763d93d8e.json', scope)
     client = gspread.authorize(creds)
 
     #open a sheet
-    mydash_sheet = client.open('My Dashboard Data')
+    return client.open('My Dashboard Data')
+
+def get_sheet_modified_time():
+    #Drive modifiedTime of the dashboard sheet: one small metadata call, used by the refresh
+    #scheduler to re-ingest only after the sheet was edited
+    return open_dashboard_sheet().get_lastUpdateTime()
+
+def get_gsheet_data():
+    mydash_sheet = open_dashboard_sheet()
 
     #select tabs in sheet
     habits_tab = mydash_sheet.worksheet("Habits")
@@ -56,7 +64,8 @@ def get_gsheet_data():
             finmkts_tab_data,  df_fin_pers, fit_run_data, fit_weight_data)   
 
 #PROCESS HABITS DATA INTO DASH-FRIENDLY DATA FORMAT
-def process_habits(habits_tab_data_headers, habits_tab_data, habits_tab_data_full):   
+#heatmap=False skips the heatmap pivot (the dashboard keeps the heatmap up to date with habits_incremental)
+def process_habits(habits_tab_data_headers, habits_tab_data, habits_tab_data_full, heatmap=True):   
 
     def convert_percentage(percentage_str):  # Function to convert percentage strings to floats
         return float(percentage_str.strip('%')) / 100.0
@@ -76,7 +85,8 @@ def process_habits(habits_tab_data_headers, habits_tab_data, habits_tab_data_ful
             win_rate_YTD = convert_percentage(row[14])
             loss_rate = float(1.00 - win_rate)
             #update the full data set with the latest row's values for each variable
-            habit_data_heat_noheaders.append([day_in_month, month_in_year, win_rate])
+            if heatmap:
+                habit_data_heat_noheaders.append([day_in_month, month_in_year, win_rate])
             habit_data_bars_noheaders.append([day_in_year, win_rate, loss_rate])
             habits_tab_line_noheaders.append([day_in_year, win_rate, win_rate_YTD])
         except (ValueError, IndexError) as e:
@@ -147,12 +157,13 @@ def process_habits(habits_tab_data_headers, habits_tab_data, habits_tab_data_ful
     dfs_habits = dfs_habits()
 
     # Convert the lists to DataFrames
-    dfs_habits.heatmap = pd.DataFrame(habit_data_heat_noheaders, 
-                                      columns=["  Day in Mo", "  Mo in Yr", "  Win %"])
-    # Pivot the heatmap data to create a 2D array and fill NULL values with 0
-    z_data_heat = dfs_habits.heatmap.pivot(index="  Mo in Yr", columns="  Day in Mo", values="  Win %").fillna(0)
-    # Ensure the DataFrame matches the dimensions for the heatmap
-    dfs_habits.heatmap = pd.DataFrame(z_data_heat, index=dfs_habits.heatmap["  Mo in Yr"].unique(), columns=dfs_habits.heatmap["  Day in Mo"].unique()).fillna(0)
+    if heatmap:
+        dfs_habits.heatmap = pd.DataFrame(habit_data_heat_noheaders, 
+                                          columns=["  Day in Mo", "  Mo in Yr", "  Win %"])
+        # Pivot the heatmap data to create a 2D array and fill NULL values with 0
+        z_data_heat = dfs_habits.heatmap.pivot(index="  Mo in Yr", columns="  Day in Mo", values="  Win %").fillna(0)
+        # Ensure the DataFrame matches the dimensions for the heatmap
+        dfs_habits.heatmap = pd.DataFrame(z_data_heat, index=dfs_habits.heatmap["  Mo in Yr"].unique(), columns=dfs_habits.heatmap["  Day in Mo"].unique()).fillna(0)
 
     dfs_habits.bars = pd.DataFrame(habit_data_bars_noheaders, columns=["Day in Year", "Win %", "Loss %"])
     dfs_habits.line = pd.DataFrame(habits_tab_line_noheaders, columns=["Day in Year", "Win %", "Win % YTD"])
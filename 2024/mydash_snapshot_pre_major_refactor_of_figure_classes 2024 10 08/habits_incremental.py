@@ -0,0 +1,158 @@
+#file: habits_incremental.py
+#Incremental habits heatmap. The parsed rows and the heatmap grid are kept between refreshes,
+#so an ingest only reads rows that are new (or recent enough to still be edited). The diff is computed
+#once per ingest on the server and recorded under the figure store version it was published as; each
+#browser then gets the touched cells since the version it shows as a Dash Patch, or the full figure
+#from the store when it is too far behind. The full figure is only built (and serialized) when one is
+#needed, so an ingest costs O(new rows) and not a rebuild of the whole heatmap.
+
+import threading
+from collections import OrderedDict
+from dash import Patch
+import dash_define_figures
+from refresh_scheduler import LazyOutput
+
+def parse_heatmap_row(row):
+    # Same cells and conversions as gsheet_ingest.process_habits; raises ValueError/IndexError on blank rows
+    day_in_month = int(row[6])
+    month_in_year = int(row[5])
+    win_rate = float(row[10].strip('%')) / 100.0
+    return day_in_month, month_in_year, win_rate
+
+class HabitsHeatmapState:
+    """
+    Heatmap grid kept between refreshes.
+
+    Rows are months and columns are days, both in order of first appearance, the same
+    layout as the pivot in process_habits. Missing cells are 0.
+
+    Args:
+        recheck_rows: Trailing rows re-read on every update (today's row keeps changing).
+        max_history: Published versions whose changes are kept for patching browsers.
+    """
+    def __init__(self, recheck_rows=7, max_history=50):
+        self.recheck_rows = recheck_rows
+        self.max_history = max_history
+        self.parsed_rows = []  # (day, month, win rate) of every processed row
+        self.months = {}  # month -> heatmap row index
+        self.days = {}  # day -> heatmap column index
+        self.z = []  # heatmap values, list of lists
+        self.history = OrderedDict()  # store version -> changes from the previous version (None: rebuilt)
+        self.lock = threading.RLock()  # Ingests and the Dash callbacks run on different threads
+
+    @property
+    def last_row(self):
+        """Index of the last processed sheet row (-1 before the first update)."""
+        return len(self.parsed_rows) - 1
+
+    def set_cell(self, day, month, win_rate, changes):
+        if month not in self.months:
+            self.months[month] = len(self.z)
+            self.z.append([0] * len(self.days))
+            changes.append(('month', len(self.days)))
+        if day not in self.days:
+            self.days[day] = len(self.days)
+            for z_row in self.z:
+                z_row.append(0)
+            changes.append(('day', len(self.z)))
+        i, j = self.months[month], self.days[day]
+        if self.z[i][j] != win_rate:
+            self.z[i][j] = win_rate
+            changes.append(('cell', i, j, win_rate))
+
+    def rebuild(self, habits_tab_data):
+        self.parsed_rows, self.months, self.days, self.z = [], {}, {}, []
+        self.apply_rows(habits_tab_data, 0, [])
+
+    def apply_rows(self, habits_tab_data, start, changes):
+        # Returns False if an already processed row disappeared or moved to another date
+        index = start
+        for index in range(start, len(habits_tab_data)):
+            try:
+                day, month, win_rate = parse_heatmap_row(habits_tab_data[index])
+            except (ValueError, IndexError):
+                break
+            if index < len(self.parsed_rows):
+                if self.parsed_rows[index][:2] != (day, month):
+                    return False
+                if self.parsed_rows[index][2] == win_rate:
+                    continue
+                self.parsed_rows[index] = (day, month, win_rate)
+            else:
+                self.parsed_rows.append((day, month, win_rate))
+            self.set_cell(day, month, win_rate, changes)
+        else:
+            index = len(habits_tab_data)
+        return index >= len(self.parsed_rows)
+
+    def update(self, habits_tab_data):
+        """
+        Apply new or changed rows of the habits tab.
+
+        Args:
+            habits_tab_data: habits rows without headers, as returned by get_gsheet_data
+
+        Returns:
+            List of changes for patch_heatmap, or None if the grid had to be rebuilt from
+            scratch (older rows removed or re-dated).
+        """
+        with self.lock:
+            changes = []
+            start = max(0, len(self.parsed_rows) - self.recheck_rows)
+            if self.apply_rows(habits_tab_data, start, changes):
+                return changes
+            self.rebuild(habits_tab_data)
+            return None
+
+def patch_heatmap(changes):
+    """Dash Patch replaying heatmap changes on the figure already in the browser."""
+    patched = Patch()
+    z = patched['data'][0]['z']
+    for change in changes:
+        if change[0] == 'month':
+            z.append([0] * change[1])
+        elif change[0] == 'day':
+            for i in range(change[1]):
+                z[i].append(0)
+        else:
+            _, i, j, win_rate = change
+            z[i][j] = win_rate
+    return patched
+
+def publish_heatmap(state, figure_store, habits_tab_data, component_id='habits-heatmap'):
+    """
+    Diff an ingest of the habits tab against the grid and publish the heatmap if it changed.
+
+    Called once per ingest (not per browser). The changes are recorded under the version the
+    figure was published as, for patch_since. The figure is published as a LazyOutput of a copy
+    of the grid, built only if a page load or a browser too far behind for a patch asks for it.
+
+    Args:
+        state: HabitsHeatmapState
+        figure_store: refresh_scheduler.FigureStore the heatmap figure is published to
+        habits_tab_data: habits rows without headers, as returned by get_gsheet_data
+    """
+    with state.lock:
+        changes = state.update(habits_tab_data)
+        if changes == []:
+            return
+        z = [list(z_row) for z_row in state.z]  # This version's grid; later ingests change state.z in place
+        published = figure_store.publish({component_id: LazyOutput(lambda: dash_define_figures.habits_heatmap_figure(z))})
+        if component_id in published:
+            state.history[published[component_id]] = changes
+            while len(state.history) > state.max_history:
+                state.history.popitem(last=False)
+
+def patch_since(state, client_version, version):
+    """
+    Patch taking a browser's heatmap from one published version to another.
+
+    Returns:
+        Dash Patch, or None if the browser needs the full figure (its version is unknown,
+        too old, or the grid was rebuilt since).
+    """
+    with state.lock:
+        steps = [state.history.get(step_version) for step_version in range(client_version + 1, version + 1)]
+    if not client_version or not steps or any(step is None for step in steps):
+        return None
+    return patch_heatmap([change for step in steps for change in step])
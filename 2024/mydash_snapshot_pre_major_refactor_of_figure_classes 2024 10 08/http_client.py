@@ -0,0 +1,167 @@
+#file: http_client.py
+#Shared async HTTP client for the network ingest sources of the dashboard (Open-Meteo forecast and archive).
+#One keep-alive connection pool per process, bounded per-host concurrency and one retry/backoff policy,
+#so cold-start refreshes can run side by side instead of each source opening its own connections.
+#The pool lives on one event loop that the client runs on its own daemon thread: synchronous callers on any
+#thread hand their coroutines to that loop with run(), so they all share one session instead of each
+#asyncio.run() creating (and leaking) a session of its own.
+#Note: aiohttp (like most Python clients) does not pipeline HTTP/1.1 requests. Keep-alive reuse is used
+#instead, which removes the TCP/TLS handshake from every request after the first one per host.
+
+import asyncio
+import json
+import random
+import threading
+import aiohttp
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class SharedHttpClient:
+    """
+    Pooled aiohttp client with a uniform retry/backoff policy.
+
+    The client owns one event loop, started on a daemon thread on first use, and the
+    session is created on that loop. Call run() (or the *_sync helpers) from any other
+    thread; coroutines already running on the client loop await the methods directly.
+    """
+    def __init__(self, limit=20, limit_per_host=4, retries=5, backoff_factor=0.2, timeout=30):
+        self.limit = limit
+        self.limit_per_host = limit_per_host  # Bounded per-host concurrency
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self._session = None
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        """The client's event loop, started on a daemon thread on first use."""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='http-client', daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    def run(self, coro, timeout=None):
+        """
+        Run a coroutine on the client loop and wait for its result.
+
+        Args:
+            coro: Coroutine using this client (e.g. self.get_bytes(url) or a whole ingest fetch).
+            timeout: Optional seconds to wait for the result.
+
+        Returns:
+            The coroutine's result; its exception is raised in the calling thread.
+        """
+        loop = self.loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            coro.close()
+            raise RuntimeError("SharedHttpClient.run() called on the client loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+    def session(self):
+        """Return the pooled session, creating it if needed; only valid on the client loop."""
+        if asyncio.get_running_loop() is not self._loop:
+            raise RuntimeError("The shared session lives on the client loop; use SharedHttpClient.run()")
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (0-based); honours Retry-After."""
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass  # HTTP-date form, fall back to exponential backoff
+        return self.backoff_factor * (2 ** attempt) * (1 + random.random() * 0.1)
+
+    async def request(self, method, url, **kwargs):
+        """
+        Send a request with retries and return (status, headers, body bytes).
+
+        Retries connection errors, timeouts and RETRY_STATUSES with exponential
+        backoff. The final response is raised for status if it is still an error.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.session().request(method, url, **kwargs) as response:
+                    body = await response.read()
+                    retry_after = response.headers.get('Retry-After')
+                    if response.status not in RETRY_STATUSES or attempt == self.retries:
+                        response.raise_for_status()
+                        return response.status, response.headers, body
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+                retry_after = None
+            # Connection is back in the pool while we wait
+            await asyncio.sleep(self.backoff_delay(attempt, retry_after))
+
+    async def get_bytes(self, url, **kwargs):
+        """GET a URL and return the raw body."""
+        _, _, body = await self.request('GET', url, **kwargs)
+        return body
+
+    async def post_json(self, url, payload, **kwargs):
+        """POST a JSON payload and return the decoded JSON response."""
+        _, _, body = await self.request('POST', url, json=payload, **kwargs)
+        return json.loads(body)
+
+    def request_sync(self, method, url, **kwargs):
+        """request() for synchronous code: (status, headers, body bytes)."""
+        return self.run(self.request(method, url, **kwargs))
+
+    def get_bytes_sync(self, url, **kwargs):
+        """get_bytes() for synchronous code."""
+        return self.run(self.get_bytes(url, **kwargs))
+
+    def post_json_sync(self, url, payload, **kwargs):
+        """post_json() for synchronous code."""
+        return self.run(self.post_json(url, payload, **kwargs))
+
+    def close(self):
+        """Close the pooled session and stop the loop thread (call once at shutdown)."""
+        with self._lock:
+            loop, thread, self._loop, self._thread = self._loop, self._thread, None, None
+        if loop is None:
+            return
+
+        async def close_session():
+            if self._session is not None and not self._session.closed:
+                await self._session.close()
+            self._session = None
+
+        asyncio.run_coroutine_threadsafe(close_session(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+#one client per process, shared by every ingest source
+shared_client = None
+shared_client_lock = threading.Lock()
+
+def get_shared_client():
+    """Return the process-wide SharedHttpClient."""
+    global shared_client
+    with shared_client_lock:
+        if shared_client is None:
+            shared_client = SharedHttpClient()
+        return shared_client
@@ -1,52 +1,166 @@
 #file: main.py
+#Development server: python main.py (set DASH_DEBUG=true for the Dash dev tools and reloader).
+#Production: serve wsgi.create_app with a WSGI server (see wsgi.py), e.g.
+#   gunicorn --workers 4 --threads 4 --bind 0.0.0.0:8050 "wsgi:create_app()"
+import os
+import datetime
+import threading
 import gsheet_ingest
 import time_ingest
 import goals
 import weather_get
 import dash_define_figures
 import dash_draw_figures
+import habits_incremental
+from refresh_dag import Stage, run_refresh
+from refresh_scheduler import FigureStore, RefreshJob, RefreshScheduler
+from figure_cache import FigureCache, content_hash
 
-#ingest gsheet data
-(habits_tab_data_headers, habits_tab_data, habits_tab_data_full, text_quotes, 
-finmkts_tab_data,  df_fin_pers,fit_run_data, fit_weight_data)  = gsheet_ingest.get_gsheet_data()
+#debug mode (dev tools, reloader, tracebacks in the browser) only when asked for, never by default
+DEBUG = os.environ.get('DASH_DEBUG', '').strip().lower() in ('1', 'true', 'yes')
 
-#convert gsheet data to dataframes
-dfs_habits = gsheet_ingest.process_habits(habits_tab_data_headers, habits_tab_data, habits_tab_data_full)
-df_finmkts = gsheet_ingest.process_finmkts(finmkts_tab_data)
-df_fit_run, df_fit_weight = gsheet_ingest.process_fitness(fit_run_data, fit_weight_data)
+#refresh DAG: each stage lists the stages it needs. Independent ingest stages (gsheet, time csv,
+#goals csv, weather api) run in parallel and figure builders start as soon as their inputs are ready
+stages = [
+    #ingest gsheet data
+    Stage('gsheet', gsheet_ingest.get_gsheet_data),
 
-#habit dataframes to plotly figures
-figs_habits = dash_define_figures.habits_from_df_to_figures(dfs_habits)
+    #convert gsheet data to dataframes (the heatmap is kept up to date by habits_incremental, not rebuilt here)
+    Stage('habits', lambda g: gsheet_ingest.process_habits(g[0], g[1], g[2], heatmap=False), deps=['gsheet']),
+    Stage('finmkts', lambda g: gsheet_ingest.process_finmkts(g[4]), deps=['gsheet']),
+    Stage('fitness', lambda g: gsheet_ingest.process_fitness(g[6], g[7]), deps=['gsheet']),
 
-#time data:  ingest, build dataframes.  then draw the figures
-df_time = time_ingest.get_time_data()
-figs_time = dash_define_figures.time_from_df_to_figures(df_time)
+    #habit dataframes to plotly figures
+    Stage('figs_habits', dash_define_figures.habits_from_df_to_figures, deps=['habits']),
 
-#goal data:
-fig_goals = goals.goals_input_to_fig()
+    #time data:  ingest, build dataframes.  then draw the figures
+    Stage('time', time_ingest.get_time_data),
+    Stage('figs_time', dash_define_figures.time_from_df_to_figures, deps=['time']),
 
-#get real weather data as dash figure
-fig_temp_hr = weather_get.weather_get()
+    #goal data:
+    Stage('goals', goals.goals_input_to_fig),
 
-#fake weather data to dataframes
-hourly_dataframe, daily_dataframe = dash_define_figures.make_fake_weather_data()
+    #get real weather data as dash figure (forecast cache, fetched over the shared http pool when needed)
+    Stage('weather_fetch', weather_get.get_forecast_tables),
+    Stage('weather', lambda tables: weather_get.weather_get(tables=tables), deps=['weather_fetch']),
 
-#fake weather dataframes to plotly figures
-fig_hr, fig_hr2, fig_day = dash_define_figures.make_weather_figures(hourly_dataframe, daily_dataframe)
+    #fake weather data to dataframes, then plotly figures
+    Stage('fake_weather', lambda: dash_define_figures.make_weather_figures(*dash_define_figures.make_fake_weather_data())),
 
-#quote data to formatted text area
-textarea_quotes = dash_define_figures.quotes_data_to_textarea(text_quotes)
+    #quote data to formatted text area
+    Stage('quotes', lambda g: dash_define_figures.quotes_data_to_textarea(g[3]), deps=['gsheet']),
 
-#finance data to plotly figures
-fig_finmkts, fig_finmkts_LxD, fig_fin_pers = dash_define_figures.finance_from_df_to_figures(df_finmkts, df_fin_pers)
+    #finance data to plotly figures
+    Stage('figs_finance', lambda df_finmkts, g: dash_define_figures.finance_from_df_to_figures(df_finmkts, g[5]),
+          deps=['finmkts', 'gsheet']),
 
-#fitness data to plotly figure
-fig_fit_run, fig_fit_weight = dash_define_figures.fitness_from_df_to_figures(df_fit_run, df_fit_weight)
+    #fitness data to plotly figure
+    Stage('figs_fitness', lambda fit: dash_define_figures.fitness_from_df_to_figures(*fit), deps=['fitness']),
+]
 
-#define the dash app
-dash_app = dash_draw_figures.draw_figures(figs_habits, figs_time, fig_goals, textarea_quotes, fig_fit_run, fig_fit_weight,
-                                            fig_temp_hr, fig_hr2, fig_day, fig_finmkts, fig_finmkts_LxD, fig_fin_pers)
+#stage result -> {dash component id: new value} for the components in dash_draw_figures.LIVE_OUTPUTS
+half_width = dash_draw_figures.half_width
+stage_outputs = {
+    'figs_habits': lambda f: {'habits-wkday-summary': half_width(f.wkday_summary),
+                              'habits-perhabit-summary': half_width(f.perhabit_summary),
+                              'habits-bars': f.bars,
+                              'habits-line-lxd': f.line_LxD,
+                              'habits-perhabit-lines-lxd': f.perhabit_lines_LxD},
+    'figs_time': lambda f: {'time-avg': f.fig_avg},
+    'goals': lambda fig: {'goals': fig},
+    'weather': lambda fig: {'weather-temp-hr': fig},
+    'quotes': lambda textarea: {'quotes': textarea},
+    'figs_finance': lambda f: {'finmkts': f[0], 'finmkts-lxd': f[1], 'fin-pers': f[2]},
+    'figs_fitness': lambda f: {'fit-run': f[0], 'fit-weight': f[1]},
+}
 
-#draw the dash app
-dash_app.run_server(debug=True)
-#dash_app.run_server(debug=True, host='127.0.0.1', port=8081)
\ No newline at end of file
+stage_deps = {stage.name: stage.deps for stage in stages}
+
+def create_dashboard(figure_store, incremental_heatmap=True, **draw_options):
+    """
+    Wire the refresh DAG, the refresh jobs and the Dash app around one figure store.
+
+    Args:
+        figure_store: FigureStore (or shared_store.SharedFigureStore) the refreshes publish to.
+        incremental_heatmap: Send browsers a patch of the habits heatmap cells changed since the version they
+            show. Turn off when several processes serve the app: only the ingesting process has the heatmap
+            history, so the others push the full figure from the store like the other figures.
+        **draw_options: Extra keyword arguments for dash_draw_figures.draw_figures.
+
+    Returns:
+        (dash_app, start_refresh): start_refresh runs the startup refresh and then the refresh jobs;
+        call it (on a background thread) in the one process that should ingest.
+    """
+    #habits heatmap: the incremental state is seeded with the first gsheet result, then each gsheet ingest only
+    #applies new/changed rows and publishes the grid together with the cells it changed
+    habits_heatmap_state = habits_incremental.HabitsHeatmapState()
+
+    def heatmap_patch(component_id, client_version, version):
+        if component_id != 'habits-heatmap':
+            return None
+        return habits_incremental.patch_since(habits_heatmap_state, client_version, version)
+
+    def dashboard_outputs(results):
+        #returns the outputs and their figure cache keys: a content hash of the data each figure stage was given,
+        #so a refresh that ingests the same data reuses the serialized figures and pushes nothing
+        outputs, keys = {}, {}
+        if 'gsheet' in results:
+            #published here rather than returned: its version is recorded with the changed cells
+            habits_incremental.publish_heatmap(habits_heatmap_state, figure_store, results['gsheet'][1])
+        for name, to_outputs in stage_outputs.items():
+            if name in results:
+                stage_values = to_outputs(results[name])
+                outputs.update(stage_values)
+                if stage_deps[name]:  # Stages reading their own files (goals) are keyed by their serialized figure
+                    source_key = content_hash([results[dep] for dep in stage_deps[name]])
+                    keys.update({component_id: f'{source_key}:{component_id}' for component_id in stage_values})
+        return outputs, keys
+
+    def publish_startup_result(name, results):
+        #startup refresh: publish each stage's figures as soon as it finishes, so the cells fill in one by one
+        if name == 'gsheet':
+            habits_incremental.publish_heatmap(habits_heatmap_state, figure_store, results['gsheet'][1])
+        elif name in stage_outputs:
+            figure_store.publish(*dashboard_outputs({dep: results[dep] for dep in (name,) + stage_deps[name]}))
+
+    #background refresh: each job re-runs its stages (and their deps) and swaps the new figures into the store
+    refresh_jobs = [
+        #forecast runs publish hourly; wait for the refetch instead of drawing the stale cached forecast
+        RefreshJob('weather', ['weather'], every=60 * 60,
+                   overrides={'weather_fetch': lambda: weather_get.get_forecast_tables(wait=True)}),
+        #habits, finance, fitness and quotes all come from the dashboard sheet: re-ingest only after it was edited
+        RefreshJob('gsheet', ['figs_habits', 'quotes', 'figs_finance', 'figs_fitness'], every=5 * 60,
+                   changed=gsheet_ingest.get_sheet_modified_time),
+        #calendar export and goals are updated once a day
+        RefreshJob('calendar', ['figs_time', 'goals'], daily_at=datetime.time(3, 0)),
+    ]
+    refresh_scheduler = RefreshScheduler(stages, refresh_jobs, figure_store, dashboard_outputs)
+
+    def start_refresh():
+        #a failed stage only stops its dependents; cells it feeds keep their placeholder and the refresh jobs
+        #producing them retry soon instead of waiting for their period (or a sheet edit)
+        results, failed = None, {}
+        try:
+            results, _ = run_refresh(stages, on_result=publish_startup_result, failed=failed)
+            #stages whose figures could not be published count as missing too
+            results = {name: result for name, result in results.items() if name not in failed}
+        except Exception as e:
+            print(f"Startup refresh failed: {e!r}")
+        refresh_scheduler.start(results)
+
+    #define the dash app: every cell starts as a placeholder and is filled by its loader callback
+    dash_app = dash_draw_figures.draw_figures(output_patches=heatmap_patch if incremental_heatmap else None,
+                                                figure_store=figure_store, **draw_options)
+    return dash_app, start_refresh
+
+if __name__ == '__main__':
+    #development server only; production runs wsgi.create_app (see the top of this file)
+    dash_app, start_refresh = create_dashboard(FigureStore(cache=FigureCache()))
+
+    #with debug=True the reloader runs this file twice; only ingest in the serving process
+    if not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        threading.Thread(target=start_refresh, name='startup-refresh', daemon=True).start()
+
+    #draw the dash app
+    dash_app.run(debug=DEBUG)
+    #dash_app.run(debug=True, host='127.0.0.1', port=8081)
@@ -0,0 +1,155 @@
+#file: refresh_dag.py
+#DAG-based refresh orchestrator for the dashboard ingest and figure stages.
+#Each stage names the stages it depends on; independent stages run side by side on a thread pool,
+#so time-to-first-render is bounded by the slowest dependency chain instead of the sum of all stages.
+#Coroutine stages (e.g. the Open-Meteo fetch over the shared http client) are run on the shared client's loop.
+
+import inspect
+import time
+import http_client
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+class Stage:
+    """
+    One node of the refresh DAG.
+
+    Args:
+        name: Unique stage name, used as the key of its result.
+        func: Callable (or coroutine function) receiving the results of `deps` as positional args.
+        deps: Names of the stages whose results this stage needs.
+    """
+    def __init__(self, name, func, deps=()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+    def run(self, *args):
+        if inspect.iscoroutinefunction(self.func):
+            return http_client.get_shared_client().run(self.func(*args))
+        return self.func(*args)
+
+def check_dag(stages):
+    # Catch typos and cycles before anything starts running
+    names = [stage.name for stage in stages]
+    if len(names) != len(set(names)):
+        raise ValueError("Duplicate stage names in refresh DAG")
+    deps = {stage.name: stage.deps for stage in stages}
+    for name, stage_deps in deps.items():
+        missing = [dep for dep in stage_deps if dep not in deps]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stage(s): {missing}")
+    visited, in_progress = set(), set()
+    def visit(name):
+        if name in in_progress:
+            raise ValueError(f"Cycle in refresh DAG at stage '{name}'")
+        if name not in visited:
+            in_progress.add(name)
+            for dep in deps[name]:
+                visit(dep)
+            in_progress.discard(name)
+            visited.add(name)
+    for name in deps:
+        visit(name)
+
+def select_stages(stages, targets):
+    """
+    Sub-DAG needed to recompute some stages.
+
+    Args:
+        stages: List of Stage objects.
+        targets: Names of the stages to recompute.
+
+    Returns:
+        The target stages plus everything they transitively depend on, in the original order.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    needed, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(by_name[name].deps)
+    return [stage for stage in stages if stage.name in needed]
+
+def run_refresh(stages, max_workers=8, waterfall=True, on_result=None, failed=None):
+    """
+    Run the stages as soon as their dependencies have finished.
+
+    A stage that raises only stops the stages depending on it (directly or not); the
+    rest of the DAG still runs and publishes its results.
+
+    Args:
+        stages: List of Stage objects.
+        max_workers: Size of the thread pool.
+        waterfall: Print the per-stage timing waterfall when done.
+        on_result: Optional callable(name, results) called as soon as each stage finishes,
+            e.g. to show a figure before the slower stages are done.
+        failed: Optional dict filled with {stage name: exception} for the stages that raised
+            (or whose on_result raised); skipped dependents are left out of results.
+
+    Returns:
+        (results, timings): dicts keyed by stage name; timings holds (start, end)
+        offsets in seconds from the start of the refresh.
+    """
+    check_dag(stages)
+    pending = {stage.name: stage for stage in stages}
+    results, timings, running = {}, {}, {}
+    failed = {} if failed is None else failed
+    skipped = set()
+    t0 = time.perf_counter()
+
+    def timed(stage, args):
+        start = time.perf_counter() - t0
+        result = stage.run(*args)
+        timings[stage.name] = (start, time.perf_counter() - t0)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # Launch every stage whose dependencies are all available, drop the ones depending on a failure
+            for name, stage in list(pending.items()):
+                if any(dep not in results and (dep in failed or dep in skipped) for dep in stage.deps):
+                    skipped.add(name)
+                    del pending[name]
+                elif all(dep in results for dep in stage.deps):
+                    args = [results[dep] for dep in stage.deps]
+                    running[executor.submit(timed, stage, args)] = name
+                    del pending[name]
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    failed[name] = e
+                    print(f"Refresh stage '{name}' failed: {e!r}")
+                    continue
+                if on_result is not None:
+                    try:
+                        on_result(name, results)
+                    except Exception as e:
+                        # The result is kept for the stages depending on it, but nothing showed it
+                        failed[name] = e
+                        print(f"Publishing refresh stage '{name}' failed: {e!r}")
+
+    if skipped:
+        print(f"Refresh stages skipped after a failed dependency: {sorted(skipped)}")
+
+    if waterfall:
+        print_waterfall(timings)
+    return results, timings
+
+def print_waterfall(timings, width=50):
+    """Print one bar per stage, positioned on a shared time axis."""
+    if not timings:
+        return
+    total = max(end for _, end in timings.values()) or 1e-9
+    label_width = max(len(name) for name in timings)
+    print(f"Refresh waterfall (total {total:.2f}s, serial sum {sum(end - start for start, end in timings.values()):.2f}s)")
+    for name, (start, end) in sorted(timings.items(), key=lambda item: item[1]):
+        offset = int(start / total * width)
+        length = max(1, int(round((end - start) / total * width)))
+        bar = ' ' * offset + '#' * min(length, width - offset)
+        print(f"  {name:<{label_width}} |{bar:<{width}}| {start:6.2f}s -> {end:6.2f}s ({end - start:.2f}s)")
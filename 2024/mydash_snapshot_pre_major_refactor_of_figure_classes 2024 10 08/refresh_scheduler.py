@@ -0,0 +1,252 @@
+#file: refresh_scheduler.py
+#Background refresh for the running Dash app. Each refresh job re-runs part of the refresh DAG on its
+#own cadence (weather hourly, gsheet data when the sheet changes, calendar nightly) and publishes the
+#rebuilt figures to a FigureStore. A polling callback in the app sends each browser only the figures that
+#changed since its last poll, so the wall dashboard stays current without restarting the process.
+
+import datetime
+import threading
+from refresh_dag import Stage, select_stages, run_refresh
+
+class LazyOutput:
+    """
+    Output published as the function that builds it, e.g. a figure most browsers only get patches of.
+
+    The value is built on first use (a page load, or a browser that needs the full figure) and then kept.
+
+    Args:
+        build: Function without arguments returning the output value.
+    """
+    def __init__(self, build):
+        self.build = build
+        self.lock = threading.Lock()
+        self.built = False
+        self.value = None
+
+    def get(self):
+        with self.lock:
+            if not self.built:
+                self.value, self.built, self.build = self.build(), True, None
+            return self.value
+
+def resolve_output(value):
+    """The value to send to a browser: LazyOutputs are built, other values returned as is."""
+    return value.get() if isinstance(value, LazyOutput) else value
+
+class FigureStore:
+    """
+    Latest value of every live dashboard output, keyed by component id, with a version per output.
+
+    publish() builds new dicts and swaps them in under the lock, so a callback reading the store
+    always sees one consistent set of figures, never a half-applied refresh.
+
+    Args:
+        cache: Optional figure_cache.FigureCache. Outputs are then serialized once when published
+            (LazyOutputs once first read through serialized_snapshot), and an output whose content key
+            did not change keeps its version.
+    """
+    def __init__(self, cache=None):
+        self.lock = threading.Lock()
+        self.cache = cache
+        self.outputs = {}
+        self.versions = {}
+        self.keys = {}  # component id -> content key (with a cache)
+        self.serialized = {}  # component id -> figure_cache.SerializedOutput (with a cache)
+
+    def publish(self, outputs, keys=None):
+        """
+        Swap in new values for some outputs and bump their versions.
+
+        Args:
+            outputs: {component id: new value or LazyOutput}
+            keys: Optional {component id: content hash of the data the value was built from}
+
+        Returns:
+            {component id: new version} of the outputs that were bumped
+        """
+        serialized = {}
+        if self.cache is not None:
+            keys = keys or {}
+            for component_id, value in outputs.items():
+                if not isinstance(value, LazyOutput):
+                    serialized[component_id] = self.cache.serialize(value, keys.get(component_id))
+        bumped = {}
+        with self.lock:
+            new_outputs, new_versions = dict(self.outputs), dict(self.versions)
+            new_keys, new_serialized = dict(self.keys), dict(self.serialized)
+            for component_id, value in outputs.items():
+                if component_id in serialized:
+                    key, entry = serialized[component_id]
+                    if new_keys.get(component_id) == key:
+                        continue  # Same data as the browsers already have
+                    new_keys[component_id], new_serialized[component_id] = key, entry
+                new_outputs[component_id] = value
+                new_versions[component_id] = bumped[component_id] = new_versions.get(component_id, 0) + 1
+                if self.cache is not None and component_id not in serialized:
+                    # Lazy: serialized when first read, under a key naming this version
+                    new_keys[component_id] = keys.get(component_id) or f'{component_id}@{new_versions[component_id]}'
+                    new_serialized.pop(component_id, None)
+            self.outputs, self.versions = new_outputs, new_versions
+            self.keys, self.serialized = new_keys, new_serialized
+        return bumped
+
+    def snapshot(self):
+        """(outputs, versions) of the current generation; treat both as read-only. Values may be LazyOutputs."""
+        with self.lock:
+            return self.outputs, self.versions
+
+    def serialize_lazy_outputs(self):
+        # Build and serialize the LazyOutputs not serialized yet, outside the lock, then swap them in
+        # unless they were republished meanwhile
+        with self.lock:
+            lazy = {component_id: value for component_id, value in self.outputs.items()
+                    if isinstance(value, LazyOutput) and component_id not in self.serialized}
+            keys = self.keys
+        if not lazy or self.cache is None:
+            return
+        entries = {component_id: self.cache.serialize(value.get(), keys[component_id])[1]
+                   for component_id, value in lazy.items()}
+        with self.lock:
+            new_serialized = dict(self.serialized)
+            for component_id, entry in entries.items():
+                if self.outputs.get(component_id) is lazy[component_id]:
+                    new_serialized[component_id] = entry
+            self.serialized = new_serialized
+
+    def serialized_snapshot(self):
+        """(versions, keys, serialized outputs) of the current generation; keys and serialized are empty without a cache."""
+        self.serialize_lazy_outputs()
+        with self.lock:
+            return self.versions, self.keys, self.serialized
+
+    def changed_since(self, client_versions):
+        """
+        Outputs newer than the ones a browser already shows.
+
+        Args:
+            client_versions: {component id: version} last sent to the browser (None or {} if unknown)
+
+        Returns:
+            (changed, versions): {component id: value} of the newer outputs (pass them through
+            resolve_output before sending), and the versions to store in the browser once they are sent.
+        """
+        outputs, versions = self.snapshot()
+        client_versions = client_versions or {}
+        changed = {component_id: outputs[component_id] for component_id, version in versions.items()
+                   if client_versions.get(component_id, 0) < version}
+        return changed, versions
+
+class RefreshJob:
+    """
+    One refresh cadence.
+
+    Args:
+        name: Job name, used in log lines.
+        targets: Names of the stages to recompute; the stages they depend on are re-run too.
+        every: Seconds between runs (or between change checks when `changed` is given).
+        daily_at: datetime.time to run once a day instead of every N seconds (nightly jobs).
+        changed: Optional callable returning a change marker, e.g. a modified time. The job only
+            runs when the marker differs from the previous check; the first check just records it,
+            since the startup refresh already drew the current data.
+        overrides: Optional {stage name: func} replacing a stage's function for this job only.
+        retry: Seconds before running again when some targets were not produced (by the startup
+            refresh or the last run), whatever `every`, `daily_at` or `changed` say.
+    """
+    def __init__(self, name, targets, every=None, daily_at=None, changed=None, overrides=None, retry=60):
+        if (every is None) == (daily_at is None):
+            raise ValueError(f"Refresh job '{name}' needs exactly one of every / daily_at")
+        self.name = name
+        self.targets = list(targets)
+        self.every = every
+        self.daily_at = daily_at
+        self.changed = changed
+        self.overrides = overrides or {}
+        self.retry = retry
+
+    def seconds_until_next(self, now):
+        """Delay from `now` (naive local datetime) to the next run or change check."""
+        if self.every is not None:
+            return self.every
+        next_run = datetime.datetime.combine(now.date(), self.daily_at)
+        if next_run <= now:
+            next_run += datetime.timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+class RefreshScheduler:
+    """
+    Runs each RefreshJob on its own daemon thread and publishes the results to a FigureStore.
+
+    Args:
+        stages: The full list of refresh DAG stages (as used for the startup refresh).
+        jobs: List of RefreshJob.
+        store: FigureStore the new outputs are published to.
+        outputs: Function mapping a dict of stage results to ({component id: value}, {component id: key}),
+            the keys being content hashes for FigureStore.publish.
+    """
+    def __init__(self, stages, jobs, store, outputs):
+        self.stages = stages
+        self.jobs = jobs
+        self.store = store
+        self.outputs = outputs
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def start(self, results=None):
+        """
+        Start the job threads.
+
+        Args:
+            results: Stage results of the startup refresh. Jobs whose targets are missing
+                from it (or all jobs, if it is None) are retried soon instead of waiting for
+                their period or a sheet change.
+        """
+        for job in self.jobs:
+            complete = results is not None and all(target in results for target in job.targets)
+            thread = threading.Thread(target=self.job_loop, args=(job, complete), name=f"refresh-{job.name}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def job_stages(self, job):
+        stages = select_stages(self.stages, job.targets)
+        return [Stage(stage.name, job.overrides[stage.name], stage.deps) if stage.name in job.overrides else stage
+                for stage in stages]
+
+    def run_job(self, job):
+        """
+        Recompute the job's stages and publish the outputs of the ones that finished.
+
+        Returns:
+            True if every target was produced, False if some failed (they keep their previous figures).
+        """
+        failed = {}
+        results, timings = run_refresh(self.job_stages(job), waterfall=False, failed=failed)
+        outputs, keys = self.outputs(results)
+        self.store.publish(outputs, keys)
+        elapsed = max((end for _, end in timings.values()), default=0)
+        print(f"Refresh job '{job.name}' updated {len(outputs)} output(s) in {elapsed:.2f}s")
+        return not failed and all(target in results for target in job.targets)
+
+    def job_loop(self, job, complete=True):
+        # complete: the job's targets are all in the store. Until they are, the job runs every job.retry seconds.
+        # Otherwise change-driven jobs check right away to record the current marker and the others wait a full period
+        if not complete:
+            delay = job.retry
+        elif job.changed is not None:
+            delay = 0
+        else:
+            delay = job.seconds_until_next(datetime.datetime.now())
+        last_marker = None
+        while not self.stop_event.wait(delay):
+            try:
+                marker = job.changed() if job.changed is not None else None
+                if not complete or job.changed is None or (last_marker is not None and marker != last_marker):
+                    complete = False  # Stays False if the run raises
+                    complete = self.run_job(job)
+                last_marker = marker
+            except Exception as e:
+                # Keep serving the previous figures
+                print(f"Refresh job '{job.name}' failed, keeping the previous figures: {e!r}")
+            delay = job.seconds_until_next(datetime.datetime.now()) if complete else job.retry
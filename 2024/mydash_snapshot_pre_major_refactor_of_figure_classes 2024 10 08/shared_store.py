@@ -0,0 +1,131 @@
+#file: shared_store.py
+#Figure store shared by several server processes (e.g. gunicorn workers) through a directory on disk.
+#One process, the refresh leader, ingests and publishes; every process serves the same serialized figures,
+#so the ingest and the figure serialization are not repeated per worker.
+
+import json
+import os
+import threading
+from pathlib import Path
+from figure_cache import FigureCache, SerializedOutput, content_hash
+from refresh_scheduler import FigureStore
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: waitress serves from one process, which is always the leader
+
+SHARED_STORE_DIR = Path('Data') / 'Figure Store'
+
+def write_atomic(path, data):
+    # Readers never see a partly written file: write a temp file, then rename over the target
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+class SharedFigureStore(FigureStore):
+    """
+    FigureStore mirrored to a directory.
+
+    The leader writes each serialized output once, under a file named after its content key, and then
+    atomically replaces a small manifest of versions and keys. The other processes stat the manifest on
+    every read and, when it changed, load only the outputs whose key changed.
+
+    Args:
+        root: Directory shared by the server processes.
+        cache: FigureCache used by the leader to serialize outputs.
+    """
+    def __init__(self, root=SHARED_STORE_DIR, cache=None):
+        super().__init__(cache=cache or FigureCache())
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.root / 'manifest.json'
+        self.manifest_stamp = None
+        self.sync_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.leader_pid = None  # pid holding the leader lock; forked workers don't inherit leadership
+        self.lock_file = None
+        self.lock_file_pid = None
+
+    @property
+    def is_leader(self):
+        return self.leader_pid == os.getpid()
+
+    def output_path(self, key):
+        return self.root / f'{content_hash(key)}.json'
+
+    def acquire_leadership(self):
+        """Try to become the process that refreshes and publishes; True if this process is the leader."""
+        if self.is_leader:
+            return True
+        if fcntl is not None:
+            if self.lock_file_pid != os.getpid():
+                # Open in this process: a lock file inherited through fork would share the parent's lock
+                self.lock_file = open(self.root / 'leader.lock', 'a')
+                self.lock_file_pid = os.getpid()
+            try:
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+        self.sync()  # Continue from the published versions, so browsers aren't sent unchanged figures again
+        self.leader_pid = os.getpid()
+        return True
+
+    def publish(self, outputs, keys=None):
+        bumped = super().publish(outputs, keys)
+        with self.write_lock:
+            versions, keys, serialized = super().serialized_snapshot()
+            for component_id, key in keys.items():
+                path = self.output_path(key)
+                if not path.exists():
+                    write_atomic(path, serialized[component_id].json)
+            write_atomic(self.manifest_path, json.dumps({'versions': versions, 'keys': keys}).encode())
+            # Drop outputs no longer referenced; a reader still on the old manifest just retries
+            referenced = {self.output_path(key).name for key in keys.values()}
+            for path in self.root.glob('*.json'):
+                if path != self.manifest_path and path.name not in referenced:
+                    path.unlink(missing_ok=True)
+        return bumped
+
+    def sync(self):
+        """Load the outputs published by the leader since the last call (no-op in the leader)."""
+        if self.is_leader:
+            return
+        try:
+            stat = self.manifest_path.stat()
+        except FileNotFoundError:
+            return  # Nothing published yet
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp == self.manifest_stamp:
+            return
+        with self.sync_lock:
+            if stamp == self.manifest_stamp:
+                return
+            try:
+                manifest = json.loads(self.manifest_path.read_bytes())
+            except (FileNotFoundError, ValueError):
+                return
+            with self.lock:
+                outputs, keys, serialized = self.outputs, self.keys, self.serialized
+            new_outputs, new_serialized = {}, {}
+            for component_id, key in manifest['keys'].items():
+                if keys.get(component_id) == key:
+                    new_outputs[component_id], new_serialized[component_id] = outputs[component_id], serialized[component_id]
+                    continue
+                try:
+                    json_bytes = self.output_path(key).read_bytes()
+                except FileNotFoundError:
+                    return  # Leader is mid-update; retried on the next read
+                new_outputs[component_id] = json.loads(json_bytes)
+                new_serialized[component_id] = SerializedOutput(json_bytes)
+            with self.lock:
+                self.outputs, self.versions = new_outputs, manifest['versions']
+                self.keys, self.serialized = dict(manifest['keys']), new_serialized
+            self.manifest_stamp = stamp
+
+    def snapshot(self):
+        self.sync()
+        return super().snapshot()
+
+    def serialized_snapshot(self):
+        self.sync()
+        return super().serialized_snapshot()
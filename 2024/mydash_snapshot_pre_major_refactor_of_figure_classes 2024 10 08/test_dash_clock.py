@@ -0,0 +1,35 @@
+#file: test_dash_clock.py
+#Tests for the page clock: ticked in the browser by default, by a server callback when clientside_clock is off. Run with: python -m pytest
+import json
+import re
+
+import dash_draw_figures
+
+def clock_callbacks(dash_app):
+    return [callback for output_key, callback in dash_app.callback_map.items() if 'live-update-time.children' in output_key]
+
+def test_clientside_clock_sends_no_requests_to_the_server():
+    dash_app = dash_draw_figures.draw_figures()
+    
+    callbacks = clock_callbacks(dash_app)
+    assert len(callbacks) == 1
+    assert 'callback' not in callbacks[0]
+    assert any(dash_draw_figures.CLIENTSIDE_CLOCK.strip() in str(script) for script in dash_app._inline_scripts)
+    polled_outputs = [output_key for output_key, callback, interval in dash_draw_figures.server_polling(dash_app)]
+    assert not any('live-update-time' in output_key for output_key in polled_outputs)
+
+def test_server_clock_is_polled_every_interval_and_answers_the_time():
+    dash_app = dash_draw_figures.draw_figures(clientside_clock=False)
+    
+    polling = [(output_key, callback, interval) for output_key, callback, interval in dash_draw_figures.server_polling(dash_app)
+               if 'live-update-time' in output_key]
+    assert len(polling) == 1
+    output_key, callback, interval = polling[0]
+    assert 'callback' in callback
+    
+    response = dash_app.server.test_client().post('/_dash-update-component',
+                                                  json=dash_draw_figures.callback_request(dash_app, output_key, callback, 1))
+    assert response.status_code == 200
+    clock = json.loads(response.data)['response']
+    assert re.fullmatch(r'\d\d:\d\d:\d\d', clock['live-update-time']['children'])
+    assert re.fullmatch(r'\w+\n\d{4} \d\d \d\d', clock['live-update-day-date']['children'])
@@ -0,0 +1,57 @@
+#file: test_figure_cache.py
+#Tests for the pre-serialized figure cache and the cached page layout (ETag, 304, compression). Run with: python -m pytest
+import gzip
+import json
+
+import plotly.graph_objects as go
+import pytest
+
+import dash_draw_figures
+from figure_cache import FigureCache, content_hash
+from refresh_scheduler import FigureStore
+
+def figure(y):
+    return go.Figure(go.Scatter(x=[1, 2, 3], y=y))
+
+@pytest.fixture
+def store():
+    return FigureStore(cache=FigureCache())
+
+@pytest.fixture
+def client(store):
+    dash_app = dash_draw_figures.draw_figures(figure_store=store)
+    return dash_app.server.test_client()
+
+def test_same_data_keeps_version_and_serialized_bytes(store):
+    store.publish({'goals': figure([1, 2, 3])}, {'goals': content_hash([1, 2, 3])})
+    _, _, first = store.serialized_snapshot()
+    bumped = store.publish({'goals': figure([1, 2, 3])}, {'goals': content_hash([1, 2, 3])})
+
+    assert bumped == {}  # Browsers already have it: nothing to push
+    assert store.serialized_snapshot()[2]['goals'] is first['goals']
+    assert store.publish({'goals': figure([3, 2, 1])}, {'goals': content_hash([3, 2, 1])}) == {'goals': 2}
+
+def test_layout_etag_answers_304_until_the_store_changes(store, client):
+    store.publish({'goals': figure([1, 2, 3])})
+    first = client.get('/_dash-layout')
+    etag = first.headers['ETag']
+
+    assert first.status_code == 200
+    assert b'"y":[1,2,3]' in first.data.replace(b' ', b'')
+    assert client.get('/_dash-layout', headers={'If-None-Match': etag}).status_code == 304
+
+    store.publish({'goals': figure([3, 2, 1])})
+    changed = client.get('/_dash-layout', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert b'"y":[3,2,1]' in changed.data.replace(b' ', b'')
+
+def test_layout_payload_is_compressed_once(store, client):
+    store.publish({'goals': figure([1, 2, 3])})
+    plain = client.get('/_dash-layout')
+    compressed = client.get('/_dash-layout', headers={'Accept-Encoding': 'gzip'})
+
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert isinstance(json.loads(plain.data), dict)  # The spliced payload is still valid layout JSON
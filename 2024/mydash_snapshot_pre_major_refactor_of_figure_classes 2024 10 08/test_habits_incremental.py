@@ -0,0 +1,119 @@
+#file: test_habits_incremental.py
+#Tests for the incremental habits heatmap: one diff per ingest, patched into every browser. Run with: python -m pytest
+import plotly.io as pio
+import pytest
+
+import dash_define_figures
+import dash_draw_figures
+import habits_incremental
+from figure_cache import FigureCache
+from refresh_scheduler import FigureStore, resolve_output
+
+def habits_row(month, day, win_rate):
+    # Only the cells parse_heatmap_row reads: month (5), day (6) and win rate (10)
+    return ['', '', '', '', '', str(month), str(day), '', '', '', f'{win_rate}%']
+
+@pytest.fixture
+def store():
+    return FigureStore()
+
+@pytest.fixture
+def state():
+    return habits_incremental.HabitsHeatmapState(recheck_rows=2)
+
+def apply_patch(figure, patch):
+    # Replay a Patch the way the browser does, on the figure as plain JSON
+    figure = pio.from_json(pio.to_json(figure)).to_plotly_json()
+    z = [list(row) for row in figure['data'][0]['z']]
+    for operation in patch.to_plotly_json()['operations']:
+        location, params = operation['location'][3:], operation['params']
+        if operation['operation'] == 'Assign':
+            target = z
+            for index in location[:-1]:
+                target = target[index]
+            target[location[-1]] = params['value']
+        elif operation['operation'] == 'Append':
+            target = z
+            for index in location:
+                target = target[index]
+            target.append(params['value'])
+    return z
+
+def stored_z(store):
+    outputs, _ = store.snapshot()
+    return [list(row) for row in resolve_output(outputs['habits-heatmap']).data[0].z]
+
+def test_publish_heatmap_diffs_once_per_ingest(store, state):
+    rows = [habits_row(1, 1, 50), habits_row(1, 2, 75)]
+    habits_incremental.publish_heatmap(state, store, rows)
+    habits_incremental.publish_heatmap(state, store, rows)  # Same data: nothing published
+
+    assert store.snapshot()[1] == {'habits-heatmap': 1}
+    assert stored_z(store) == [[0.5, 0.75]]
+
+def test_browsers_at_different_versions_get_their_own_patch(store, state):
+    rows = [habits_row(1, 1, 50)]
+    habits_incremental.publish_heatmap(state, store, rows)
+    first = resolve_output(store.snapshot()[0]['habits-heatmap'])
+    rows = rows + [habits_row(1, 2, 75)]
+    habits_incremental.publish_heatmap(state, store, rows)
+    second = resolve_output(store.snapshot()[0]['habits-heatmap'])
+    rows = rows + [habits_row(2, 1, 100)]
+    habits_incremental.publish_heatmap(state, store, rows)
+
+    # One tab polling does not consume the diff for the others
+    for _ in range(2):
+        assert apply_patch(first, habits_incremental.patch_since(state, 1, 3)) == stored_z(store)
+        assert apply_patch(second, habits_incremental.patch_since(state, 2, 3)) == stored_z(store)
+    assert habits_incremental.patch_since(state, 0, 3) is None  # Never sent the heatmap: full figure
+
+def test_heatmap_figure_built_only_when_needed(monkeypatch, state):
+    built = []
+    build_figure = dash_define_figures.habits_heatmap_figure
+    monkeypatch.setattr(dash_define_figures, 'habits_heatmap_figure', lambda z: built.append(z) or build_figure(z))
+    store = FigureStore(cache=FigureCache())
+    rows = [habits_row(1, 1, 50)]
+    for row in [habits_row(1, 2, 75), habits_row(1, 3, 25)]:
+        habits_incremental.publish_heatmap(state, store, rows)
+        rows = rows + [row]
+    assert built == []  # Browsers at these versions only need patches
+
+    versions, _, serialized = store.serialized_snapshot()  # A page load needs the full figure
+    assert built == [[[0.5, 0.75]]]  # Built once, from the grid as it was at the published version
+    assert versions == {'habits-heatmap': 2}
+    assert b'0.75' in serialized['habits-heatmap'].json
+    store.serialized_snapshot()
+    assert len(built) == 1
+
+def test_rebuild_and_old_versions_fall_back_to_full_figure(store, state):
+    state.max_history = 1
+    rows = [habits_row(1, 1, 50), habits_row(1, 2, 75), habits_row(1, 3, 10)]
+    for count in range(1, 4):
+        habits_incremental.publish_heatmap(state, store, rows[:count])
+
+    assert habits_incremental.patch_since(state, 1, 3) is None  # Version 2 no longer kept
+    assert habits_incremental.patch_since(state, 2, 3) is not None
+
+    habits_incremental.publish_heatmap(state, store, rows[:2] + [habits_row(3, 1, 20)])  # Last row re-dated
+    assert habits_incremental.patch_since(state, 3, 4) is None
+    assert stored_z(store) == [[0.5, 0.75], [0.2, 0]]
+
+def test_push_sends_patch_or_full_figure_per_browser(store, state):
+    dash_app = dash_draw_figures.draw_figures(
+        figure_store=store,
+        output_patches=lambda component_id, client_version, version: habits_incremental.patch_since(state, client_version, version))
+    client = dash_app.server.test_client()
+    (output_key, callback, _), = [polling for polling in dash_draw_figures.server_polling(dash_app)
+                                  if 'figure-poll-interval' in str(polling[1]['inputs'])]
+    habits_incremental.publish_heatmap(state, store, [habits_row(1, 1, 50)])
+    habits_incremental.publish_heatmap(state, store, [habits_row(1, 1, 50), habits_row(1, 2, 75)])
+
+    def poll(client_versions):
+        body = dash_draw_figures.callback_request(dash_app, output_key, callback, 1)
+        body['state'][0]['value'] = client_versions
+        return client.post('/_dash-update-component', json=body).get_json()['response']['habits-heatmap']['figure']
+
+    patched, full = poll({'habits-heatmap': 1}), poll({})
+    assert patched['__dash_patch_update'] == '__dash_patch_update'
+    assert full['data'][0]['z'] == [[0.5, 0.75]]
+    assert poll({'habits-heatmap': 1}) == patched  # Second tab at the same version gets the same patch
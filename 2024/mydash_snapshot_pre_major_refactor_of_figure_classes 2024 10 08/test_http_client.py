@@ -0,0 +1,91 @@
+#file: test_http_client.py
+#Tests for the shared HTTP client against a local aiohttp server. Run with: python -m pytest
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import http_client
+
+@pytest.fixture
+def server():
+    # Local server on its own loop thread; records the client port of every request and fails /flaky once
+    state = {'peers': [], 'flaky_calls': 0}
+
+    async def ok(request):
+        state['peers'].append(request.transport.get_extra_info('peername')[1])
+        return web.Response(body=b'ok')
+
+    async def flaky(request):
+        state['flaky_calls'] += 1
+        if state['flaky_calls'] == 1:
+            return web.Response(status=503, headers={'Retry-After': '0'})
+        return web.json_response({'calls': state['flaky_calls']})
+
+    async def start():
+        app = web.Application()
+        app.router.add_get('/ok', ok)
+        app.router.add_post('/flaky', flaky)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        return runner, site._server.sockets[0].getsockname()[1]
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    runner, port = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    state['url'] = f'http://127.0.0.1:{port}'
+    yield state
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+@pytest.fixture
+def client():
+    client = http_client.SharedHttpClient(limit_per_host=2, backoff_factor=0)
+    yield client
+    client.close()
+
+def test_threads_share_one_pooled_session(server, client):
+    def fetch(_):
+        return client.get_bytes_sync(server['url'] + '/ok')
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        bodies = list(executor.map(fetch, range(40)))
+
+    assert bodies == [b'ok'] * 40
+    assert len(set(server['peers'])) <= 2  # Keep-alive connections reused, per-host limit respected
+
+def test_session_outlives_each_call(server, client):
+    client.get_bytes_sync(server['url'] + '/ok')
+    session = client._session
+    client.get_bytes_sync(server['url'] + '/ok')
+
+    assert client._session is session
+    assert not session.closed
+
+def test_retries_server_errors(server, client):
+    assert client.post_json_sync(server['url'] + '/flaky', {}) == {'calls': 2}
+
+def test_session_outside_client_loop_is_refused(client):
+    async def use_session():
+        return client.session()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(use_session())
+
+def test_close_stops_loop_thread(server, client):
+    client.get_bytes_sync(server['url'] + '/ok')
+    thread, session = client._thread, client._session
+
+    client.close()
+
+    assert not thread.is_alive()
+    assert session.closed
+    assert client.get_bytes_sync(server['url'] + '/ok') == b'ok'  # Used again after close: a new loop and session
@@ -0,0 +1,91 @@
+#file: test_refresh_dag.py
+#Tests for the refresh DAG runner. Run with: python -m pytest
+import threading
+
+import pytest
+
+from refresh_dag import Stage, run_refresh, select_stages
+
+def fail():
+    raise ValueError("sheet unavailable")
+
+def test_failed_stage_only_skips_its_dependents():
+    stages = [
+        Stage('gsheet', fail),
+        Stage('habits', lambda g: g, deps=['gsheet']),
+        Stage('figs_habits', lambda h: h, deps=['habits']),
+        Stage('weather', lambda: 'forecast'),
+        Stage('figs_weather', lambda w: w.upper(), deps=['weather']),
+    ]
+    published, failed = [], {}
+
+    results, timings = run_refresh(stages, waterfall=False, failed=failed,
+                                   on_result=lambda name, results: published.append(name))
+
+    assert results == {'weather': 'forecast', 'figs_weather': 'FORECAST'}
+    assert sorted(published) == ['figs_weather', 'weather']
+    assert list(failed) == ['gsheet'] and isinstance(failed['gsheet'], ValueError)
+    assert 'habits' not in timings and 'figs_habits' not in timings
+
+def test_failed_publish_keeps_result_for_dependents():
+    stages = [Stage('gsheet', lambda: 'rows'), Stage('quotes', lambda g: g + '!', deps=['gsheet'])]
+    failed = {}
+
+    def on_result(name, results):
+        if name == 'gsheet':
+            raise OSError("store unavailable")
+
+    results, _ = run_refresh(stages, waterfall=False, failed=failed, on_result=on_result)
+
+    assert results == {'gsheet': 'rows', 'quotes': 'rows!'}
+    assert list(failed) == ['gsheet']
+
+def test_independent_stages_run_side_by_side():
+    # Each ingest waits for the other: only passes if they run at the same time
+    both_started = threading.Barrier(2, timeout=5)
+    first_figure = threading.Event()
+
+    def ingest(value):
+        def run():
+            both_started.wait()
+            return value
+        return run
+
+    def slow_figure(weather):
+        assert first_figure.wait(timeout=5)  # The fast branch was published before this one finished
+        return weather + ' figure'
+
+    stages = [
+        Stage('gsheet', ingest('rows')),
+        Stage('weather', ingest('forecast')),
+        Stage('figs_habits', lambda g: g + ' figure', deps=['gsheet']),
+        Stage('figs_weather', slow_figure, deps=['weather']),
+        Stage('dashboard', lambda h, w: (h, w), deps=['figs_habits', 'figs_weather']),
+    ]
+    order = []
+
+    def on_result(name, results):
+        order.append(name)
+        if name == 'figs_habits':
+            first_figure.set()
+
+    results, timings = run_refresh(stages, waterfall=False, on_result=on_result)
+
+    assert results['dashboard'] == ('rows figure', 'forecast figure')  # Dependency results in deps order
+    assert order.index('figs_habits') < order.index('figs_weather') < order.index('dashboard')
+    assert timings['dashboard'][0] >= max(timings['figs_habits'][1], timings['figs_weather'][1])
+
+@pytest.mark.parametrize('stages, message', [
+    ([Stage('a', lambda b: b, deps=['b']), Stage('b', lambda a: a, deps=['a'])], 'Cycle'),
+    ([Stage('a', lambda x: x, deps=['missing'])], 'unknown stage'),
+    ([Stage('a', lambda: 1), Stage('a', lambda: 2)], 'Duplicate'),
+])
+def test_invalid_dag_is_rejected_before_running(stages, message):
+    with pytest.raises(ValueError, match=message):
+        run_refresh(stages, waterfall=False)
+
+def test_select_stages_keeps_dependencies_in_order():
+    stages = [Stage('gsheet', fail), Stage('time', fail), Stage('habits', fail, deps=['gsheet']),
+              Stage('figs_habits', fail, deps=['habits']), Stage('figs_time', fail, deps=['time'])]
+
+    assert [stage.name for stage in select_stages(stages, ['figs_habits'])] == ['gsheet', 'habits', 'figs_habits']
@@ -0,0 +1,124 @@
+#file: test_refresh_scheduler.py
+#Tests for the background refresh jobs. Run with: python -m pytest
+import datetime
+import threading
+
+import pytest
+
+from refresh_dag import Stage
+from refresh_scheduler import FigureStore, RefreshJob, RefreshScheduler
+
+def make_scheduler(jobs, stages, published):
+    store = FigureStore()
+
+    def outputs(results):
+        values = {name: result for name, result in results.items() if name.startswith('figs_')}
+        published.set()
+        return values, {}
+    return RefreshScheduler(stages, jobs, store, outputs), store
+
+def test_missing_startup_output_is_retried_soon():
+    # Nightly job whose startup run failed: retried after job.retry seconds, not at the next daily run
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ValueError("calendar export unavailable")
+        return 'calendar'
+
+    published = threading.Event()
+    stages = [Stage('time', flaky), Stage('figs_time', lambda t: t.upper(), deps=['time'])]
+    job = RefreshJob('calendar', ['figs_time'], daily_at=datetime.time(3, 0), retry=0.01)
+    scheduler, store = make_scheduler([job], stages, published)
+
+    scheduler.start(results={})
+    try:
+        for _ in range(100):
+            if store.snapshot()[0].get('figs_time') == 'CALENDAR':
+                break
+            published.wait(0.05)
+            published.clear()
+    finally:
+        scheduler.stop()
+    assert store.snapshot()[0] == {'figs_time': 'CALENDAR'}
+    assert len(attempts) == 2
+
+def test_change_driven_job_runs_first_check_when_output_missing():
+    published = threading.Event()
+    stages = [Stage('gsheet', lambda: 'rows'), Stage('figs_habits', lambda g: g, deps=['gsheet'])]
+    job = RefreshJob('gsheet', ['figs_habits'], every=60, changed=lambda: 'modified-1', retry=0)
+    scheduler, store = make_scheduler([job], stages, published)
+
+    scheduler.start(results=None)  # Startup refresh raised: nothing is known to be in the store
+    try:
+        assert published.wait(5)
+    finally:
+        scheduler.stop()
+    assert store.snapshot()[0] == {'figs_habits': 'rows'}
+
+def test_complete_change_driven_job_only_records_marker():
+    published = threading.Event()
+    stages = [Stage('gsheet', lambda: 'rows'), Stage('figs_habits', lambda g: g, deps=['gsheet'])]
+    checked = threading.Event()
+    job = RefreshJob('gsheet', ['figs_habits'], every=60, changed=lambda: checked.set() or 'modified-1')
+    scheduler, store = make_scheduler([job], stages, published)
+
+    scheduler.start(results={'gsheet': 'rows', 'figs_habits': 'rows'})
+    try:
+        assert checked.wait(5)
+    finally:
+        scheduler.stop()
+    assert not published.is_set()
+
+def test_job_schedule():
+    nightly = RefreshJob('calendar', ['figs_time'], daily_at=datetime.time(3, 0))
+    assert nightly.seconds_until_next(datetime.datetime(2025, 1, 1, 2, 0)) == 3600
+    assert nightly.seconds_until_next(datetime.datetime(2025, 1, 1, 3, 0)) == 24 * 3600  # Just ran: tomorrow
+    assert RefreshJob('weather', ['weather'], every=600).seconds_until_next(datetime.datetime.now()) == 600
+    with pytest.raises(ValueError):
+        RefreshJob('both', ['weather'], every=60, daily_at=datetime.time(3, 0))
+
+def test_change_driven_job_runs_once_per_new_marker():
+    published = threading.Event()
+    markers = iter(['modified-1', 'modified-1', 'modified-2'])
+    done = threading.Event()
+
+    def changed():
+        marker = next(markers, None)
+        if marker is None:
+            done.set()
+            return 'modified-2'
+        return marker
+
+    runs = []
+    stages = [Stage('gsheet', lambda: runs.append(1) or 'rows'), Stage('figs_habits', lambda g: g, deps=['gsheet'])]
+    job = RefreshJob('gsheet', ['figs_habits'], every=0.01, changed=changed)
+    scheduler, store = make_scheduler([job], stages, published)
+
+    scheduler.start(results={'gsheet': 'rows', 'figs_habits': 'rows'})
+    try:
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
+    assert len(runs) == 1  # Only the switch to modified-2 re-ran the sheet stages
+    assert store.snapshot()[1] == {'figs_habits': 1}
+
+def test_overrides_apply_to_their_job_only():
+    stages = [Stage('weather_fetch', lambda: 'cached'), Stage('weather', lambda t: t, deps=['weather_fetch'])]
+    job = RefreshJob('weather', ['weather'], every=3600, overrides={'weather_fetch': lambda: 'refetched'})
+    scheduler, _ = make_scheduler([job], stages, threading.Event())
+
+    assert [stage.func() for stage in scheduler.job_stages(job)[:1]] == ['refetched']
+    assert stages[0].func() == 'cached'
+
+def test_changed_since_sends_only_newer_outputs():
+    store = FigureStore()
+    store.publish({'weather-temp-hr': 'fig-1', 'quotes': 'quote-1'})
+    store.publish({'weather-temp-hr': 'fig-2'})
+
+    changed, versions = store.changed_since({'weather-temp-hr': 1, 'quotes': 1})
+
+    assert changed == {'weather-temp-hr': 'fig-2'}
+    assert versions == {'weather-temp-hr': 2, 'quotes': 1}
+    assert store.changed_since(None)[0] == {'weather-temp-hr': 'fig-2', 'quotes': 'quote-1'}  # New browser: everything
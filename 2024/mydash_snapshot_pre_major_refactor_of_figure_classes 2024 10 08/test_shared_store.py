@@ -0,0 +1,49 @@
+#file: test_shared_store.py
+#Tests for the figure store shared by the server processes: leader election, failover and follower sync. Run with: python -m pytest
+import plotly.graph_objects as go
+import pytest
+
+from shared_store import SharedFigureStore, fcntl
+
+def figure(y):
+    return go.Figure(go.Scatter(x=[1, 2, 3], y=y))
+
+def test_followers_load_what_the_leader_publishes(tmp_path):
+    leader, follower = SharedFigureStore(tmp_path), SharedFigureStore(tmp_path)
+    assert leader.acquire_leadership()
+    
+    leader.publish({'fig-a': figure([1, 2, 3]), 'fig-b': figure([4, 5, 6])})
+    outputs, versions = follower.snapshot()
+    assert versions == {'fig-a': 1, 'fig-b': 1}
+    assert outputs['fig-a']['data'][0]['y'] == [1, 2, 3]
+    
+    leader.publish({'fig-a': figure([7, 8, 9])})
+    outputs, versions = follower.snapshot()
+    assert versions == {'fig-a': 2, 'fig-b': 1}
+    assert outputs['fig-a']['data'][0]['y'] == [7, 8, 9]
+    assert follower.serialized_snapshot()[2]['fig-a'].json == leader.serialized_snapshot()[2]['fig-a'].json
+
+@pytest.mark.skipif(fcntl is None, reason='leader lock needs fcntl')
+def test_leadership_fails_over_when_the_leader_exits(tmp_path):
+    leader, follower = SharedFigureStore(tmp_path), SharedFigureStore(tmp_path)
+    assert leader.acquire_leadership()
+    assert not follower.acquire_leadership()
+    assert not follower.is_leader
+    leader.publish({'fig-a': figure([1, 2, 3])})
+    
+    leader.lock_file.close()  # What the OS does when the leader's worker exits
+    assert follower.acquire_leadership()
+    assert follower.is_leader
+    # The new leader continues from the published versions: unchanged data isn't sent to the browsers again
+    assert follower.publish({'fig-a': figure([1, 2, 3])}) == {}
+    assert follower.publish({'fig-a': figure([3, 2, 1])}) == {'fig-a': 2}
+    assert SharedFigureStore(tmp_path).snapshot()[1] == {'fig-a': 2}
+
+def test_unreferenced_outputs_are_removed(tmp_path):
+    leader = SharedFigureStore(tmp_path)
+    assert leader.acquire_leadership()
+    leader.publish({'fig-a': figure([1, 2, 3])})
+    leader.publish({'fig-a': figure([4, 5, 6])})
+    
+    output_files = [path for path in tmp_path.glob('*.json') if path != leader.manifest_path]
+    assert output_files == [leader.output_path(leader.keys['fig-a'])]
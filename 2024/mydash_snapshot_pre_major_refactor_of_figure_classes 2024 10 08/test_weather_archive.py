@@ -0,0 +1,95 @@
+#file: test_weather_archive.py
+#Tests for the month-partitioned weather archive with a fixture backfill source. Run with: python -m pytest
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from weather_archive import WeatherArchive
+
+LOCATIONS = {'Home': (41.9, -87.6)}
+
+def hourly_table(start, end, variable='temperature_2m', value=10.0, location='Home', model='best_match'):
+    # weather_long_table layout, one row per hour in [start, end)
+    times = pd.date_range(start, end, freq='h', tz='UTC', inclusive='left')
+    return pa.table({
+        'location': [location] * len(times),
+        'model': [model] * len(times),
+        'variable': [variable] * len(times),
+        'time': pa.array(times.to_pydatetime(), pa.timestamp('s', tz='UTC')),
+        'value': [value] * len(times),
+    })
+
+class FixtureSource:
+    """Historical source serving whole days of a constant value; records every requested date span."""
+    def __init__(self, value=1.0):
+        self.value = value
+        self.requests = []
+
+    def fetch(self, locations, variables, start_date, end_date):
+        self.requests.append((start_date, end_date))
+        tables = [hourly_table(start_date, end_date + pd.Timedelta(days=1), variable, self.value, location)
+                  for location in locations for variable in variables]
+        return pa.concat_tables(tables)
+
+@pytest.fixture
+def archive(tmp_path):
+    return WeatherArchive(tmp_path / 'archive')
+
+def test_missing_spans_stop_before_a_month_boundary_end(archive):
+    assert archive.missing_observation_spans(['temperature_2m'], ['Home'], '2024-01-01', '2024-03-01') == [
+        (pd.Timestamp('2024-01-01', tz='UTC'), pd.Timestamp('2024-02-29 23:00', tz='UTC'))]
+
+    archive.append(hourly_table('2024-02-01', '2024-03-01'), kind='observation')
+    # No empty span for March, whose first hour is the (exclusive) end
+    assert archive.missing_observation_spans(['temperature_2m'], ['Home'], '2024-01-01', '2024-03-01') == [
+        (pd.Timestamp('2024-01-01', tz='UTC'), pd.Timestamp('2024-01-31 23:00', tz='UTC'))]
+
+def test_query_prefers_observations_and_newest_forecast(archive):
+    archive.append(hourly_table('2024-01-31', '2024-02-02', value=5.0), fetched_at='2024-01-30')
+    archive.append(hourly_table('2024-02-01', '2024-02-02', value=6.0), fetched_at='2024-01-31')
+    archive.append(hourly_table('2024-02-01 12:00', '2024-02-02', value=7.0), kind='observation')
+
+    frame = archive.query('temperature_2m', '2024-01-31', '2024-02-02')
+
+    assert len(frame) == 48  # One value per hour across the month partitions
+    assert frame.set_index('time')['value'].groupby(lambda t: (t.day, t.hour >= 12)).first().to_dict() == {
+        (31, False): 5.0, (31, True): 5.0, (1, False): 6.0, (1, True): 7.0}
+
+def test_backfill_fills_only_missing_months(archive):
+    source = FixtureSource()
+    archive.append(hourly_table('2024-02-01', '2024-03-01'), kind='observation')  # February already observed
+
+    appended = archive.backfill(source, LOCATIONS, ['temperature_2m'], '2024-01-01', '2024-04-01')
+
+    assert source.requests == [(pd.Timestamp('2024-01-01').date(), pd.Timestamp('2024-01-31').date()),
+                               (pd.Timestamp('2024-03-01').date(), pd.Timestamp('2024-03-31').date())]
+    assert appended == (31 + 31) * 24
+    assert archive.backfill(source, LOCATIONS, ['temperature_2m'], '2024-01-01', '2024-04-01') == 0
+    observed = archive.query('temperature_2m', '2024-01-01', '2024-04-01')
+    assert len(observed) == (31 + 29 + 31) * 24
+    assert set(observed['kind']) == {'observation'}
+
+def test_overlapping_forecasts_are_compacted_and_read_deduplicated(tmp_path):
+    archive = WeatherArchive(tmp_path / 'archive', max_fragments=3)
+    # Hourly refetches of a 3-day forecast: each one overlaps the previous by all but an hour
+    for fetch in range(10):
+        start = pd.Timestamp('2024-01-30', tz='UTC') + pd.Timedelta(hours=fetch)
+        archive.append(hourly_table(start, start + pd.Timedelta(days=3), value=float(fetch)),
+                       fetched_at=start)
+
+    for month in ['2024-01', '2024-02']:
+        assert len(archive.month_files(month)) <= 3
+    assert archive.scan('2024-01-30', '2024-02-03').num_rows < 10 * 72  # Superseded forecasts were dropped...
+    frame = archive.query('temperature_2m', '2024-01-30', '2024-02-03')
+    assert len(frame) == 72 + 9  # ...and a range read has exactly one row per hour
+    assert frame['time'].is_unique
+    newest = frame.set_index('time')['value']
+    assert newest[pd.Timestamp('2024-01-30 00:00', tz='UTC')] == 0.0
+    assert newest[pd.Timestamp('2024-02-01 12:00', tz='UTC')] == 9.0
+    assert newest[pd.Timestamp('2024-02-02 08:00', tz='UTC')] == 9.0
+
+    for month in ['2024-01', '2024-02']:
+        archive.compact_month(month)
+    compacted = archive.scan('2024-01-30', '2024-02-03').to_pandas()
+    assert len(compacted) == 72 + 9 and compacted['time'].is_unique
+    assert archive.query('temperature_2m', '2024-01-30', '2024-02-03').equals(frame)
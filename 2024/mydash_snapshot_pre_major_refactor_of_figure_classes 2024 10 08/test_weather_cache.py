@@ -0,0 +1,110 @@
+#file: test_weather_cache.py
+#Tests for the forecast cache: model-run expiry, stale-while-revalidate and the on-disk copies. Run with: python -m pytest
+import datetime
+import os
+import threading
+
+import pyarrow as pa
+import pytest
+
+import weather_cache
+from weather_cache import ForecastCache, latest_model_run, next_model_update
+
+UTC = datetime.timezone.utc
+LOCATIONS = {'Austin': (30.27, -97.73)}
+VARIABLES = {'hourly': ['temperature_2m']}
+
+def at(hour, minute=0):
+    return datetime.datetime(2025, 1, 1, hour, minute, tzinfo=UTC)
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class CountingFetch:
+    """Forecast source returning a one-row table per call, tagged with the call number."""
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, locations, models):
+        with self.lock:
+            self.calls += 1
+            return {'hourly': pa.table({'value': [float(self.calls)]})}
+
+def value(tables):
+    return tables['hourly']['value'][0].as_py()
+
+def test_model_runs_follow_the_schedule():
+    # gfs_global: a run every 6 hours, available 4 hours after it starts
+    assert latest_model_run('gfs_global', at(9, 59)) == at(0)
+    assert latest_model_run('gfs_global', at(10)) == at(6)
+    assert next_model_update('gfs_global', at(10)) == at(16)
+    # Unknown models fall back to the hourly default
+    assert latest_model_run('no_such_model', at(10, 30)) == at(9)
+
+def test_entry_expires_when_the_next_run_is_published():
+    clock, fetch = Clock(at(10)), CountingFetch()
+    cache = ForecastCache(fetch, VARIABLES, clock=clock)
+
+    assert value(cache.get(LOCATIONS, ['gfs_global'])) == 1
+    clock.now = at(15, 59)  # Same run (06:00) until 16:00
+    assert value(cache.get(LOCATIONS, ['gfs_global'])) == 1
+    assert fetch.calls == 1
+
+    clock.now = at(16)  # The 12:00 run is out: refetched when the caller waits for it
+    assert value(cache.get(LOCATIONS, ['gfs_global'], wait=True)) == 2
+    assert fetch.calls == 2
+
+def test_stale_entry_is_served_while_revalidating(monkeypatch):
+    clock, fetch = Clock(at(10)), CountingFetch()
+    cache = ForecastCache(fetch, VARIABLES, clock=clock)
+    cache.get(LOCATIONS, ['best_match'])
+    revalidations = []
+    monkeypatch.setattr(threading, 'Thread', lambda target, **kwargs: revalidations.append(target) or
+                        type('Started', (), {'start': lambda self: None})())
+
+    clock.now = at(11)
+    assert value(cache.get(LOCATIONS, ['best_match'])) == 1  # Stale copy returned at once
+    assert value(cache.get(LOCATIONS, ['best_match'])) == 1
+    assert len(revalidations) == 1  # One revalidation per key at a time
+
+    revalidations[0]()
+    assert value(cache.get(LOCATIONS, ['best_match'])) == 2
+
+def test_saved_forecast_survives_a_restart(tmp_path):
+    clock = Clock(at(10))
+    ForecastCache(CountingFetch(), VARIABLES, cache_dir=tmp_path, clock=clock).get(LOCATIONS, ['best_match'])
+
+    fetch = CountingFetch()
+    restarted = ForecastCache(fetch, VARIABLES, cache_dir=tmp_path, clock=clock)
+
+    assert value(restarted.get(LOCATIONS, ['best_match'])) == 1
+    assert fetch.calls == 0
+
+def test_concurrent_saves_use_their_own_temp_files(tmp_path, monkeypatch):
+    cache = ForecastCache(CountingFetch(), VARIABLES, cache_dir=tmp_path, clock=Clock(at(10)))
+    key = cache.key(LOCATIONS, ['best_match'])
+    replaced = []
+    replace = os.replace
+    monkeypatch.setattr(weather_cache.os, 'replace', lambda src, dst: replaced.append(src.name) or replace(src, dst))
+
+    all_running = threading.Barrier(8, timeout=5)  # All writers alive at once, so their thread ids differ
+
+    def save(i):
+        all_running.wait()
+        cache.save(key, {'runs': {'best_match': at(9).isoformat()}, 'tables': {'hourly': pa.table({'value': [float(i)]})}})
+
+    threads = [threading.Thread(target=save, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(replaced)) == 8  # One temp file per writer thread, never shared
+    assert all(f'.{os.getpid()}.' in name for name in replaced)
+    assert list(tmp_path.glob('*.tmp')) == []
+    assert value(cache.load(key)['tables']) in range(8)
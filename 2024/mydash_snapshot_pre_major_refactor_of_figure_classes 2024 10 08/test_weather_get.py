@@ -0,0 +1,157 @@
+#file: test_weather_get.py
+#Tests for the Open-Meteo ingest (several locations and models per request, decoded into one long table)
+#and the Weather tab export (the gspread client is reused and an unchanged forecast skips the sheet). Run with: python -m pytest
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import weather_get
+
+class FakeVariable:
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float32)
+
+    def ValuesLength(self):
+        return len(self.values)
+
+    def ValuesAsNumpy(self):
+        return self.values
+
+class FakeBlock:
+    def __init__(self, start, variables):
+        self.start = start
+        self.variables = [FakeVariable(values) for values in variables]
+
+    def Time(self):
+        return self.start
+
+    def TimeEnd(self):
+        return self.start + 3600 * len(self.variables[0].values)
+
+    def Interval(self):
+        return 3600
+
+    def VariablesLength(self):
+        return len(self.variables)
+
+    def Variables(self, i):
+        return self.variables[i]
+
+class FakeResponse:
+    """One decoded location x model response with an hourly block (temperature, precipitation probability)."""
+    def __init__(self, location_id, model, temperatures, probabilities, start=1735689600):
+        self.location_id = location_id
+        self.model = model
+        self.hourly = FakeBlock(start, [temperatures, probabilities])
+
+    def LocationId(self):
+        return self.location_id
+
+    def Model(self):
+        return self.model
+
+    def Hourly(self):
+        return self.hourly
+
+MODEL_CODES = {name: code for code, name in weather_get.MODEL_NAMES.items()}
+
+def test_one_request_for_every_location_and_model():
+    class FakeClient:
+        async def get_bytes(self, url, params=None):
+            self.params = params
+            return b''
+
+    client = FakeClient()
+    locations = {'Austin': (30.27, -97.73), 'Chicago': (41.9, -87.6)}
+    params = weather_get.open_meteo_params(locations, ['best_match', 'gfs_seamless'])
+    assert asyncio.run(weather_get.weather_fetch_async(params=params, client=client)) == []
+
+    assert client.params['latitude'] == '30.27,41.9'
+    assert client.params['longitude'] == '-97.73,-87.6'
+    assert client.params['models'] == 'best_match,gfs_seamless'
+    assert client.params['hourly'] == 'temperature_2m,precipitation_probability'
+    assert client.params['format'] == 'flatbuffers'
+
+def test_long_table_keeps_every_location_and_model_apart():
+    responses = [
+        FakeResponse(0, MODEL_CODES['best_match'], [50, 51], [10, 20]),
+        FakeResponse(0, MODEL_CODES['gfs_seamless'], [49, 48], [0, 0]),
+        FakeResponse(1, MODEL_CODES['best_match'], [30, 31, 32], [90, 80, 70]),
+    ]
+
+    table = weather_get.weather_long_table(responses, 'hourly', location_names=['Austin', 'Chicago'])
+
+    assert table.num_rows == 2 * 2 + 2 * 2 + 3 * 2
+    assert set(zip(table['location'].to_pylist(), table['model'].to_pylist())) == {
+        ('Austin', 'best_match'), ('Austin', 'gfs_seamless'), ('Chicago', 'best_match')}
+    austin = weather_get.weather_frame(table, 'Austin', variables=weather_get.OPEN_METEO_PARAMS['hourly'])
+    assert list(austin.columns) == ['date', 'temperature_2m', 'precipitation_probability']
+    assert austin['temperature_2m'].tolist() == [50, 51]  # First model returned for the location
+    gfs = weather_get.weather_frame(table, 'Austin', model='gfs_seamless')
+    assert gfs['temperature_2m'].tolist() == [49, 48]
+    chicago = weather_get.weather_frame(table, 'Chicago')
+    assert chicago['precipitation_probability'].tolist() == [90, 80, 70]
+    assert chicago['date'].iloc[0] == pd.Timestamp('2025-01-01', tz='UTC')
+
+class FakeWorksheet:
+    def __init__(self):
+        self.values = []
+        self.reads = 0
+        self.writes = []
+        self.fail = False
+
+    def get(self, cells, value_render_option=None):
+        self.reads += 1
+        return self.values
+
+    def batch_update(self, updates):
+        if self.fail:
+            raise ConnectionError('session expired')
+        self.writes.append(updates)
+
+class FakeClient:
+    def __init__(self, worksheet):
+        self.worksheet_ = worksheet
+
+    def open(self, title):
+        return self
+
+    def worksheet(self, name):
+        return self.worksheet_
+
+@pytest.fixture
+def worksheet(monkeypatch):
+    worksheet = FakeWorksheet()
+    opened = []
+    monkeypatch.setattr(weather_get.gspread, 'service_account', lambda filename: opened.append(filename) or FakeClient(worksheet))
+    monkeypatch.setattr(weather_get, 'weather_sheet', {'worksheet': None, 'written': None})
+    worksheet.opened = opened
+    return worksheet
+
+def hourly(temperature):
+    dates = pd.date_range('2025-01-01', periods=2, freq='h', tz='UTC')
+    return pa.table({'value': [temperature] * 2}), pd.DataFrame({'date': dates, 'temperature_2m': [temperature] * 2})
+
+def test_unchanged_forecast_skips_the_sheet(worksheet):
+    table, frame = hourly(50.0)
+    assert weather_get.export_hourly(table, frame) == 3  # Header and two hours, one range per row
+    assert weather_get.export_hourly(table, frame) == 0  # Same cached table (same model run): no read, no write
+    assert (worksheet.reads, len(worksheet.writes)) == (1, 1)
+
+    table, frame = hourly(52.0)  # New model run
+    weather_get.export_hourly(table, frame)
+    assert (worksheet.reads, len(worksheet.writes)) == (2, 2)
+    assert len(worksheet.opened) == 1  # One gspread client for every refresh
+
+def test_failed_write_reopens_and_retries(worksheet):
+    table, frame = hourly(50.0)
+    worksheet.fail = True
+    with pytest.raises(ConnectionError):
+        weather_get.export_hourly(table, frame)
+
+    worksheet.fail = False
+    assert weather_get.export_hourly(table, frame) == 3  # Not recorded as written: retried, on a reopened tab
+    assert len(worksheet.opened) == 2
@@ -0,0 +1,68 @@
+#file: test_wsgi.py
+#Tests for the gzip compression of the production server. Run with: python -m pytest
+import gzip
+import json
+
+import flask
+import pytest
+
+import wsgi
+
+@pytest.fixture
+def client():
+    server = flask.Flask(__name__)
+    wsgi.enable_gzip(server)
+    
+    @server.route('/large')
+    def large():
+        return flask.jsonify(values=list(range(1000)))
+    
+    @server.route('/small')
+    def small():
+        return flask.jsonify(values=[1, 2, 3])
+    
+    @server.route('/encoded')
+    def encoded():
+        #like the cached page layout: compressed once, ahead of the request
+        response = flask.Response(gzip.compress(json.dumps({'values': list(range(1000))}).encode()),
+                                  mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+    
+    @server.route('/bundle.js')
+    def bundle():
+        response = flask.Response('var x = 1;\n' * 500, mimetype='application/javascript')
+        response.set_etag('v1')
+        return response
+    
+    return server.test_client()
+
+GZIP = {'Accept-Encoding': 'gzip, deflate'}
+
+def test_large_json_is_gzipped(client):
+    response = client.get('/large', headers=GZIP)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert json.loads(gzip.decompress(response.data)) == {'values': list(range(1000))}
+
+def test_small_responses_and_clients_without_gzip_are_sent_as_is(client):
+    assert 'Content-Encoding' not in client.get('/small', headers=GZIP).headers
+    response = client.get('/large')
+    assert 'Content-Encoding' not in response.headers
+    assert json.loads(response.data) == {'values': list(range(1000))}
+
+def test_already_encoded_responses_pass_through(client):
+    response = client.get('/encoded', headers=GZIP)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    # Compressed exactly once: decompressing once gives the JSON back
+    assert json.loads(gzip.decompress(response.data)) == {'values': list(range(1000))}
+
+def test_files_with_an_etag_are_compressed_once(client, monkeypatch):
+    compressions = []
+    compress = gzip.compress
+    monkeypatch.setattr(wsgi.gzip, 'compress', lambda data, **kwargs: compressions.append(data) or compress(data, **kwargs))
+    
+    bodies = [client.get('/bundle.js', headers=GZIP).data for _ in range(3)]
+    assert len(compressions) == 1
+    assert len(set(bodies)) == 1
+    assert gzip.decompress(bodies[0]) == b'var x = 1;\n' * 500
@@ -0,0 +1,227 @@
+#file: weather_archive.py
+#Append-only local archive of hourly weather, stored as Parquet partitioned by month (hive layout: month=YYYY-MM).
+#Every fetched forecast is appended as kind='forecast'; observations backfilled from a historical source are
+#appended as kind='observation'. Range queries only open the month partitions they need, so multi-year
+#weather can be plotted next to the habits without re-downloading anything. Each append adds a file to
+#every month it touches; a month with too many files is compacted into one, keeping only the newest row
+#per location, model, variable, hour and kind.
+
+import datetime
+import threading
+import uuid
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import http_client
+
+ARCHIVE_DIR = Path('Data') / 'Weather Archive'
+
+ARCHIVE_SCHEMA = pa.schema([
+    ('location', pa.string()),
+    ('model', pa.string()),
+    ('variable', pa.string()),
+    ('time', pa.timestamp('s', tz='UTC')),
+    ('value', pa.float64()),
+    ('kind', pa.string()),  # 'forecast' or 'observation'
+    ('fetched_at', pa.timestamp('ms', tz='UTC')),
+    ('month', pa.string()),  # partition key, YYYY-MM of time (UTC)
+])
+MONTH_PARTITIONING = ds.partitioning(pa.schema([('month', pa.string())]), flavor='hive')
+
+def month_keys(start, end):
+    # YYYY-MM keys of every month touched by [start, end]
+    months = pd.period_range(pd.Timestamp(start).tz_localize(None).to_period('M'),
+                             pd.Timestamp(end).tz_localize(None).to_period('M'), freq='M')
+    return [str(month) for month in months]
+
+def utc_timestamp(value):
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+
+class WeatherArchive:
+    """
+    Month-partitioned Parquet archive of long-format weather rows.
+
+    Args:
+        root: archive directory
+        max_fragments: files a month partition may hold before the next append compacts it
+    """
+    def __init__(self, root=ARCHIVE_DIR, max_fragments=8):
+        self.root = Path(root)
+        self.max_fragments = max_fragments
+        self.lock = threading.RLock()  # A compaction deletes files a concurrent scan could be opening
+
+    def append(self, table, kind='forecast', fetched_at=None):
+        """
+        Append rows in the weather_long_table layout (location, model, variable, time, value).
+
+        Every call writes new files; months left with more than max_fragments files are then compacted.
+        Returns the number of rows appended.
+        """
+        if table.num_rows == 0:
+            return 0
+        fetched_at = utc_timestamp(fetched_at or datetime.datetime.now(datetime.timezone.utc))
+        time_column = table['time'].cast(pa.timestamp('s', tz='UTC'))
+        rows = pa.table({
+            'location': table['location'].cast(pa.string()),
+            'model': table['model'].cast(pa.string()),
+            'variable': table['variable'].cast(pa.string()),
+            'time': time_column,
+            'value': table['value'].cast(pa.float64()),
+            'kind': pa.array([kind] * table.num_rows, pa.string()),
+            'fetched_at': pa.array([fetched_at.to_pydatetime()] * table.num_rows, pa.timestamp('ms', tz='UTC')),
+            'month': pc.strftime(time_column, format='%Y-%m'),
+        }, schema=ARCHIVE_SCHEMA)
+        with self.lock:
+            self.write(rows)
+            for month in pc.unique(rows['month']).to_pylist():
+                if len(self.month_files(month)) > self.max_fragments:
+                    self.compact_month(month)
+        return rows.num_rows
+
+    def write(self, rows):
+        ds.write_dataset(
+            rows, self.root, format='parquet', partitioning=MONTH_PARTITIONING,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore'  # Keeps existing files; names are unique
+        )
+
+    def month_files(self, month):
+        return sorted((self.root / f'month={month}').glob('*.parquet'))
+
+    def compact_month(self, month):
+        """
+        Rewrite one month partition as a single file, dropping superseded rows.
+
+        Only the newest fetch of each (location, model, variable, time, kind) is kept, the
+        row query() would pick anyway. Returns the number of rows dropped.
+        """
+        with self.lock:
+            files = self.month_files(month)
+            if len(files) < 2:
+                return 0
+            rows = ds.dataset([str(path) for path in files], format='parquet', schema=ARCHIVE_SCHEMA,
+                              partitioning=MONTH_PARTITIONING, partition_base_dir=str(self.root)).to_table()
+            frame = rows.to_pandas().sort_values('fetched_at', ascending=False, kind='stable')
+            frame = frame.drop_duplicates(['location', 'model', 'variable', 'time', 'kind'], keep='first')
+            frame = frame.sort_values(['time', 'location', 'model', 'variable', 'kind'])
+            self.write(pa.Table.from_pandas(frame, schema=ARCHIVE_SCHEMA, preserve_index=False))
+            # A crash before this leaves duplicates only, which query() and the next compaction drop
+            for path in files:
+                path.unlink()
+            return rows.num_rows - len(frame)
+
+    def dataset(self):
+        return ds.dataset(self.root, format='parquet', partitioning=MONTH_PARTITIONING, schema=ARCHIVE_SCHEMA)
+
+    def scan(self, start, end, variables=None, locations=None, kinds=None, columns=None):
+        # Arrow rows with start <= time < end; the month filter prunes whole partitions
+        if not self.root.exists():
+            return ARCHIVE_SCHEMA.empty_table()
+        start, end = utc_timestamp(start), utc_timestamp(end)
+        condition = (ds.field('month').isin(month_keys(start, end))
+                     & (ds.field('time') >= pa.scalar(start.to_pydatetime(), pa.timestamp('s', tz='UTC')))
+                     & (ds.field('time') < pa.scalar(end.to_pydatetime(), pa.timestamp('s', tz='UTC'))))
+        if variables is not None:
+            condition &= ds.field('variable').isin(list(variables))
+        if locations is not None:
+            condition &= ds.field('location').isin(list(locations))
+        if kinds is not None:
+            condition &= ds.field('kind').isin(list(kinds))
+        with self.lock:
+            return self.dataset().to_table(columns=columns, filter=condition)
+
+    def query(self, variable, start, end, location=None, model=None):
+        """
+        Hourly values of one variable for any date span.
+
+        Observations win over forecasts for the same hour, and the newest fetch wins
+        among forecasts.
+
+        Returns:
+            DataFrame with columns time, location, model, value, kind (sorted by time)
+        """
+        locations = None if location is None else [location]
+        frame = self.scan(start, end, variables=[variable], locations=locations).to_pandas()
+        if model is not None:
+            frame = frame[frame['model'] == model]
+        frame = frame.assign(observed=frame['kind'] == 'observation')
+        frame = frame.sort_values(['observed', 'fetched_at'], ascending=False, kind='stable')
+        frame = frame.drop_duplicates(['location', 'model', 'time'], keep='first')
+        return frame.sort_values('time')[['time', 'location', 'model', 'value', 'kind']].reset_index(drop=True)
+
+    def query_daily(self, variable, start, end, location=None, how='mean'):
+        """Daily aggregate (mean, min, max...) of one variable, e.g. for plotting years next to the habits."""
+        frame = self.query(variable, start, end, location)
+        if frame.empty:
+            return pd.Series(dtype='float64', name=variable)
+        return frame.set_index('time')['value'].resample('D').agg(how).rename(variable)
+
+    def missing_observation_spans(self, variables, locations, start, end):
+        # [(span start, span end)] of months in [start, end] whose observations don't reach the month end yet
+        start, end = utc_timestamp(start), utc_timestamp(end)
+        observed = self.scan(start, end, variables=variables, locations=locations, kinds=['observation'],
+                             columns=['month', 'time'])
+        latest = {}
+        if observed.num_rows:
+            grouped = observed.group_by('month').aggregate([('time', 'max')])
+            latest = dict(zip(grouped['month'].to_pylist(), grouped['time_max'].to_pylist()))
+        spans = []
+        for month in month_keys(start, end):
+            month_start = max(start, pd.Timestamp(month + '-01', tz='UTC'))
+            month_end = min(end, pd.Timestamp(month + '-01', tz='UTC') + pd.offsets.MonthBegin(1)) - pd.Timedelta(hours=1)
+            if month_start > month_end:
+                continue  # end falls exactly on this month's first hour: nothing of it is in [start, end)
+            if month in latest and pd.Timestamp(latest[month]) >= month_end:
+                continue
+            if spans and spans[-1][1] + pd.Timedelta(hours=1) >= month_start:
+                spans[-1] = (spans[-1][0], month_end)  # Contiguous months become one request
+            else:
+                spans.append((month_start, month_end))
+        return spans
+
+    def backfill(self, source, locations, variables, start, end):
+        """
+        Fill observation gaps in [start, end) from a historical source.
+
+        Args:
+            source: object with fetch(locations, variables, start_date, end_date) returning a
+                    weather_long_table-style Arrow table (e.g. OpenMeteoArchiveSource, or a fixture)
+            locations: {name: (latitude, longitude)}
+            variables: hourly variable names
+
+        Returns:
+            Number of rows appended.
+        """
+        appended = 0
+        for span_start, span_end in self.missing_observation_spans(variables, list(locations), start, end):
+            table = source.fetch(locations, variables, span_start.date(), span_end.date())
+            # Sources work in whole days; keep only the requested span
+            mask = pc.and_(pc.greater_equal(table['time'], pa.scalar(span_start.to_pydatetime(), pa.timestamp('s', tz='UTC'))),
+                           pc.less_equal(table['time'], pa.scalar(span_end.to_pydatetime(), pa.timestamp('s', tz='UTC'))))
+            appended += self.append(table.filter(mask), kind='observation')
+        return appended
+
+class OpenMeteoArchiveSource:
+    """Backfill source for the Open-Meteo historical weather API (reanalysis, same units as the forecast)."""
+    url = "https://archive-api.open-meteo.com/v1/archive"
+
+    def fetch(self, locations, variables, start_date, end_date):
+        import weather_get  # Imported here: weather_get imports this module for forecast archiving
+
+        params = {
+            "latitude": [latitude for latitude, _ in locations.values()],
+            "longitude": [longitude for _, longitude in locations.values()],
+            "hourly": list(variables),
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+        }
+        for unit in ("temperature_unit", "wind_speed_unit", "precipitation_unit"):
+            params[unit] = weather_get.OPEN_METEO_PARAMS[unit]
+        responses = http_client.get_shared_client().run(weather_get.weather_fetch_async(self.url, params))
+        return weather_get.weather_long_table(responses, "hourly", variables=list(variables), location_names=list(locations))
+
+#archive shared by the dashboard
+weather_archive = WeatherArchive()
@@ -0,0 +1,149 @@
+#file: weather_cache.py
+#Forecast cache for the Open-Meteo ingest. It keeps the decoded Arrow tables (not raw HTTP responses),
+#keyed by locations, models and variables, and treats them as current until the weather model has
+#published a newer run. Stale entries are served right away while a background thread refetches
+#them (stale-while-revalidate), so the dashboard only waits on a weather fetch when nothing is cached.
+
+import datetime
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+import pyarrow as pa
+
+# Model run schedule: model -> (hours between runs, hours until a run is available on Open-Meteo)
+# Approximate upstream publish cycles; unknown models fall back to DEFAULT_RUN_SCHEDULE
+MODEL_RUN_SCHEDULE = {
+    "best_match": (1, 1),  # Blends the newest runs; in the US that includes the hourly HRRR
+    "gfs_seamless": (1, 1),
+    "gfs_global": (6, 4),
+    "ncep_hrrr_conus": (1, 1),
+    "icon_seamless": (3, 2),
+    "icon_global": (6, 4),
+    "ecmwf_ifs025": (6, 8),
+    "gem_seamless": (12, 6),
+}
+DEFAULT_RUN_SCHEDULE = (1, 1)
+
+def latest_model_run(model, now=None):
+    """Start time (UTC) of the newest run of `model` that should be published by `now`."""
+    interval, delay = MODEL_RUN_SCHEDULE.get(model, DEFAULT_RUN_SCHEDULE)
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    available = now - datetime.timedelta(hours=delay)
+    day = available.replace(hour=0, minute=0, second=0, microsecond=0)
+    runs = int((available - day) / datetime.timedelta(hours=interval))
+    return day + datetime.timedelta(hours=runs * interval)
+
+def next_model_update(model, now=None):
+    """Time (UTC) at which the next run of `model` should be published."""
+    interval, delay = MODEL_RUN_SCHEDULE.get(model, DEFAULT_RUN_SCHEDULE)
+    return latest_model_run(model, now) + datetime.timedelta(hours=interval + delay)
+
+class ForecastCache:
+    """
+    Decoded forecast tables with model-run expiry and stale-while-revalidate.
+
+    Args:
+        fetch: callable(locations, models) -> {block name: pyarrow Table}
+        variables: requested variables per block (part of the cache key)
+        cache_dir: optional directory for Arrow copies, so a restart serves the last forecast at once
+        clock: callable returning the current UTC datetime (swap in for tests)
+    """
+    def __init__(self, fetch, variables, cache_dir=None, clock=None):
+        self.fetch = fetch
+        self.variables = variables
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.clock = clock or (lambda: datetime.datetime.now(datetime.timezone.utc))
+        self.entries = {}  # key -> {'runs': {model: run start}, 'tables': {block: Table}}
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+    def key(self, locations, models):
+        variables = tuple((block, tuple(names)) for block, names in sorted(self.variables.items()))
+        return (tuple(locations.items()), tuple(models), variables)
+
+    def is_fresh(self, entry, models):
+        now = self.clock()
+        return all(entry['runs'].get(model, '') >= latest_model_run(model, now).isoformat() for model in models)
+
+    def get(self, locations, models, wait=False):
+        """
+        Return {block: table} for these locations and models.
+
+        A fresh entry is returned as is. A stale one is returned immediately and refetched
+        in the background (or refetched first when wait=True). Only a cold cache blocks.
+        """
+        key = self.key(locations, models)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            entry = self.load(key)
+        if entry is None:
+            return self.refresh(key, locations, models)['tables']
+        if not self.is_fresh(entry, models):
+            if wait:
+                return self.refresh(key, locations, models)['tables']
+            self.refresh_in_background(key, locations, models)
+        return entry['tables']
+
+    def refresh(self, key, locations, models):
+        # Tag the tables with the runs that were published when the fetch started
+        now = self.clock()
+        runs = {model: latest_model_run(model, now).isoformat() for model in models}
+        entry = {'runs': runs, 'tables': self.fetch(locations, models)}
+        with self.lock:
+            self.entries[key] = entry
+        self.save(key, entry)
+        return entry
+
+    def refresh_in_background(self, key, locations, models):
+        with self.lock:
+            if key in self.refreshing:
+                return  # One revalidation per key at a time
+            self.refreshing.add(key)
+
+        def revalidate():
+            try:
+                self.refresh(key, locations, models)
+            except Exception as e:
+                print(f"Weather refresh failed, keeping the cached forecast: {e}")
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        threading.Thread(target=revalidate, name="weather-revalidate", daemon=True).start()
+
+    def paths(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        return {block: self.cache_dir / f"forecast_{digest}_{block}.arrow" for block in self.variables}
+
+    def save(self, key, entry):
+        if self.cache_dir is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for block, path in self.paths(key).items():
+            table = entry['tables'][block]
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'runs': json.dumps(entry['runs'])})
+            # Own temp file per process and thread, so concurrent saves of the same key never share one
+            tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+            with pa.OSFile(str(tmp_path), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+
+    def load(self, key):
+        # Last forecast written by a previous run (may be stale; the caller revalidates it)
+        if self.cache_dir is None:
+            return None
+        tables, runs = {}, None
+        for block, path in self.paths(key).items():
+            if not path.exists():
+                return None
+            with pa.memory_map(str(path), 'r') as source:
+                tables[block] = pa.ipc.open_file(source).read_all()
+            runs = json.loads(tables[block].schema.metadata[b'runs'])
+        entry = {'runs': runs, 'tables': tables}
+        with self.lock:
+            self.entries.setdefault(key, entry)
+        return entry
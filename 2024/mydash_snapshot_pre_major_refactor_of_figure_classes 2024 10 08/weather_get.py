@@ -1,44 +1,280 @@
 #API webpage link (general info page): https://open-meteo.com/
 
-import openmeteo_requests
-import requests_cache
+from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+from openmeteo_sdk.Model import Model
 import pandas as pd
-from retry_requests import retry
+import pyarrow as pa
+import pyarrow.compute as pc
 import gspread
 import plotly.graph_objects as go
 import plotly.express as px
 import plotly.io as pio #for style themes
 import dash #for plot layouts
 import numpy as np
-
-
-def weather_get():
-
-    # Setup the Open-Meteo API client with cache and retry on error
-    cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-    retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-    openmeteo = openmeteo_requests.Client(session = retry_session)
-
-    # Make sure all required weather variables are listed here
-    # The order of variables in hourly or daily is important to assign them correctly below
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": 30.2666,
-        "longitude": -97.7333,
-        "current": ["temperature_2m", "precipitation"],
-        "hourly": ["temperature_2m", "precipitation_probability"],
-        "daily": ["sunrise", "sunset"],
-        "temperature_unit": "fahrenheit",
-        "wind_speed_unit": "mph",
-        "precipitation_unit": "inch",
-        "timezone": "America/Chicago",
-        "forecast_days": 3
+import threading
+from pathlib import Path
+import http_client
+import weather_cache
+import weather_archive
+
+# Make sure all required weather variables are listed here
+# The order of variables in hourly or daily is important to assign them correctly below
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+OPEN_METEO_PARAMS = {
+    "latitude": 30.2666,
+    "longitude": -97.7333,
+    "current": ["temperature_2m", "precipitation"],
+    "hourly": ["temperature_2m", "precipitation_probability"],
+    "daily": ["sunrise", "sunset"],
+    "temperature_unit": "fahrenheit",
+    "wind_speed_unit": "mph",
+    "precipitation_unit": "inch",
+    "timezone": "America/Chicago",
+    "forecast_days": 3
+}
+
+# Locations and weather models fetched together in one request (every location x model pair
+# comes back as its own response). The first location feeds the dashboard figures.
+WEATHER_LOCATIONS = {
+    "Austin": (30.2666, -97.7333),
+}
+WEATHER_MODELS = ["best_match"]
+
+# Open-Meteo model enum value -> model name
+MODEL_NAMES = {value: name for name, value in vars(Model).items() if not name.startswith('_')}
+
+# Time-series blocks of a response
+WEATHER_BLOCKS = {"current": "Current", "hourly": "Hourly", "daily": "Daily", "minutely_15": "Minutely15"}
+
+def open_meteo_params(locations=WEATHER_LOCATIONS, models=WEATHER_MODELS, base_params=OPEN_METEO_PARAMS):
+    # Open-Meteo takes comma-separated coordinates and models, so N locations x M models is still one call
+    params = dict(base_params)
+    params["latitude"] = [latitude for latitude, _ in locations.values()]
+    params["longitude"] = [longitude for _, longitude in locations.values()]
+    params["models"] = list(models)
+    return params
+
+def decode_open_meteo(data):
+    # Open-Meteo flatbuffers responses are length-prefixed messages, one per location/model
+    responses = []
+    pos = 0
+    while pos < len(data):
+        length = int.from_bytes(data[pos:pos + 4], byteorder="little")
+        responses.append(WeatherApiResponse.GetRootAs(data, pos + 4))
+        pos += length + 4
+    return responses
+
+async def weather_fetch_async(url=OPEN_METEO_URL, params=None, client=None):
+    # Fetch through the dashboard's shared connection pool (retries and backoff live there)
+    client = client or http_client.get_shared_client()
+    params = params or open_meteo_params()
+    query = {key: ",".join(map(str, value)) if isinstance(value, list) else value for key, value in params.items()}
+    query["format"] = "flatbuffers"
+    data = await client.get_bytes(url, params=query)
+    return decode_open_meteo(data)
+
+def weather_long_table(responses, block="hourly", variables=None, location_names=None):
+    """
+    Decode one time-series block of every response into a single long-format Arrow table.
+
+    Args:
+        responses: decoded Open-Meteo responses (one per location x model)
+        block: "current", "hourly", "daily" or "minutely_15"
+        variables: requested variable names, in request order (default: OPEN_METEO_PARAMS[block])
+        location_names: names for the response LocationId()s (default: WEATHER_LOCATIONS keys)
+
+    Returns:
+        pyarrow Table with columns location, model, variable, time (UTC) and value. Each value
+        chunk is a zero-copy view of a ValuesAsNumpy() block of the flatbuffer.
+    """
+    variables = variables or OPEN_METEO_PARAMS[block]
+    location_names = location_names or list(WEATHER_LOCATIONS)
+    locations = pa.array(location_names, pa.string())
+    models = pa.array(sorted(MODEL_NAMES.values()), pa.string())
+    model_codes = {name: code for code, name in enumerate(models.to_pylist())}
+    names = pa.array(variables, pa.string())
+
+    columns = {"location": [], "model": [], "variable": [], "time": [], "value": []}
+    for response in responses:
+        data = getattr(response, WEATHER_BLOCKS[block])()
+        # One time axis per block instead of a pd.date_range per block (current values have a single time)
+        if block == "current":
+            times = np.array([data.Time()], dtype=np.int64)
+        else:
+            times = np.arange(data.Time(), data.TimeEnd(), data.Interval(), dtype=np.int64)
+        times = pa.array(times.astype("datetime64[s]")).cast(pa.timestamp("s", tz="UTC"))
+        for i in range(data.VariablesLength()):
+            variable = data.Variables(i)
+            # The order of variables is the same as requested; sunrise/sunset come back as int64
+            if block == "current":
+                values = np.array([variable.Value()], dtype=np.float32)
+            elif variable.ValuesLength():
+                values = variable.ValuesAsNumpy()
+            else:
+                values = variable.ValuesInt64AsNumpy()
+            n = len(values)
+            codes = {
+                "location": np.full(n, response.LocationId(), dtype=np.int32),
+                "model": np.full(n, model_codes[MODEL_NAMES.get(response.Model(), "best_match")], dtype=np.int32),
+                "variable": np.full(n, i, dtype=np.int32),
+            }
+            columns["location"].append(pa.DictionaryArray.from_arrays(codes["location"], locations))
+            columns["model"].append(pa.DictionaryArray.from_arrays(codes["model"], models))
+            columns["variable"].append(pa.DictionaryArray.from_arrays(codes["variable"], names))
+            columns["time"].append(times[:n])
+            columns["value"].append(pa.array(values))
+
+    # Blocks mixing float and int64 variables share one float64 value column (the only case that copies)
+    value_types = {chunk.type for chunk in columns["value"]}
+    if len(value_types) > 1:
+        columns["value"] = [chunk.cast(pa.float64()) for chunk in columns["value"]]
+    types = {
+        "location": pa.dictionary(pa.int32(), pa.string()),
+        "model": pa.dictionary(pa.int32(), pa.string()),
+        "variable": pa.dictionary(pa.int32(), pa.string()),
+        "time": pa.timestamp("s", tz="UTC"),
+        "value": value_types.pop() if len(value_types) == 1 else pa.float64(),
     }
+    return pa.table({name: pa.chunked_array(chunks, type=types[name]) for name, chunks in columns.items()})
+
+def weather_frame(table, location, model=None, variables=None):
+    """Wide DataFrame (date + one column per variable) for one location/model of a long weather table."""
+    mask = pc.equal(table["location"].cast(pa.string()), location)
+    if model is not None:
+        mask = pc.and_(mask, pc.equal(table["model"].cast(pa.string()), model))
+    selected = table.filter(mask)
+    if model is None and selected.num_rows:
+        # Default to the first model returned for this location
+        first_model = selected["model"][0].as_py()
+        selected = selected.filter(pc.equal(selected["model"].cast(pa.string()), first_model))
+    frame = pd.DataFrame({
+        "date": selected["time"].to_pandas(),
+        "variable": selected["variable"].cast(pa.string()).to_pandas(),
+        "value": selected["value"].to_pandas(),
+    })
+    wide = frame.pivot(index="date", columns="variable", values="value")
+    # Columns in request order
+    variables = variables or frame["variable"].unique()
+    wide = wide[[name for name in variables if name in wide.columns]]
+    wide.columns.name = None
+    return wide.reset_index()
+
+def weather_tables(responses, location_names=None):
+    # Decoded tables for every block the dashboard uses
+    return {block: weather_long_table(responses, block, location_names=location_names)
+            for block in ("current", "hourly", "daily")}
+
+def fetch_weather_tables(locations=WEATHER_LOCATIONS, models=WEATHER_MODELS):
+    # One request for every location x model, decoded into tables
+    responses = http_client.get_shared_client().run(weather_fetch_async(params=open_meteo_params(locations, models)))
+    tables = weather_tables(responses, list(locations))
+    # Keep every fetched forecast in the local archive for multi-year plots
+    weather_archive.weather_archive.append(tables["hourly"], kind='forecast')
+    return tables
+
+#decoded forecasts, refetched only after the models publish a new run
+forecast_cache = weather_cache.ForecastCache(
+    fetch_weather_tables,
+    variables={block: OPEN_METEO_PARAMS[block] for block in ("current", "hourly", "daily")},
+    cache_dir=Path('Data') / 'Weather Cache'
+)
+
+def get_forecast_tables(wait=False):
+    # Cached tables for the configured locations/models; stale ones are revalidated in the background
+    return forecast_cache.get(WEATHER_LOCATIONS, WEATHER_MODELS, wait=wait)
+
+def changed_cell_ranges(current, values, start_row=1, start_col=1):
+    # Compare the new values with the tab's current values; one A1 range per run of changed cells in a row
+    updates = []
+    for i, row in enumerate(values):
+        current_row = current[i] if i < len(current) else []
+        run_start = None
+        for j in range(len(row) + 1):
+            if j < len(row):
+                old = current_row[j] if j < len(current_row) else ''
+                new = '' if row[j] is None else row[j]
+                if old != new:
+                    if run_start is None:
+                        run_start = j
+                    continue
+            if run_start is not None:
+                first = gspread.utils.rowcol_to_a1(start_row + i, start_col + run_start)
+                last = gspread.utils.rowcol_to_a1(start_row + i, start_col + j - 1)
+                updates.append({'range': f"{first}:{last}", 'values': [row[run_start:j]]})
+                run_start = None
+    return updates
+
+def write_sheet_diff(worksheet, values, start_row=1, start_col=1):
+    """
+    Write a block of values to a worksheet, sending only the cells that changed.
+
+    Reads the target block once (unformatted, so numbers compare as numbers) and
+    sends every changed run of cells in a single batch_update.
+    Returns the number of ranges written.
+    """
+    if not values:
+        return 0
+    width = max(len(row) for row in values)
+    first = gspread.utils.rowcol_to_a1(start_row, start_col)
+    last = gspread.utils.rowcol_to_a1(start_row + len(values) - 1, start_col + width - 1)
+    current = worksheet.get(f"{first}:{last}", value_render_option='UNFORMATTED_VALUE')
+    updates = changed_cell_ranges(current, values, start_row, start_col)
+    if updates:
+        worksheet.batch_update(updates)
+    return len(updates)
+
+#gspread client and Weather tab, opened once per process and reused by every refresh.
+#'written' is the hourly table last written to the tab: the forecast cache returns the same table object
+#until a new model run is fetched, so an unchanged forecast skips the sheet entirely
+weather_sheet_lock = threading.Lock()
+weather_sheet = {'worksheet': None, 'written': None}
+
+def weather_worksheet():
+    with weather_sheet_lock:
+        if weather_sheet['worksheet'] is None:
+            gcred = gspread.service_account(filename='my-dashboard-426016-058763d93d8e.json')
+            weather_sheet['worksheet'] = gcred.open("My Dashboard Data").worksheet("Weather")
+        return weather_sheet['worksheet']
+
+def export_hourly(hourly_table, hourly_dataframe):
+    """
+    Write the hourly forecast to the Weather tab, unless this table was already written.
+
+    Returns the number of ranges written (0 when skipped or nothing changed).
+    """
+    with weather_sheet_lock:
+        if weather_sheet['written'] is hourly_table:
+            return 0
 
-    responses = openmeteo.weather_api(url,params=params)
-
-    # Process first location. Add a for-loop for multiple locations or weather models
-    response = responses[0]
+    #The weather API time format needs a data type conversion for gspread to read it.
+    #Using a string format that at least resembles a date-time data type on the surface
+    #(same text as Timestamp.isoformat() for the UTC dates, formatted for the whole column at once)
+    hourly_dataframe_export = hourly_dataframe.copy()
+    hourly_dataframe_export['date'] = hourly_dataframe_export['date'].dt.tz_convert('UTC').dt.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+    #Gspread needs Dataframe converted to list structure
+    #without header structure: hourly_export = hourly_dataframe.values.tolist()
+    #or for header structure: 
+    hourly_export = [hourly_dataframe_export.columns.values.tolist()] + hourly_dataframe_export.values.tolist()
+    #only the cells that differ from what's already in the tab are sent, in one batch_update
+    try:
+        written = write_sheet_diff(weather_worksheet(), hourly_export, start_row=2)
+    except Exception:
+        with weather_sheet_lock:
+            weather_sheet['worksheet'] = None  # Reopen on the next refresh (e.g. expired session)
+        raise
+    with weather_sheet_lock:
+        weather_sheet['written'] = hourly_table
+    return written
+
+def weather_get(responses=None, tables=None):
+
+    # Every location and model, decoded straight into long-format tables.
+    # Responses/tables can be fetched ahead of time; otherwise they come from the forecast cache
+    if tables is None:
+        tables = weather_tables(responses) if responses is not None else get_forecast_tables()
+
+    # The dashboard figures show the first location
+    location = next(iter(WEATHER_LOCATIONS))
     # print('\n')
     # print(f"Coordinates {response.Latitude()}°N {response.Longitude()}°E")
     # print(f"Elevation {response.Elevation()}m above sea level")
@@ -46,69 +282,23 @@ def weather_get():
     # print(f"Timezone difference to GMT+0 {response.UtcOffsetSeconds()} seconds") #seconds since 1970 01 01 (UNIX Epoch Time)
 
     # Current values. The order of variables needs to be the same as requested.
-    current = response.Current()
-    current_temperature_2m = current.Variables(0).Value()
-    current_precipitation = current.Variables(1).Value()
+    current = weather_frame(tables["current"], location, variables=OPEN_METEO_PARAMS["current"])
+    current_temperature_2m = current["temperature_2m"].iloc[0]
+    current_precipitation = current["precipitation"].iloc[0]
 
-    # print(f"Current time {current.Time()}")
+    # print(f"Current time {current['date'].iloc[0]}")
     # print(f"Current temperature_2m {current_temperature_2m}")
     # print(f"current precipitation_2m {current_precipitation}")
 
-    # Process hourly data. The order of variables needs to be the same as requested.
-    hourly = response.Hourly()
-    hourly_temperature_2m = hourly.Variables(0).ValuesAsNumpy()
-    hourly_precipitationprobability = hourly.Variables(1).ValuesAsNumpy()
-
-    hourly_data = {"date": pd.date_range(
-        start = pd.to_datetime(hourly.Time(), unit = "s" , utc = True), 
-        end = pd.to_datetime(hourly.TimeEnd(), unit = "s" , utc = True),
-        freq = pd.Timedelta(seconds = hourly.Interval()),
-        inclusive = "left"
-    )}
-    hourly_data["temperature_2m"] = hourly_temperature_2m
-    hourly_data["precipitation_probability"] = hourly_precipitationprobability
-
-    hourly_dataframe = pd.DataFrame(data = hourly_data)
+    # Hourly and daily data of that location, one column per requested variable
+    hourly_dataframe = weather_frame(tables["hourly"], location, variables=OPEN_METEO_PARAMS["hourly"])
     #print (hourly_dataframe)
 
-    # Process daily data. The order of variables needs to be the same as requested.
-    daily = response.Daily()
-    daily_sunrise = daily.Variables(0).ValuesAsNumpy()
-    daily_sunset = daily.Variables(1).ValuesAsNumpy()
-
-    # print("DAILY SUNRISE")
-    # print(response.Daily())
-    # print("-")
-    # print(daily_sunrise)
-
-    daily_data = {"date": pd.date_range(
-        start = pd.to_datetime(daily.Time(), unit = "s", utc = True),
-        end = pd.to_datetime(daily.TimeEnd(), unit = "s", utc = True),
-        freq = pd.Timedelta(seconds = daily.Interval()),
-        inclusive = "left"
-    )}
-    daily_data["sunrise"] = daily_sunrise
-    daily_data["sunset"] = daily_sunset
-
-    daily_dataframe = pd.DataFrame(data = daily_data)
+    daily_dataframe = weather_frame(tables["daily"], location, variables=OPEN_METEO_PARAMS["daily"])
     #print(daily_dataframe)
 
-    #open gsheet connection and select desired tab
-    gcred = gspread.service_account(filename='my-dashboard-426016-058763d93d8e.json')
-    gsheetfile = gcred.open("My Dashboard Data")
-    gs_weathertab= gsheetfile.worksheet("Weather")
-
-    #Write data to gsheet tab.  
-
-    #The weather API time format needs a data type conversion for gspread to read it.
-    #Using a string format that at least resembles a date-time data type on the surface
-    hourly_dataframe_export = hourly_dataframe
-    hourly_dataframe_export['date'] = hourly_dataframe_export['date'].apply(lambda x: x.isoformat() if isinstance(x, pd.Timestamp) else x)
-    #Gspread needs Dataframe converted to list structure
-    #without header structure: hourly_export = hourly_dataframe.values.tolist()
-    #or for header structure: 
-    hourly_export = [hourly_dataframe_export.columns.values.tolist()] + hourly_dataframe_export.values.tolist()
-    gs_weathertab.update(hourly_export, "A2") 
+    #Write data to gsheet tab (reusing the open tab; skipped when this forecast is already in it)
+    export_hourly(tables["hourly"], hourly_dataframe)
 
     '''
     # Update multiple ranges at once
@@ -0,0 +1,177 @@
+#file: wsgi.py
+#Production entry point for the dashboard: a WSGI app factory with debug tooling off, gzip compression and a
+#figure store shared by all worker processes. Run it from the dashboard folder (data paths are relative), e.g.
+#   gunicorn --workers 4 --threads 4 --bind 0.0.0.0:8050 "wsgi:create_app()"
+#   waitress-serve --threads 8 --port 8050 --call wsgi:create_app
+#One worker (whichever gets the leader lock) ingests and refreshes; the others serve what it publishes.
+#Load test: python wsgi.py --benchmark [--url http://host:port]
+
+import gzip
+import os
+import sys
+import threading
+import time
+import flask
+import main
+from shared_store import SharedFigureStore, SHARED_STORE_DIR
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/javascript', 'text/javascript', 'text/css', 'text/html'}
+
+def enable_gzip(server, min_size=1024, level=6):
+    #gzip responses for clients that accept it. Responses with an ETag (the fingerprinted Dash component
+    #bundles) are compressed once and kept; the cached page layout is already compressed and passes through
+    compressed_files = {}
+
+    @server.after_request
+    def gzip_response(response):
+        if (response.status_code != 200 or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or 'gzip' not in flask.request.headers.get('Accept-Encoding', '').lower()):
+            return response
+        etag = response.get_etag()[0]
+        key = (flask.request.path, etag) if etag else None
+        body = compressed_files.get(key) if key else None
+        if body is None:
+            response.direct_passthrough = False  # send_file responses: read the file so it can be compressed
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            body = gzip.compress(data, compresslevel=level)
+            if key:
+                compressed_files[key] = body
+        response.set_data(body)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+def lead_refresh(figure_store, start_refresh, retry=60):
+    #become the refresh leader as soon as the lock is free (at startup, or when the leader's worker exits)
+    while not figure_store.acquire_leadership():
+        time.sleep(retry)
+    print(f"Worker {os.getpid()} is the refresh leader")
+    start_refresh()
+
+def create_app(store_dir=SHARED_STORE_DIR, refresh=True):
+    """
+    WSGI app factory.
+
+    Args:
+        store_dir: Directory of the figure store shared by the worker processes.
+        refresh: Take part in the refresh leader election (False to only serve what is published).
+
+    Returns:
+        The Flask server of the Dash app.
+    """
+    figure_store = SharedFigureStore(store_dir)
+    dash_app, start_refresh = main.create_dashboard(figure_store, incremental_heatmap=False)
+    server = dash_app.server
+    server.debug = False
+    enable_gzip(server)
+    if refresh:
+        threading.Thread(target=lead_refresh, args=(figure_store, start_refresh), name='refresh-leader', daemon=True).start()
+    return server
+
+def benchmark_serving(url=None, clients=8, seconds=10):
+    #page-load load test: each client repeatedly fetches what a browser fetches on open (index page, layout,
+    #callback graph) and the throughput and latency percentiles are reported per endpoint.
+    #Without a url, a threaded local server is started with synthetic figures, once as the dev setup
+    #(no figure cache, no gzip) and once as the production app
+    import http.client
+    import logging
+    import tempfile
+    from urllib.parse import urlsplit
+    from werkzeug.serving import make_server
+    import plotly.graph_objects as go
+    import dash_draw_figures
+    from types import SimpleNamespace
+    from figure_cache import FigureCache
+
+    paths = ['/', '/_dash-layout', '/_dash-dependencies']
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no access log line per request
+
+    def run_load(base_url, label):
+        target = urlsplit(base_url)
+        latencies = {path: [] for path in paths}
+        errors = []
+        deadline = time.perf_counter() + seconds
+
+        def client():
+            connection = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+            while time.perf_counter() < deadline:
+                for path in paths:
+                    t0 = time.perf_counter()
+                    try:
+                        connection.request('GET', path, headers={'Accept-Encoding': 'gzip, br'})
+                        response = connection.getresponse()
+                        response.read()
+                        if response.status != 200:
+                            errors.append(response.status)
+                    except (OSError, http.client.HTTPException) as e:
+                        errors.append(repr(e))
+                        connection.close()
+                        connection = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+                        continue
+                    latencies[path].append(time.perf_counter() - t0)
+            connection.close()
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        print(f"{label}: {clients} clients for {seconds}s, {len(errors)} error(s)")
+        for path in paths:
+            samples = sorted(latencies[path])
+            if not samples:
+                continue
+            p50 = samples[len(samples) // 2]
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            print(f"  {path:<22} {len(samples) / seconds:8.1f} req/s   p50 {p50 * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms")
+        page_loads = min(len(latencies[path]) for path in paths)
+        print(f"  page loads: {page_loads / seconds:.1f}/s")
+
+    if url is not None:
+        run_load(url, url)
+        return
+
+    def synthetic_outputs():
+        # 2000-point traces, about the size of the 3D run plot
+        def figure(i):
+            return go.Figure(go.Scatter3d(x=[j * 0.5 for j in range(2000)], y=[(j * i) % 97 for j in range(2000)],
+                                          z=[(j * 7 + i) % 89 for j in range(2000)]))
+        outputs = {component_id: (figure(i) if prop == 'figure' else 'quote')
+                   for i, (component_id, prop) in enumerate(dash_draw_figures.LAZY_OUTPUTS.items())}
+        return outputs
+
+    def serve(server):
+        http_server = make_server('127.0.0.1', 0, server, threaded=True)
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+        return http_server, f'http://127.0.0.1:{http_server.server_port}'
+
+    # dev setup: figures drawn into a static layout that Dash serializes on every page load, nothing compressed
+    o = synthetic_outputs()
+    figs_habits = SimpleNamespace(heatmap=o['habits-heatmap'], wkday_summary=o['habits-wkday-summary'],
+                                  perhabit_summary=o['habits-perhabit-summary'], bars=o['habits-bars'],
+                                  line_LxD=o['habits-line-lxd'], perhabit_lines_LxD=o['habits-perhabit-lines-lxd'])
+    dev_app = dash_draw_figures.draw_figures(figs_habits, SimpleNamespace(fig_avg=o['time-avg']), o['goals'], o['quotes'],
+                                             o['fit-run'], o['fit-weight'], o['weather-temp-hr'], None, None,
+                                             o['finmkts'], o['finmkts-lxd'], o['fin-pers'])
+    http_server, base_url = serve(dev_app.server)
+    run_load(base_url, 'Dev setup (no figure cache, no gzip)')
+    http_server.shutdown()
+
+    # production app: a separate writer store publishes, the served app is a follower reading the shared store
+    with tempfile.TemporaryDirectory() as store_dir:
+        writer = SharedFigureStore(store_dir, cache=FigureCache())
+        writer.acquire_leadership()
+        writer.publish(synthetic_outputs())
+        writer.leader_pid = None  # the served app must read through the shared store, not this object
+        http_server, base_url = serve(create_app(store_dir, refresh=False))
+        run_load(base_url, 'Production app (shared figure store, cached layout, gzip)')
+        http_server.shutdown()
+
+if __name__ == '__main__':
+    if '--benchmark' in sys.argv:
+        url = sys.argv[sys.argv.index('--url') + 1] if '--url' in sys.argv else None
+        benchmark_serving(url)
@@ -14,6 +14,149 @@ import datetime
 import numpy as np
 from googleapiclient.discovery import build
 import sys
+import os
+import re
+import itertools
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.compute as pc
+
+#local snapshot cache of sheet ranges, one Arrow IPC file per spreadsheet + range
+SHEETS_CACHE_DIR = Path('Data') / 'Sheets Cache'
+
+def batch_get_ranges(spreadsheet, tab_ranges):
+    """
+    Fetch several tab ranges with a single values.batchGet request.
+
+    Args:
+        spreadsheet: gspread Spreadsheet
+        tab_ranges: list of (tab name, A1 range) tuples
+
+    Returns:
+        List of value lists (list of lists) in the same order as tab_ranges.
+        Empty ranges come back as [[]], the same as worksheet.get().
+    """
+    ranges = [gspread.utils.absolute_range_name(tab, cells) for tab, cells in tab_ranges]
+    response = spreadsheet.values_batch_get(ranges)
+    return [value_range.get('values', [[]]) for value_range in response.get('valueRanges', [])]
+
+def drive_file_version(drive_service, name):
+    """
+    Look up a spreadsheet's id and Drive change markers without downloading it.
+
+    Args:
+        drive_service: Drive v3 service
+        name: exact spreadsheet name
+
+    Returns:
+        Dict with id, name, modifiedTime and version, or None if no spreadsheet has that name.
+    """
+    escaped_name = name.replace("\\", "\\\\").replace("'", "\\'")
+    results = drive_service.files().list(
+        q=f"name = '{escaped_name}' and mimeType = 'application/vnd.google-apps.spreadsheet' and trashed = false",
+        fields="files(id, name, modifiedTime, version)",
+        pageSize=1
+    ).execute()
+    files = results.get('files', [])
+    return files[0] if files else None
+
+def find_latest_backup(drive_service, folder_id, name_prefix, page_size=10):
+    """
+    Find the newest backup spreadsheet in a Drive folder.
+
+    Args:
+        drive_service: Drive v3 service
+        folder_id: ID of the backup folder
+        name_prefix: start of the backup file names (e.g. the sheet name in '<name>_<YYYYMMDD>_Backup')
+        page_size: files fetched per request while looking for the newest backup
+
+    Returns:
+        Dict with id, name, createdTime, modifiedTime and version, or None if the folder has no backups.
+        Newest means latest Drive createdTime, not the date in the file name.
+    """
+    # Drive filters on the prefix only: 'name contains' matches word prefixes, not substrings, so it can't
+    # test for the '_Backup' suffix. The suffix is checked here, walking the newest files first until one matches
+    escaped_prefix = name_prefix.replace("\\", "\\\\").replace("'", "\\'")
+    page_token = None
+    while True:
+        results = drive_service.files().list(
+            q=(f"'{folder_id}' in parents and name contains '{escaped_prefix}'"
+               " and mimeType = 'application/vnd.google-apps.spreadsheet' and trashed = false"),
+            orderBy="createdTime desc",
+            pageSize=page_size,
+            pageToken=page_token,
+            fields="nextPageToken, files(id, name, createdTime, modifiedTime, version)"
+        ).execute()
+        for file in results.get('files', []):
+            if file['name'].startswith(name_prefix) and file['name'].endswith('_Backup'):
+                return file
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return None
+
+def cache_path(cache_dir, file_id, tab, cells):
+    key = re.sub(r'[^A-Za-z0-9_.-]', '_', f"{file_id}__{tab}__{cells}")
+    return Path(cache_dir) / f"{key}.arrow"
+
+def sheet_rows(values):
+    # A range's rows as an Arrow list<string> array, so ragged rows (trailing empty cells) round-trip exactly
+    if isinstance(values, (pa.Array, pa.ChunkedArray)):
+        return values
+    return pa.chunked_array([pa.array(values, type=pa.list_(pa.string()))])
+
+def sheet_values(rows):
+    # Plain list of lists, for the few small ranges that are read cell by cell
+    return rows.to_pylist() if isinstance(rows, (pa.Array, pa.ChunkedArray)) else rows
+
+def read_cached_range(path, revision):
+    # Memory-mapped Arrow read: the rows are returned as the list<string> column backed by the mapped file,
+    # without copying them into Python objects. None if the file is missing or was written for another revision
+    if not path.exists():
+        return None
+    with pa.memory_map(str(path), 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    if (table.schema.metadata or {}).get(b'revision') != revision.encode():
+        return None
+    return table.column('row')
+
+def write_cached_range(path, revision, values):
+    table = pa.table({'row': sheet_rows(values)})
+    table = table.replace_schema_metadata({'revision': revision})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with pa.OSFile(str(tmp_path), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)  # Never leave a half-written snapshot behind
+
+def cached_batch_get_ranges(spreadsheet_file, tab_ranges, fetch, cache_dir=SHEETS_CACHE_DIR):
+    """
+    Return sheet ranges from the local snapshot cache, refetching only when the sheet changed.
+
+    Args:
+        spreadsheet_file: Drive file dict with id, modifiedTime and version (None disables caching)
+        tab_ranges: list of (tab name, range) tuples
+        fetch: callable taking tab_ranges and returning their value lists, used on a cache miss
+        cache_dir: directory holding the Arrow snapshots
+
+    Returns:
+        One Arrow list<string> array of rows per range, in the same order as tab_ranges.
+        Cached ranges are memory-mapped, not copied.
+    """
+    if spreadsheet_file is None:
+        return [sheet_rows(values) for values in fetch(tab_ranges)]
+
+    #Drive bumps version (and modifiedTime) on every edit of the file
+    revision = f"{spreadsheet_file.get('version')}|{spreadsheet_file.get('modifiedTime')}"
+    paths = [cache_path(cache_dir, spreadsheet_file['id'], tab, cells) for tab, cells in tab_ranges]
+    cached = [read_cached_range(path, revision) for path in paths]
+    if all(values is not None for values in cached):
+        return cached
+
+    rows_list = [sheet_rows(values) for values in fetch(tab_ranges)]
+    for path, rows in zip(paths, rows_list):
+        write_cached_range(path, revision, rows)
+    return rows_list
 
 def get_gsheet_data():
     #use credentials to create a client to interact with the Google Drive API
@@ -25,35 +168,11 @@ def get_gsheet_data():
     # Use Google Drive API directly
     drive_service = build('drive', 'v3', credentials=creds)
     
-    # List files in the folder
-    results = drive_service.files().list(
-        q=f"'{folder_id}' in parents",
-        fields="files(id, name)"
-    ).execute()
-    files = results.get('files', [])
-    
-    # Debug: Print all files found
+    # Newest backup file, filtered and ordered by Drive itself (one small request, whatever the folder size)
     print(f"Searching folder ID: {folder_id}")
-    print("Files found in folder:")
-    for file in files:
-        print(f"File name: {file['name']}, ID: {file['id']}")
-
-    # Find the most recent backup file
-    latest_file = None
-    latest_date = None
-    for file in files:
-        try:
-            # Check if filename contains the required pattern, ignoring file extension
-            if 'x' in file['name'] and '_Backup' in file['name']:
-                print(f"Found matching file: {file['name']}")  # Debug print
-                date_str = file['name'].split('_')[1]
-                file_date = datetime.datetime.strptime(date_str, '%Y%m%d')
-                if latest_date is None or file_date > latest_date:
-                    latest_date = file_date
-                    latest_file = file
-        except (IndexError, ValueError) as e:
-            print(f"Error processing file {file['name']}: {e}")  # Debug print
-            continue
+    latest_file = find_latest_backup(drive_service, folder_id, 'x')
+    if latest_file:
+        print(f"Found latest backup file: {latest_file['name']}, ID: {latest_file['id']}")
 
     # Initialize default DataFrames
     df_fin_pers = pd.DataFrame(columns=['Date', 'Value']) #Value is the total of all assets across all types
@@ -62,19 +181,15 @@ def get_gsheet_data():
     # Open and read the latest backup file
     if latest_file:
         try:
-            # Use gspread to open the spreadsheet by ID
-            spreadsheet = client.open(latest_file['name'])  # Changed from open_by_id to open
-            worksheet = spreadsheet.sheet1  # Get first worksheet
-            data = worksheet.get_all_values()
+            # Backups are only opened when the local snapshot is missing or out of date
+            data, = cached_batch_get_ranges(
+                latest_file, [("sheet1", "all")],
+                # Open the spreadsheet directly by ID (no second lookup by name), then read all values of the first worksheet
+                lambda tab_ranges: [client.open_by_key(latest_file['id']).sheet1.get_all_values()]
+            )
             
-            # Convert to DataFrame
-            df_fin_pers_full = pd.DataFrame(data[1:], columns=data[0])  # Skip header row
-            
-            # Convert date column and numeric columns
-            df_fin_pers_full['Date'] = pd.to_datetime(df_fin_pers_full['Date'])
-            numeric_columns = ['Cash', 'Stock', 'CD/Bond', 'Real Property', 'Retirement', 'Total']
-            for col in numeric_columns:
-                df_fin_pers_full[col] = pd.to_numeric(df_fin_pers_full[col], errors='coerce')
+            # Convert to a typed DataFrame (header row first)
+            df_fin_pers_full = apply_schema(data, TAB_SCHEMAS['fin_pers'], 'fin_pers')
             
             # Create simplified version for backward compatibility
             df_fin_pers = df_fin_pers_full[['Date', 'Total']].copy()
@@ -86,25 +201,27 @@ def get_gsheet_data():
         print("No backup files found in the specified folder")
         sys.exit(1)  # Stop execution if no files found
 
-    #open a sheet
-    mydash_sheet = client.open('x')
-
-    #select tabs in sheet
-    habits_tab = mydash_sheet.worksheet("Habits")
-    #time_tab = mydash_sheet.worksheet("Time")
-    finmkts_tab = mydash_sheet.worksheet("Finance")
-    quotes_tab = mydash_sheet.worksheet("Quotes")
-    fitness_tab = mydash_sheet.worksheet("Fitness")
-
-    #get data from tabs, store as a list of lists
-    habits_tab_data_headers = habits_tab.get("A2:BK2") #columns headers only
-    habits_tab_data = habits_tab.get("A3:BK") #data without headers
-    habits_tab_data_full = habits_tab.get("A2:BK") # both headers and data
-    #time_tab_data = time_tab.get("B2")
-    finmkts_tab_data = finmkts_tab.get("A3:E")
-    quote_data = quotes_tab.get("B5:B6")
-    fit_run_data = fitness_tab.get("B2:H")
-    fit_weight_data = fitness_tab.get("K2:L")
+    #check the sheet's Drive revision; the sheet itself is only opened when the local snapshot is stale
+    mydash_file = drive_file_version(drive_service, 'x')
+
+    #get data from every tab in one values.batchGet round trip, each range stored as a list of lists
+    #(no worksheet lookups needed, the tab name is part of the range)
+    habits_tab_data_full, finmkts_tab_data, quote_data, fit_run_data, fit_weight_data = cached_batch_get_ranges(mydash_file, [
+        ("Habits", "A2:BK"), # both headers and data
+        #("Time", "B2"),
+        ("Finance", "A3:E"),
+        ("Quotes", "B5:B6"),
+        ("Fitness", "B2:H"),
+        ("Fitness", "K2:L"),
+    ], lambda tab_ranges: batch_get_ranges(
+        # Open by the id Drive just returned (no second lookup by name)
+        client.open_by_key(mydash_file['id']) if mydash_file else client.open('x'), tab_ranges))
+
+    #split headers and data locally instead of fetching the overlapping ranges again
+    #(the data rows stay an Arrow slice of the cached range; process_habits reads them column by column)
+    habits_tab_data_headers = sheet_values(habits_tab_data_full[:1]) #columns headers only
+    habits_tab_data = habits_tab_data_full[1:] if len(habits_tab_data_full) > 1 else [[]] #data without headers
+    quote_data = sheet_values(quote_data)
    
     #if the 2nd cell (quote author) in quote data is empty, assign a blank string to resolve errors
     if quote_data[0] == []:
@@ -116,99 +233,102 @@ def get_gsheet_data():
             finmkts_tab_data, df_fin_pers, fit_run_data, fit_weight_data)   
 
 #PROCESS HABITS DATA INTO DASH-FRIENDLY DATA FORMAT
-def process_habits(habits_tab_data_headers, habits_tab_data, habits_tab_data_full):   
 
-    def convert_percentage(percentage_str):  # Function to convert percentage strings to floats
-        return float(percentage_str.strip('%')) / 100.0
+#cell patterns accepted by int() / float() (surrounding whitespace allowed)
+INT_PATTERN = r'^\s*[+-]?\d+\s*$'
+FLOAT_PATTERN = r'^\s*[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?\s*$'
+NULL_STRING = pa.scalar(None, pa.string())
+
+def sheet_column(rows, index):
+    # One sheet column as an Arrow string array; cells past the end of a short row are null.
+    # Rows may be a list of lists or an Arrow list<string> array (a cached range), which is sliced in Arrow
+    if isinstance(rows, pa.ChunkedArray):
+        rows = rows.chunk(0) if rows.num_chunks == 1 else rows.combine_chunks()
+    if isinstance(rows, pa.ListArray):
+        positions = pc.add(rows.offsets[:-1], index)
+        positions = pc.if_else(pc.greater(pc.list_value_length(rows), index), positions, pa.scalar(None, pa.int32()))
+        return pc.take(rows.values, positions)
+    return pa.array([row[index] if len(row) > index else None for row in rows], type=pa.string())
+
+def sheet_columns(rows, indices):
+    # {index: sheet_column(rows, index)} for several columns. Plain lists are transposed once with zip_longest
+    # (in C) instead of one Python loop over the rows per column
+    if isinstance(rows, (pa.Array, pa.ChunkedArray)):
+        return {index: sheet_column(rows, index) for index in indices}
+    transposed = list(itertools.zip_longest(*rows))
+    return {index: pa.array(transposed[index], type=pa.string()) if index < len(transposed)
+            else pa.nulls(len(rows), pa.string()) for index in indices}
+
+def parse_int_column(column):
+    # int(cell) for a whole Arrow string column; cells that don't parse (or are missing) become null
+    valid = pc.match_substring_regex(column, INT_PATTERN)
+    text = pc.utf8_trim_whitespace(pc.if_else(valid, column, NULL_STRING))
+    return pc.cast(pc.utf8_ltrim(text, '+'), pa.int64())
+
+def parse_percent_column(column):
+    # float(cell.strip('%')) / 100 for a whole Arrow string column; cells that don't parse become null
+    text = pc.utf8_trim(column, '%')
+    valid = pc.match_substring_regex(text, FLOAT_PATTERN)
+    text = pc.utf8_trim_whitespace(pc.if_else(valid, text, NULL_STRING))
+    return pc.divide(pc.cast(text, pa.float64()), 100.0)
+
+def valid_prefix_length(*columns):
+    # Number of leading rows where every column parsed (the row loops stopped at the first failure)
+    valid = np.logical_and.reduce([column.is_valid().to_numpy(zero_copy_only=False) for column in columns])
+    return len(valid) if valid.all() else int(valid.argmin())
+
+def process_habits(habits_tab_data_headers, habits_tab_data, habits_tab_data_full):
+
+    #every column read below, pulled out of the grid in one pass
+    columns = sheet_columns(habits_tab_data, [3, 5, 6, 10, 14, 38, 40, 42, 43])
 
     #detailed metrics
-    # Select the required columns 
-    habit_data_heat_noheaders = []
-    habit_data_bars_noheaders = []
-    habits_tab_line_noheaders = []
-    base_month = None  # Track the starting month
-    month_offset = 0   # Track years
-    
-    for row in habits_tab_data:
-        try:
-            #read next row for each individual variable 
-            day_in_month = int(row[6])
-            month_in_year = int(row[5])
-            
-            # Initialize base_month with the first month we see
-            if base_month is None:
-                base_month = month_in_year
-            # If we see a month number lower than the previous one, we've started a new year
-            elif month_in_year < prev_month:
-                month_offset += 12
-            
-            # Adjust month number to account for multiple years
-            adjusted_month = month_in_year + month_offset
-            
-            day_in_year = int(row[3])
-            win_rate = convert_percentage(row[10])
-            win_rate_YTD = convert_percentage(row[14])
-            loss_rate = float(1.00 - win_rate)
-            #update the full data set with the latest row's values for each variable
-            habit_data_heat_noheaders.append([day_in_month, adjusted_month, win_rate])
-            habit_data_bars_noheaders.append([day_in_year, win_rate, loss_rate])
-            habits_tab_line_noheaders.append([day_in_year, win_rate, win_rate_YTD])
-            
-            prev_month = month_in_year  # Keep track of previous month for year detection
-            
-        except (ValueError, IndexError) as e:
-            #print(f"Last Day-in-Year Read:  {day_in_year}    Current Time: {datetime.datetime.now()}")
-            #print(f"Skipping habits row.  {e}")
-            break
+    #typed columns straight from the raw grid, read until the first row that doesn't parse (end of the filled-in days)
+    day_in_year = parse_int_column(columns[3])
+    month_in_year = parse_int_column(columns[5])
+    day_in_month = parse_int_column(columns[6])
+    win_rate = parse_percent_column(columns[10])
+    win_rate_YTD = parse_percent_column(columns[14])
+    days = valid_prefix_length(day_in_year, month_in_year, day_in_month, win_rate, win_rate_YTD)
+
+    daily = pd.DataFrame({
+        'day_in_year': day_in_year[:days].to_numpy(),
+        'month_in_year': month_in_year[:days].to_numpy(),
+        'day_in_month': day_in_month[:days].to_numpy(),
+        'win_rate': win_rate[:days].to_numpy(),
+        'win_rate_YTD': win_rate_YTD[:days].to_numpy(),
+    })
+
+    # A month number lower than the previous row's means a new year started: shift by 12 per rollover
+    month_offset = (daily['month_in_year'].diff() < 0).cumsum() * 12
+    adjusted_month = daily['month_in_year'] + month_offset
 
     #summary metrics
-    habit_data_wkday_summary_noheaders = []
-    habit_data_perhabit_summary_noheaders = []
-    
-    #wkday summary
-    wkday_counter = 0
-    for row in habits_tab_data:
-        name_of_wkday = row[38]
-        day_in_wk_total_winrate = convert_percentage(row[40])
-        #print(f"Day of Week: {name_of_wkday}  Win Rate: {day_in_wk_total_winrate}")
-        habit_data_wkday_summary_noheaders.append([name_of_wkday, day_in_wk_total_winrate])
-        wkday_counter += 1
-        if wkday_counter == 7:
-            break
-   
-    #per-habit summary
-    for row in habits_tab_data:
-        try:
-            name_of_habit = row[42]
-            habit_total_winrate = convert_percentage(row[43])
-            habit_data_perhabit_summary_noheaders.append([name_of_habit, habit_total_winrate])
-            #print(f"Habit: {name_of_habit}  Win Rate: {habit_total_winrate}")
-        except (ValueError, IndexError):
-            break
-    #sort the per-habit summary by win rate, descending
-    habit_data_perhabit_summary_noheaders.sort(key=lambda x: x[1], reverse=True)
+    #wkday summary: the first 7 rows hold one row per day of the week
+    habit_data_wkday_summary = pd.DataFrame({
+        "Day of Week": columns[38][:7].to_numpy(zero_copy_only=False),
+        "Win Rate": parse_percent_column(columns[40][:7]).to_numpy(zero_copy_only=False),
+    })
+
+    #per-habit summary, read until the first row without a habit, sorted by win rate, descending
+    habit_names = columns[42]
+    habit_winrates = parse_percent_column(columns[43])
+    habits = valid_prefix_length(habit_names, habit_winrates)
+    habit_data_perhabit_summary = pd.DataFrame({
+        "Habit": habit_names[:habits].to_numpy(zero_copy_only=False),
+        "Win Rate": habit_winrates[:habits].to_numpy(),
+    }).sort_values("Win Rate", ascending=False, kind='stable').reset_index(drop=True)
 
     #select data for Per-habit LxD line graph
-    #select all rows from columns 28 to 35 from the habits tab
-    listdata_perhabit_lines_LxD = [row[28:35] for row in habits_tab_data_full]
-    #print first 3 rows of the perhabit line data with a paragraph return at the end of each row
-    # for row in listdata_perhabit_lines_LxD[0:2]:
-    #     print(row)
-    
-    listdata_perhabit_lines_LxD_datanoheaders = listdata_perhabit_lines_LxD[1:]
-    listdata_perhabit_lines_LxD_headers = listdata_perhabit_lines_LxD[0]
-
-    #print("code row 118 | columns headers: " ,  listdata_perhabit_lines_LxD_headers)
-    #print("code row 119 | columns data: " ,  listdata_perhabit_lines_LxD_datanoheaders[0])
-
-     #convert the list data to numerical values with up to 2 decimal places
-    listdata_perhabit_lines_LxD_datanoheaders = [
-        [float(x.strip('%')) / 100 if x.strip() else np.nan for x in row]
-        for row in listdata_perhabit_lines_LxD_datanoheaders
-    ]
-    
-   # print("code row 127 | columns headers: " , listdata_perhabit_lines_LxD[0])
-   # print("code row 128 | first 2 data rows: " , listdata_perhabit_lines_LxD[1:2])
+    #select all rows from columns 28 to 35 from the habits tab, first row is the headers
+    listdata_perhabit_lines_LxD_headers = sheet_values(habits_tab_data_full[:1])[0][28:35]
+    perhabit_columns = sheet_columns(habits_tab_data_full, range(28, 28 + len(listdata_perhabit_lines_LxD_headers)))
+    perhabit_lines_LxD = {}
+    for offset in range(len(listdata_perhabit_lines_LxD_headers)):
+        column = perhabit_columns[28 + offset][1:]
+        #convert the text to numerical values, blank cells become NaN
+        column = pc.if_else(pc.equal(pc.utf8_trim_whitespace(column), ''), NULL_STRING, column)
+        perhabit_lines_LxD[offset] = pc.divide(pc.cast(pc.utf8_trim(column, '%'), pa.float64()), 100).to_numpy(zero_copy_only=False)
 
     #create a class to contain all the dataframes
     class dfs_habits:
@@ -223,23 +343,26 @@ def process_habits(habits_tab_data_headers, habits_tab_data, habits_tab_data_ful
     #Create an instance of the class
     dfs_habits = dfs_habits()
 
-    # Convert the lists to DataFrames
-    dfs_habits.heatmap = pd.DataFrame(habit_data_heat_noheaders, 
-                                      columns=["  Day in Mo", "  Mo in Yr", "  Win %"])
-    # Pivot the heatmap data to create a 2D array and fill NULL values with 0
-    z_data_heat = dfs_habits.heatmap.pivot(index="  Mo in Yr", columns="  Day in Mo", values="  Win %").fillna(0)
-    # Ensure the DataFrame matches the dimensions for the heatmap
-    dfs_habits.heatmap = pd.DataFrame(z_data_heat, index=dfs_habits.heatmap["  Mo in Yr"].unique(), columns=dfs_habits.heatmap["  Day in Mo"].unique()).fillna(0)
-
-    dfs_habits.bars = pd.DataFrame(habit_data_bars_noheaders, columns=["Day in Year", "Win %", "Loss %"])
-    dfs_habits.line = pd.DataFrame(habits_tab_line_noheaders, columns=["Day in Year", "Win %", "Win % YTD"])
+    # Heatmap grid: rows are months and columns are days in order of first appearance, missing cells 0.
+    # Filled by scattering the win rates into a zero array instead of a pandas pivot + reindex
+    month_codes, months = pd.factorize(adjusted_month)
+    day_codes, days_in_month = pd.factorize(daily['day_in_month'])
+    z_data_heat = np.zeros((len(months), len(days_in_month)))
+    z_data_heat[month_codes, day_codes] = daily['win_rate'].to_numpy()
+    dfs_habits.heatmap = pd.DataFrame(z_data_heat, index=months, columns=days_in_month)
+
+    dfs_habits.bars = pd.DataFrame({"Day in Year": daily['day_in_year'],
+                                    "Win %": daily['win_rate'],
+                                    "Loss %": 1.00 - daily['win_rate']})
+    dfs_habits.line = pd.DataFrame({"Day in Year": daily['day_in_year'],
+                                    "Win %": daily['win_rate'],
+                                    "Win % YTD": daily['win_rate_YTD']})
     dfs_habits.line_LxD = dfs_habits.line.tail(45) #Take only the last 45 rows of the line dataframe
 
-    dfs_habits.wkday_summary = pd.DataFrame(habit_data_wkday_summary_noheaders, 
-                                               columns=["Day of Week", "Win Rate"])
-    dfs_habits.perhabit_summary = pd.DataFrame(habit_data_perhabit_summary_noheaders,
-                                                  columns=["Habit", "Win Rate"])
-    dfs_habits.perhabit_lines_LxD = pd.DataFrame(listdata_perhabit_lines_LxD_datanoheaders, columns=listdata_perhabit_lines_LxD_headers)
+    dfs_habits.wkday_summary = habit_data_wkday_summary
+    dfs_habits.perhabit_summary = habit_data_perhabit_summary
+    dfs_habits.perhabit_lines_LxD = pd.DataFrame(perhabit_lines_LxD)
+    dfs_habits.perhabit_lines_LxD.columns = listdata_perhabit_lines_LxD_headers
 
     return dfs_habits
 
@@ -250,54 +373,120 @@ def process_habits(habits_tab_data_headers, habits_tab_data, habits_tab_data_ful
 
 #weather_tab.update([["Overriding2_D12"]], "D12")
 
+#SCHEMA-ON-READ FOR THE GSHEET TABS
+#One declarative schema per tabular range. The first row of every range is its header row.
+#The Habits tab is read column by column in Arrow by process_habits (its percent cells with
+#parse_percent_column), and the Quotes range is two text cells without a header row, so neither has a schema.
+#Column spec keys:
+#   name: output column name
+#   source: header text of the sheet column, or its 0-based position in the range
+#   type: 'date', 'float32', 'float64', 'percent', 'currency', 'category' or 'string'.
+#         Values shown on the dashboard are float64: float32 would show 180.2 as 180.1999969.
+#         'category' is for text columns with few distinct, repeated values
+#   format: strptime format for 'date' columns (None: pandas infers it once from the first value)
+#   required: rows where this column is blank or doesn't parse are rejected
+#passthrough: keep the undeclared columns of the range, as the given type ('string' or 'category')
+TAB_SCHEMAS = {
+    'finmkts': {
+        'columns': [
+            {'name': 'Date', 'source': 1, 'type': 'date', 'format': None, 'required': True},
+            {'name': 'Price', 'source': 2, 'type': 'currency', 'required': True}, #column 3 (NASDAQ in this case)
+        ],
+    },
+    'fit_run': {
+        'columns': [
+            {'name': 'Date', 'source': 'Date', 'type': 'date', 'format': '%Y-%m-%d', 'required': True},
+            {'name': 'Pace (min/mi)', 'source': 'Pace (min/mi)', 'type': 'float64', 'required': True},
+            {'name': 'Distance (mi)', 'source': 'Distance (mi)', 'type': 'float64', 'required': True},
+        ],
+        'passthrough': 'category', #run notes and the like: a handful of values repeated on every row
+    },
+    'fit_weight': {
+        'columns': [
+            {'name': 'Date', 'source': 'Date', 'type': 'date', 'format': '%Y-%m-%d %H:%M:%S', 'required': True},
+            {'name': 'Weight (lb)', 'source': 'Weight (lb)', 'type': 'float64', 'required': True},
+        ],
+    },
+    'fin_pers': {
+        'columns': [
+            {'name': 'Date', 'source': 'Date', 'type': 'date', 'format': None, 'required': True},
+            {'name': 'Cash', 'source': 'Cash', 'type': 'currency'},
+            {'name': 'Stock', 'source': 'Stock', 'type': 'currency'},
+            {'name': 'CD/Bond', 'source': 'CD/Bond', 'type': 'currency'},
+            {'name': 'Real Property', 'source': 'Real Property', 'type': 'currency'},
+            {'name': 'Retirement', 'source': 'Retirement', 'type': 'currency'},
+            {'name': 'Total', 'source': 'Total', 'type': 'currency'},
+        ],
+    },
+}
+
+def convert_column(text, spec):
+    # One vectorized conversion per column; values that don't parse become NaN/NaT
+    column_type = spec['type']
+    if column_type == 'date':
+        return pd.to_datetime(text, format=spec.get('format'), errors='coerce')
+    if column_type in ('float32', 'float64'):
+        return pd.to_numeric(text.str.strip(), errors='coerce').astype(column_type)
+    if column_type == 'percent':
+        return pd.to_numeric(text.str.strip().str.rstrip('%'), errors='coerce').astype('float64') / 100
+    if column_type == 'currency':
+        # "$1,234.50" and "(1,234.50)" accounting negatives
+        cleaned = text.str.replace(r'[$,\s]', '', regex=True).str.replace(r'^\((.*)\)$', r'-\1', regex=True)
+        return pd.to_numeric(cleaned, errors='coerce').astype('float64')
+    if column_type == 'category':
+        # Blank cells become missing values rather than a '' category
+        return text.where(text.str.strip() != '').astype('category')
+    if column_type == 'string':
+        return text
+    raise ValueError(f"Unknown column type '{column_type}' for column '{spec['name']}'")
+
+def apply_schema(values, schema, tab_name='tab'):
+    """
+    Convert a tab's raw values to a typed DataFrame using its declarative schema.
+
+    Args:
+        values: list of lists as returned by the Sheets API (or its Arrow rows), header row first
+        schema: one of TAB_SCHEMAS
+        tab_name: tab name for messages
+
+    Returns:
+        DataFrame with the declared columns (plus the passthrough columns). Rows failing
+        a required column are rejected in bulk.
+    """
+    header, rows = sheet_values(values[:1])[0], values[1:]
+    frame = {}
+    for spec in schema['columns']:
+        source = spec['source']
+        position = source if isinstance(source, int) else header.index(source)
+        text = pd.Series(sheet_column(rows, position).to_numpy(zero_copy_only=False), dtype=object)
+        frame[spec['name']] = convert_column(text, spec)
+
+    if schema.get('passthrough'):
+        declared = {spec['source'] for spec in schema['columns']}
+        for position, column_name in enumerate(header):
+            if column_name not in declared and position not in declared:
+                text = pd.Series(sheet_column(rows, position).to_numpy(zero_copy_only=False), dtype=object)
+                frame[column_name] = convert_column(text, {'name': column_name, 'type': schema['passthrough']})
+
+    df = pd.DataFrame(frame, index=pd.RangeIndex(len(rows)))
+    required = [spec['name'] for spec in schema['columns'] if spec.get('required')]
+    valid = df[required].notna().all(axis=1) if required else pd.Series(True, index=df.index)
+    if not valid.all():
+        print(f"Rejected {int((~valid).sum())} of {len(df)} {tab_name} rows that failed the schema")
+    return df[valid].reset_index(drop=True)
+
 #PROCESS FINANCIAL MARKETS DATA INTO DASH-FRIENDLY FORMAT
 
 #read dates from the 2nd column and stock price from the 3rd column of the financial markets tab
 def process_finmkts(finmkts_tab_data):
-    # Select the required columns 
-    finmkts_data_noheaders = []
-    for row in finmkts_tab_data:
-        try:
-            date = row[1]
-            price = row[2] #reading from column 3 (NASDAQ in this case)
-            finmkts_data_noheaders.append([date, price])
-        except (ValueError, IndexError) as e:
-            print(f"Skipping finmkts row due to error: {e}")
-
-    #remove headers from the data
-    finmkts_data_noheaders = finmkts_data_noheaders[1:]
-
-    #converting data types to datetime and float
-    for row in finmkts_data_noheaders:
-        row[0] = pd.to_datetime(row[0])
-        row[1] = float(row[1])
-
-    # Convert the list to a DataFrame
-    df_finmkts_data = pd.DataFrame(finmkts_data_noheaders, columns=["Date", "Price"])
-
-    return df_finmkts_data
+    return apply_schema(finmkts_tab_data, TAB_SCHEMAS['finmkts'], 'finmkts')
 
 def process_fitness(fit_run_data,fit_weight_data):
-    # Convert the data to a DataFrame, using the first row as the header
-    df_fit_run = pd.DataFrame(fit_run_data[1:], columns=fit_run_data[0])
-
-    # Convert Pace (min/mi) to numeric
-    df_fit_run['Pace (min/mi)'] = pd.to_numeric(df_fit_run['Pace (min/mi)'], errors='coerce')
-
-    # Ensure Date is in datetime format
-    df_fit_run['Date'] = pd.to_datetime(df_fit_run['Date'], format='%Y-%m-%d', errors='coerce')
-
-    # Drop rows with NaN values in critical columns
-    df_fit_run.dropna(subset=['Date', 'Pace (min/mi)', 'Distance (mi)'], inplace=True)
-
-    # Sort DataFrame by Date
+    # Typed columns straight from the schema, rejected rows already dropped
+    df_fit_run = apply_schema(fit_run_data, TAB_SCHEMAS['fit_run'], 'fit_run')
     df_fit_run.sort_values('Date', inplace=True)
 
-    #convert fit_weight_data to a dataframe, sort by date with earliest at top, drop NaN values, and convert to datetime
-    df_fit_weight = pd.DataFrame(fit_weight_data[1:], columns=fit_weight_data[0])
-    df_fit_weight.dropna(subset=['Date', 'Weight (lb)'], inplace=True)
-    df_fit_weight['Date'] = pd.to_datetime(df_fit_weight['Date'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-    df_fit_weight['Weight (lb)'] = pd.to_numeric(df_fit_weight['Weight (lb)'], errors='coerce')
+    df_fit_weight = apply_schema(fit_weight_data, TAB_SCHEMAS['fit_weight'], 'fit_weight')
     df_fit_weight.sort_values('Date', inplace=True)
 
-    return df_fit_run, df_fit_weight
\ No newline at end of file
+    return df_fit_run, df_fit_weight
@@ -0,0 +1,426 @@
+#Tests for 20250123.py (Google Sheets ingest) against fake Sheets/Drive clients.
+#Run with: python -m pytest 2025/202501
+import datetime
+import importlib.util
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+spec = importlib.util.spec_from_file_location('sheets_ingest', Path(__file__).with_name('20250123.py'))
+sheets_ingest = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sheets_ingest)
+
+#Original row-by-row process_habits: the reference the vectorized version must match frame for frame
+def process_habits_rowwise(habits_tab_data_headers, habits_tab_data, habits_tab_data_full):   
+
+    def convert_percentage(percentage_str):  # Function to convert percentage strings to floats
+        return float(percentage_str.strip('%')) / 100.0
+
+    #detailed metrics
+    # Select the required columns 
+    habit_data_heat_noheaders = []
+    habit_data_bars_noheaders = []
+    habits_tab_line_noheaders = []
+    base_month = None  # Track the starting month
+    month_offset = 0   # Track years
+    
+    for row in habits_tab_data:
+        try:
+            #read next row for each individual variable 
+            day_in_month = int(row[6])
+            month_in_year = int(row[5])
+            
+            # Initialize base_month with the first month we see
+            if base_month is None:
+                base_month = month_in_year
+            # If we see a month number lower than the previous one, we've started a new year
+            elif month_in_year < prev_month:
+                month_offset += 12
+            
+            # Adjust month number to account for multiple years
+            adjusted_month = month_in_year + month_offset
+            
+            day_in_year = int(row[3])
+            win_rate = convert_percentage(row[10])
+            win_rate_YTD = convert_percentage(row[14])
+            loss_rate = float(1.00 - win_rate)
+            #update the full data set with the latest row's values for each variable
+            habit_data_heat_noheaders.append([day_in_month, adjusted_month, win_rate])
+            habit_data_bars_noheaders.append([day_in_year, win_rate, loss_rate])
+            habits_tab_line_noheaders.append([day_in_year, win_rate, win_rate_YTD])
+            
+            prev_month = month_in_year  # Keep track of previous month for year detection
+            
+        except (ValueError, IndexError) as e:
+            #print(f"Last Day-in-Year Read:  {day_in_year}    Current Time: {datetime.datetime.now()}")
+            #print(f"Skipping habits row.  {e}")
+            break
+
+    #summary metrics
+    habit_data_wkday_summary_noheaders = []
+    habit_data_perhabit_summary_noheaders = []
+    
+    #wkday summary
+    wkday_counter = 0
+    for row in habits_tab_data:
+        name_of_wkday = row[38]
+        day_in_wk_total_winrate = convert_percentage(row[40])
+        #print(f"Day of Week: {name_of_wkday}  Win Rate: {day_in_wk_total_winrate}")
+        habit_data_wkday_summary_noheaders.append([name_of_wkday, day_in_wk_total_winrate])
+        wkday_counter += 1
+        if wkday_counter == 7:
+            break
+   
+    #per-habit summary
+    for row in habits_tab_data:
+        try:
+            name_of_habit = row[42]
+            habit_total_winrate = convert_percentage(row[43])
+            habit_data_perhabit_summary_noheaders.append([name_of_habit, habit_total_winrate])
+            #print(f"Habit: {name_of_habit}  Win Rate: {habit_total_winrate}")
+        except (ValueError, IndexError):
+            break
+    #sort the per-habit summary by win rate, descending
+    habit_data_perhabit_summary_noheaders.sort(key=lambda x: x[1], reverse=True)
+
+    #select data for Per-habit LxD line graph
+    #select all rows from columns 28 to 35 from the habits tab
+    listdata_perhabit_lines_LxD = [row[28:35] for row in habits_tab_data_full]
+    #print first 3 rows of the perhabit line data with a paragraph return at the end of each row
+    # for row in listdata_perhabit_lines_LxD[0:2]:
+    #     print(row)
+    
+    listdata_perhabit_lines_LxD_datanoheaders = listdata_perhabit_lines_LxD[1:]
+    listdata_perhabit_lines_LxD_headers = listdata_perhabit_lines_LxD[0]
+
+    #print("code row 118 | columns headers: " ,  listdata_perhabit_lines_LxD_headers)
+    #print("code row 119 | columns data: " ,  listdata_perhabit_lines_LxD_datanoheaders[0])
+
+     #convert the list data to numerical values with up to 2 decimal places
+    listdata_perhabit_lines_LxD_datanoheaders = [
+        [float(x.strip('%')) / 100 if x.strip() else np.nan for x in row]
+        for row in listdata_perhabit_lines_LxD_datanoheaders
+    ]
+    
+   # print("code row 127 | columns headers: " , listdata_perhabit_lines_LxD[0])
+   # print("code row 128 | first 2 data rows: " , listdata_perhabit_lines_LxD[1:2])
+
+    #create a class to contain all the dataframes
+    class dfs_habits:
+        def __init__(self):
+            self.heatmap = None
+            self.bars = None
+            self.line_LxD = None
+            self.perhabit_lines_LxD = None
+            self.wkday_summary = None
+            self.perhabit_summary = None
+
+    #Create an instance of the class
+    dfs_habits = dfs_habits()
+
+    # Convert the lists to DataFrames
+    dfs_habits.heatmap = pd.DataFrame(habit_data_heat_noheaders, 
+                                      columns=["  Day in Mo", "  Mo in Yr", "  Win %"])
+    # Pivot the heatmap data to create a 2D array and fill NULL values with 0
+    z_data_heat = dfs_habits.heatmap.pivot(index="  Mo in Yr", columns="  Day in Mo", values="  Win %").fillna(0)
+    # Ensure the DataFrame matches the dimensions for the heatmap
+    dfs_habits.heatmap = pd.DataFrame(z_data_heat, index=dfs_habits.heatmap["  Mo in Yr"].unique(), columns=dfs_habits.heatmap["  Day in Mo"].unique()).fillna(0)
+
+    dfs_habits.bars = pd.DataFrame(habit_data_bars_noheaders, columns=["Day in Year", "Win %", "Loss %"])
+    dfs_habits.line = pd.DataFrame(habits_tab_line_noheaders, columns=["Day in Year", "Win %", "Win % YTD"])
+    dfs_habits.line_LxD = dfs_habits.line.tail(45) #Take only the last 45 rows of the line dataframe
+
+    dfs_habits.wkday_summary = pd.DataFrame(habit_data_wkday_summary_noheaders, 
+                                               columns=["Day of Week", "Win Rate"])
+    dfs_habits.perhabit_summary = pd.DataFrame(habit_data_perhabit_summary_noheaders,
+                                                  columns=["Habit", "Win Rate"])
+    dfs_habits.perhabit_lines_LxD = pd.DataFrame(listdata_perhabit_lines_LxD_datanoheaders, columns=listdata_perhabit_lines_LxD_headers)
+
+    return dfs_habits
+
+def make_synthetic_habits_sheet(years=10, num_habits=20, seed=0):
+    """
+    Build a synthetic Habits tab grid (as returned by the Sheets API for A2:BK).
+
+    Args:
+        years: number of years of filled-in days
+        num_habits: number of rows in the per-habit summary block
+        seed: random seed
+
+    Returns:
+        (habits_tab_data_headers, habits_tab_data, habits_tab_data_full)
+    """
+    rng = np.random.default_rng(seed)
+    wkday_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    headers = [f"Col {i}" for i in range(63)]
+    start = datetime.date(2015, 1, 1)
+    rows = []
+    for i in range(years * 365):
+        day = start + datetime.timedelta(days=i)
+        row = [''] * 63
+        row[0] = day.isoformat()
+        row[3] = str(day.timetuple().tm_yday)
+        row[5] = str(day.month)
+        row[6] = str(day.day)
+        row[10] = f"{rng.uniform(0, 100):.2f}%"
+        row[14] = f"{rng.uniform(0, 100):.2f}%"
+        for col in range(28, 35):
+            row[col] = f"{rng.uniform(0, 100):.1f}%" if rng.random() > 0.1 else ''
+        if i < 7:
+            row[38] = wkday_names[i]
+            row[40] = f"{rng.uniform(0, 100):.2f}%"
+        if i < num_habits:
+            row[42] = f"Habit {i}"
+            row[43] = f"{rng.integers(0, 10) * 10}%"  # Coarse values so the sort has ties
+        rows.append(row)
+    # Days not filled in yet: the date columns exist, the metrics are blank (trimmed by the API)
+    for i in range(30):
+        day = start + datetime.timedelta(days=years * 365 + i)
+        rows.append([day.isoformat(), '', '', str(day.timetuple().tm_yday)])
+    return [headers], rows, [headers] + rows
+
+BACKUP_FILE = {'id': 'backup-id', 'name': 'x_20250101_Backup', 'createdTime': '2025-01-01T00:00:00Z',
+               'modifiedTime': '2025-01-01T00:00:00Z', 'version': '3'}
+MYDASH_FILE = {'id': 'mydash-id', 'name': 'x', 'modifiedTime': '2025-01-02T00:00:00Z', 'version': '7'}
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+class FakeDrive:
+    """Drive v3 files().list(): the backup folder query pages through folder_files, the name query finds mydash_file."""
+    def __init__(self, folder_files=None):
+        self.mydash_file = dict(MYDASH_FILE)
+        self.folder_files = [BACKUP_FILE] if folder_files is None else folder_files
+        self.folder_queries = []
+
+    def files(self):
+        return self
+
+    def list(self, q, **params):
+        if ' in parents' not in q:
+            return FakeRequest({'files': [self.mydash_file]})
+        self.folder_queries.append(q)
+        assert params['orderBy'] == 'createdTime desc'
+        files = sorted(self.folder_files, key=lambda file: file['createdTime'], reverse=True)
+        start = int(params.get('pageToken') or 0)
+        page = {'files': files[start:start + params['pageSize']]}
+        if start + params['pageSize'] < len(files):
+            page['nextPageToken'] = str(start + params['pageSize'])
+        return FakeRequest(page)
+
+class FakeSpreadsheet:
+    def __init__(self, ranges, calls):
+        self.ranges = ranges
+        self.calls = calls
+        self.sheet1 = self
+
+    def values_batch_get(self, ranges):
+        self.calls.append(ranges)
+        return {'valueRanges': [{'range': name, 'values': self.ranges[name]} for name in ranges]}
+
+    def get_all_values(self):
+        self.calls.append('sheet1')
+        return self.ranges['sheet1']
+
+class FakeSheetsClient:
+    """gspread client: spreadsheets are only reachable by key, so an open() by name fails the test."""
+    def __init__(self, spreadsheets):
+        self.spreadsheets = spreadsheets
+        self.calls = []
+
+    def open_by_key(self, key):
+        return FakeSpreadsheet(self.spreadsheets[key], self.calls)
+
+    def open(self, title):
+        raise AssertionError(f"spreadsheet opened by name: {title}")
+
+@pytest.fixture
+def habits_sheet():
+    return make_synthetic_habits_sheet(years=1, num_habits=5)
+
+@pytest.fixture
+def fake_google(monkeypatch, tmp_path, habits_sheet):
+    # Sheet ranges as the Sheets API returns them (header row first, strings only)
+    _, _, habits_full = habits_sheet
+    mydash_ranges = {
+        "'Habits'!A2:BK": habits_full,
+        "'Finance'!A3:E": [['', 'Date', 'NASDAQ'], ['', '2025-01-02', '$19,280.79'], ['', '2025-01-03', '$19,621.68']],
+        "'Quotes'!B5:B6": [[], ['Stay hungry.']],
+        "'Fitness'!B2:H": [['Date', 'Pace (min/mi)', 'Distance (mi)', 'Notes'], ['2025-01-02', '9.5', '3.1', 'easy']],
+        "'Fitness'!K2:L": [['Date', 'Weight (lb)'], ['2025-01-02 07:00:00', '180.2']],
+    }
+    backup_ranges = {'sheet1': [['Date', 'Cash', 'Stock', 'CD/Bond', 'Real Property', 'Retirement', 'Total'],
+                                ['2025-01-01', '$1,000', '$2,000', '$0', '$0', '$500', '$3,500']]}
+    drive = FakeDrive()
+    sheets_client = FakeSheetsClient({'mydash-id': mydash_ranges, 'backup-id': backup_ranges})
+
+    monkeypatch.chdir(tmp_path)  # Snapshot cache goes to Data/Sheets Cache under the test dir
+    monkeypatch.setattr(sheets_ingest.ServiceAccountCredentials, 'from_json_keyfile_name',
+                        staticmethod(lambda path, scope: object()))
+    monkeypatch.setattr(sheets_ingest.gspread, 'authorize', lambda creds: sheets_client)
+    monkeypatch.setattr(sheets_ingest, 'build', lambda service, version, credentials: drive)
+    return drive, sheets_client
+
+def test_cached_batch_get_ranges_fetches_once_per_revision(tmp_path):
+    fetched = []
+
+    def fetch(tab_ranges):
+        fetched.append(tab_ranges)
+        return [[['h1', 'h2'], ['a']], [[]]]
+
+    tab_ranges = [('Tab', 'A1:B'), ('Other', 'C1')]
+    first = sheets_ingest.cached_batch_get_ranges(MYDASH_FILE, tab_ranges, fetch, tmp_path)
+    second = sheets_ingest.cached_batch_get_ranges(MYDASH_FILE, tab_ranges, fetch, tmp_path)
+    edited = sheets_ingest.cached_batch_get_ranges({**MYDASH_FILE, 'version': '8'}, tab_ranges, fetch, tmp_path)
+    # Only modifiedTime moved (e.g. a Drive copy/restore keeping the version number): still refetched
+    touched = {**MYDASH_FILE, 'version': '8', 'modifiedTime': '2025-01-03T00:00:00Z'}
+    sheets_ingest.cached_batch_get_ranges(touched, tab_ranges, fetch, tmp_path)
+    sheets_ingest.cached_batch_get_ranges(touched, tab_ranges, fetch, tmp_path)
+
+    assert len(fetched) == 3  # Initial miss, the edited version and the new modifiedTime
+    assert [rows.to_pylist() for rows in second] == [[['h1', 'h2'], ['a']], [[]]]
+    assert [rows.to_pylist() for rows in first] == [rows.to_pylist() for rows in edited]
+
+def test_read_cached_range_returns_arrow_rows(tmp_path):
+    path = tmp_path / 'range.arrow'
+    sheets_ingest.write_cached_range(path, 'r1', [['a', 'b'], ['c']])
+
+    rows = sheets_ingest.read_cached_range(path, 'r1')
+
+    assert isinstance(rows, pa.ChunkedArray)
+    assert sheets_ingest.sheet_column(rows, 1).to_pylist() == ['b', None]
+    assert sheets_ingest.read_cached_range(path, 'r2') is None
+
+def test_convert_column_percent_and_category():
+    text = pd.Series(['12.5%', ' 40% ', '', 'n/a'], dtype=object)
+
+    percent = sheets_ingest.convert_column(text, {'name': 'Win %', 'type': 'percent'})
+    category = sheets_ingest.convert_column(pd.Series(['easy', 'tempo', 'easy', ' '], dtype=object),
+                                            {'name': 'Notes', 'type': 'category'})
+
+    assert percent.dtype == 'float64'
+    assert percent.tolist()[:2] == [0.125, 0.4] and percent.iloc[2:].isna().all()
+    assert list(category.cat.categories) == ['easy', 'tempo']
+    assert category.isna().tolist() == [False, False, False, True]
+
+def test_find_latest_backup_skips_non_backups_sharing_the_prefix():
+    drive = FakeDrive([
+        dict(BACKUP_FILE, id='old', name='x_20241201_Backup', createdTime='2024-12-01T00:00:00Z'),
+        dict(BACKUP_FILE, id='new', name='x_20250101_Backup', createdTime='2025-01-01T00:00:00Z'),
+        dict(BACKUP_FILE, id='notes', name='x notes', createdTime='2025-01-05T00:00:00Z'),
+        dict(BACKUP_FILE, id='copy', name='x_20250101_Backup copy', createdTime='2025-01-06T00:00:00Z'),
+    ])
+
+    latest = sheets_ingest.find_latest_backup(drive, 'folder-id', 'x', page_size=1)
+
+    assert latest['id'] == 'new'
+    assert len(drive.folder_queries) == 3  # Walked past the two newer non-backups, one page each
+    assert all("name contains 'x'" in q and '_Backup' not in q for q in drive.folder_queries)
+    assert sheets_ingest.find_latest_backup(FakeDrive([drive.folder_files[2]]), 'folder-id', 'x') is None
+
+def test_batch_get_ranges_is_one_request_in_range_order():
+    calls = []
+    spreadsheet = FakeSpreadsheet({"'Quotes'!B5:B6": [['q']], "'Habits'!A2:BK": [['h'], ['1']]}, calls)
+
+    values = sheets_ingest.batch_get_ranges(spreadsheet, [("Quotes", "B5:B6"), ("Habits", "A2:BK")])
+
+    assert calls == [["'Quotes'!B5:B6", "'Habits'!A2:BK"]]
+    assert values == [[['q']], [['h'], ['1']]]
+
+def test_batch_get_ranges_returns_empty_ranges_like_worksheet_get():
+    spreadsheet = FakeSpreadsheet({}, [])
+    spreadsheet.values_batch_get = lambda ranges: {'valueRanges': [{'range': name} for name in ranges]}  # No 'values' key
+
+    assert sheets_ingest.batch_get_ranges(spreadsheet, [("Time", "B2")]) == [[[]]]
+
+def test_get_gsheet_data_splits_habits_header_locally(fake_google, habits_sheet):
+    _, sheets_client = fake_google
+    _, _, habits_full = habits_sheet
+
+    habits_headers, habits_data, habits_full_rows = sheets_ingest.get_gsheet_data()[:3]
+
+    # One batchGet for every tab: the header row is not fetched again as A2:BK2, nor the data as A3:BK
+    assert [call for call in sheets_client.calls if call != 'sheet1'] == [
+        ["'Habits'!A2:BK", "'Finance'!A3:E", "'Quotes'!B5:B6", "'Fitness'!B2:H", "'Fitness'!K2:L"]]
+    assert habits_headers == habits_full[:1]
+    assert habits_data.to_pylist() == habits_full[1:]
+    assert habits_full_rows.to_pylist() == habits_full
+
+def test_get_gsheet_data_reads_sheet_once_by_key(fake_google, habits_sheet):
+    drive, sheets_client = fake_google
+
+    first = sheets_ingest.get_gsheet_data()
+    second = sheets_ingest.get_gsheet_data()
+
+    # One batchGet plus one backup read; the second run is served from the local snapshots
+    assert len(sheets_client.calls) == 2
+    habits_headers, habits_data, habits_full, text_quotes, finmkts, df_fin_pers, fit_run, fit_weight = second
+    assert text_quotes == "\nStay hungry.\n "
+    assert df_fin_pers['Value'].tolist() == [3500.0]
+    assert sheets_ingest.process_finmkts(finmkts)['Price'].tolist() == [19280.79, 19621.68]
+    df_fit_run, df_fit_weight = sheets_ingest.process_fitness(fit_run, fit_weight)
+    assert df_fit_run['Distance (mi)'].tolist() == [3.1]
+    assert df_fit_run['Notes'].dtype == 'category' and df_fit_run['Notes'].tolist() == ['easy']
+    assert df_fit_weight['Weight (lb)'].tolist() == [180.2]
+    assert str(df_fit_weight['Weight (lb)'].iloc[0]) == '180.2'  # As typed in the sheet, not 180.1999969
+
+    # Habits processed from the memory-mapped Arrow rows match processing the plain lists
+    from_cache = sheets_ingest.process_habits(habits_headers, habits_data, habits_full)
+    from_lists = sheets_ingest.process_habits(*habits_sheet)
+    for name in ['heatmap', 'bars', 'line', 'line_LxD', 'wkday_summary', 'perhabit_summary', 'perhabit_lines_LxD']:
+        pd.testing.assert_frame_equal(getattr(from_cache, name), getattr(from_lists, name))
+
+    drive.mydash_file['version'] = '8'  # Sheet edited: refetched, still by key
+    sheets_ingest.get_gsheet_data()
+    assert len(sheets_client.calls) == 3
+
+def test_process_habits_matches_rowwise_reference(habits_sheet):
+    habits_headers, habits_data, habits_full = habits_sheet
+    reference = process_habits_rowwise(*habits_sheet)
+
+    from_lists = sheets_ingest.process_habits(*habits_sheet)
+    from_arrow = sheets_ingest.process_habits(habits_headers, sheets_ingest.sheet_rows(habits_data),
+                                              sheets_ingest.sheet_rows(habits_full))
+    for result in [from_lists, from_arrow]:
+        for name in ['heatmap', 'bars', 'line', 'line_LxD', 'wkday_summary', 'perhabit_summary', 'perhabit_lines_LxD']:
+            pd.testing.assert_frame_equal(getattr(result, name), getattr(reference, name), check_exact=True)
+
+def benchmark_process_habits(years=10, repeats=5):
+    habits_tab_data_headers, habits_tab_data, habits_tab_data_full = make_synthetic_habits_sheet(years)
+
+    # The ranges as get_gsheet_data returns them from the local snapshot (Arrow list<string> rows)
+    arrow_data, arrow_full = sheets_ingest.sheet_rows(habits_tab_data), sheets_ingest.sheet_rows(habits_tab_data_full)
+
+    def best_of(func, data, full):
+        best = float('inf')
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            result = func(habits_tab_data_headers, data, full)
+            best = min(best, time.perf_counter() - t0)
+        return result, best
+
+    rowwise, rowwise_seconds = best_of(process_habits_rowwise, habits_tab_data, habits_tab_data_full)
+    from_lists, lists_seconds = best_of(sheets_ingest.process_habits, habits_tab_data, habits_tab_data_full)
+    from_arrow, arrow_seconds = best_of(sheets_ingest.process_habits, arrow_data, arrow_full)
+    for name in ['heatmap', 'bars', 'line', 'line_LxD', 'wkday_summary', 'perhabit_summary', 'perhabit_lines_LxD']:
+        pd.testing.assert_frame_equal(getattr(from_lists, name), getattr(rowwise, name), check_exact=True)
+        pd.testing.assert_frame_equal(getattr(from_arrow, name), getattr(rowwise, name), check_exact=True)
+
+    print(f"process_habits on {years} years ({len(habits_tab_data)} rows), best of {repeats}")
+    print(f"Row-by-row:             {rowwise_seconds * 1000:.1f}ms")
+    print(f"Vectorized, lists:      {lists_seconds * 1000:.1f}ms  ({rowwise_seconds / lists_seconds:.1f}x faster)")
+    print(f"Vectorized, Arrow rows: {arrow_seconds * 1000:.1f}ms  ({rowwise_seconds / arrow_seconds:.1f}x faster)")
+
+#Benchmark: python 2025/202501/test_20250123.py --benchmark
+if __name__ == '__main__':
+    if '--benchmark' in sys.argv:
+        benchmark_process_habits()
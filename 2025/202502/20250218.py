@@ -8,12 +8,20 @@ from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 import json
 import plotly.graph_objects as go
 import asyncio
 import aiohttp
+from aiohttp import web
 import sqlite3
 import os.path
+import sys
+import time
+import random
+import bisect
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from notion_client import Client
 import pandas as pd
@@ -21,8 +29,10 @@ from typing import Any
 
 # Configuration Constants
 NOTION_API_VERSION = "2022-06-28"
+NOTION_API_BASE = "https://api.notion.com/v1"
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 QUESTIONABLE_WORDS = ["?", "tbd", "canx", "//", "prev complete"]
+TIMEZONE = 'US/Central'  # Local day boundaries for daily totals
 START_DATE = datetime.date(2024, 1, 1)  # Generic start date
 
 def get_config_paths():
@@ -83,6 +93,59 @@ def get_calendar_service() -> Any:
 
     return build('calendar', 'v3', credentials=creds)
 
+def iter_calendar_event_pages(service, calendar_id='primary', page_size=2500, **list_params):
+    """
+    Yield raw events().list responses page by page, following nextPageToken.
+
+    The last page carries nextSyncToken when the query supports incremental sync.
+
+    Args:
+        service: Google Calendar service object (or any object exposing events().list)
+        calendar_id: Calendar to query
+        page_size: maxResults per request (API maximum is 2500)
+        **list_params: Extra events().list parameters (timeMin, timeMax, syncToken, ...)
+
+    Yields:
+        dict: One events().list response per page
+    """
+    page_token = None
+    while True:
+        events_result = service.events().list(
+            calendarId=calendar_id,
+            singleEvents=True,
+            maxResults=page_size,
+            pageToken=page_token,
+            **list_params
+        ).execute()
+
+        yield events_result
+
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            break
+
+def iter_calendar_events(service, time_min, time_max, calendar_id='primary', page_size=2500):
+    """
+    Yield Google Calendar events page by page, following nextPageToken.
+
+    Only one page is held in memory at a time, so busy calendars are neither
+    truncated at maxResults nor loaded in full before aggregation.
+
+    Args:
+        service: Google Calendar service object (or any object exposing events().list)
+        time_min: RFC3339 lower bound for event end times
+        time_max: RFC3339 upper bound for event start times
+        calendar_id: Calendar to query
+        page_size: maxResults per request (API maximum is 2500)
+
+    Yields:
+        dict: Individual Google Calendar event resources
+    """
+    for events_result in iter_calendar_event_pages(service, calendar_id, page_size,
+                                                   timeMin=time_min, timeMax=time_max,
+                                                   orderBy='startTime'):
+        yield from events_result.get('items', [])
+
 def adjust_overlapping_events(events):
     """Handle overlapping events within a single day."""
     sorted_events = sorted(events, key=lambda e: (e['start'], -e['duration']))
@@ -146,115 +209,390 @@ def calculate_event_hours(events, date):
     total_hours = sum(event['duration'] for event in adjusted_events)
     return total_hours
 
-async def fetch_chunk(session, headers, DATABASE_ID, chunk_start, chunk_end, semaphore):
-    """Fetch a chunk of tasks asynchronously with rate limiting."""
-    async with semaphore:
-        chunk_totals = {}
-        has_more = True
-        next_cursor = None
-        
-        while has_more:
-            payload = {
-                'filter': {
-                    'and': [
-                        {
-                            'property': 'Done?',
-                            'checkbox': {
-                                'equals': True
-                            }
-                        },
-                        {
-                            'property': 'Due Date',
-                            'date': {
-                                'on_or_after': chunk_start.isoformat(),
-                                'on_or_before': chunk_end.isoformat()
-                            }
+def normalize_event(event, tz):
+    """
+    Return an event's (start, end) in the given timezone, or None if it doesn't count.
+
+    Declined, all-day and questionable events are dropped, matching the rules in
+    calculate_event_hours.
+    """
+    if 'attendees' in event:
+        if any(attendee.get('self') and attendee.get('responseStatus') == 'declined'
+               for attendee in event['attendees']):
+            return None
+
+    start = event['start'].get('dateTime')
+    end = event['end'].get('dateTime')
+
+    if not start or not end:
+        return None
+
+    summary = event.get('summary', '').lower()
+    if any(word in summary for word in QUESTIONABLE_WORDS):
+        return None
+
+    start_time = datetime.datetime.fromisoformat(start.replace('Z', '+00:00')).astimezone(tz)
+    end_time = datetime.datetime.fromisoformat(end.replace('Z', '+00:00')).astimezone(tz)
+    return start_time, end_time
+
+def bucket_events_by_date(events):
+    """
+    Parse every event once and group its (start, end) interval by local start date.
+
+    Applies the same filters as calculate_event_hours (declined, all-day and
+    questionable events are dropped), but touches each event a single time.
+
+    Args:
+        events: Iterable of Google Calendar event dicts
+
+    Returns:
+        dict: date -> list of (start, end) datetimes in US/Central
+    """
+    central = pytz.timezone('US/Central')
+    buckets = {}
+
+    for event in events:
+        interval = normalize_event(event, central)
+        if interval:
+            buckets.setdefault(interval[0].date(), []).append(interval)
+
+    return buckets
+
+def sweep_event_hours(intervals):
+    """
+    Total hours covered by a day's intervals, counting overlapping time once.
+
+    Sort-and-sweep equivalent of adjust_overlapping_events: same ordering
+    (start, longest first) and same trimming rules, so the totals match.
+    """
+    total_hours = 0
+    last_end = None
+
+    for start, end in sorted(intervals, key=lambda interval: (interval[0], interval[0] - interval[1])):
+        if last_end and start < last_end:
+            if end <= last_end:
+                continue  # Skip completely overlapped events
+            start = last_end
+
+        total_hours += (end - start).total_seconds() / 3600
+        last_end = max(last_end, end) if last_end else end
+
+    return total_hours
+
+def calculate_daily_event_minutes(events, start_date, end_date):
+    """
+    Calculate de-duplicated calendar minutes for every day in a date range.
+
+    One parse pass buckets events by local date, then each bucket is swept
+    once, so the whole range costs roughly O(E log E) instead of O(days x events).
+
+    Args:
+        events: Iterable of Google Calendar event dicts
+        start_date: First date of the range (inclusive)
+        end_date: Last date of the range (inclusive)
+
+    Returns:
+        dict: Daily totals of calendar minutes, zero-filled for empty days
+    """
+    buckets = bucket_events_by_date(events)
+
+    daily_totals = {}
+    current_date = start_date
+    while current_date <= end_date:
+        daily_totals[current_date] = sweep_event_hours(buckets.get(current_date, [])) * 60  # Convert hours to minutes
+        current_date += datetime.timedelta(days=1)
+
+    return daily_totals
+
+class NotionRateController:
+    """
+    Adaptive concurrency and pacing for Notion requests.
+
+    Concurrency follows additive increase / multiplicative decrease: each fast
+    success raises the limit by 1/limit (about one slot per round of requests) and
+    a slow response shrinks it by a quarter. A 429 halves the limit, pauses every
+    request until Retry-After has passed and widens the minimum spacing between
+    request starts; that spacing then tightens slowly again on every success, so
+    the request rate settles just under the server's limit.
+    """
+    def __init__(self, initial=3, minimum=1, maximum=8, target_latency=1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.interval = 0.0  # Minimum seconds between request starts
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.next_start = 0.0
+        self.requests = 0
+        self.rate_limited = 0
+        self.started = None
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        if self.started is None:
+            self.started = time.perf_counter()
+        async with self.condition:
+            while self.in_flight >= int(self.limit):
+                await self.condition.wait()
+            self.in_flight += 1
+        now = time.perf_counter()
+        start_at = max(now, self.paused_until, self.next_start)
+        self.next_start = start_at + self.interval
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+        self.requests += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def record_success(self, latency):
+        """Grow the limit after a fast response, shrink it after a slow one."""
+        self.interval *= 0.9
+        if latency > self.target_latency:
+            self.limit = max(self.minimum, self.limit * 0.75)
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def record_rate_limit(self, retry_after):
+        """Halve the limit, widen request spacing and pause all requests for retry_after seconds."""
+        self.rate_limited += 1
+        if time.perf_counter() < self.paused_until:
+            return  # Already backing off for this burst of 429s
+        self.limit = max(self.minimum, self.limit / 2)
+        self.interval = max(self.interval * 1.25, 0.1)
+        self.paused_until = max(self.paused_until, time.perf_counter() + retry_after)
+
+    def requests_per_second(self):
+        """Achieved request rate since the first request."""
+        if self.started is None:
+            return 0.0
+        return self.requests / max(time.perf_counter() - self.started, 1e-9)
+
+class NotionChunkPlanner:
+    """
+    Hand out date chunks sized from the task density observed so far.
+
+    Chunks aim for about target_tasks results (one Notion page by default), so sparse
+    history is covered in a few wide requests and dense history in narrow ones.
+    """
+    def __init__(self, date_ranges, initial_days=30, target_tasks=100, min_days=1, max_days=120):
+        self.pending = list(date_ranges)
+        self.chunk_days = initial_days
+        self.target_tasks = target_tasks
+        self.min_days = min_days
+        self.max_days = max_days
+        self.density = None  # Tasks per day, smoothed
+
+    def next_chunk(self):
+        """Return the next (start, end) chunk, or None when every range is covered."""
+        if not self.pending:
+            return None
+        range_start, range_end = self.pending[0]
+        chunk_end = min(range_start + datetime.timedelta(days=self.chunk_days - 1), range_end)
+        if chunk_end == range_end:
+            self.pending.pop(0)
+        else:
+            self.pending[0] = (chunk_end + datetime.timedelta(days=1), range_end)
+        return range_start, chunk_end
+
+    def record(self, chunk_start, chunk_end, task_count):
+        """Update the density estimate and resize upcoming chunks."""
+        observed = task_count / ((chunk_end - chunk_start).days + 1)
+        self.density = observed if self.density is None else 0.5 * self.density + 0.5 * observed
+        ideal_days = self.target_tasks / self.density if self.density else self.max_days
+        self.chunk_days = int(min(self.max_days, max(self.min_days, ideal_days)))
+
+async def fetch_chunk(session, headers, DATABASE_ID, chunk_start, chunk_end, controller, task_columns,
+                      api_base=NOTION_API_BASE, retries=3, retry_delay=1.0, rate_limit_retries=10):
+    """
+    Fetch a chunk of tasks asynchronously, pacing every page through the rate controller.
+
+    Raw task id, due date string and time block of every result are appended to
+    task_columns; parsing and summing happen once for all chunks in aggregate_task_minutes.
+    Results are only added once every page of the chunk has arrived, so a failed chunk
+    contributes nothing rather than a partial count.
+
+    A page that fails with a network error or a 5xx is retried up to `retries` times,
+    waiting retry_delay seconds and doubling each time; other HTTP errors fail at once.
+    A page answered with 429 more than rate_limit_retries times in a row fails the chunk
+    too, so an endpoint that keeps rate limiting cannot hold a worker forever.
+
+    Returns:
+        int: Number of tasks returned for the chunk
+
+    Raises:
+        aiohttp.ClientError, asyncio.TimeoutError: The chunk could not be fetched
+    """
+    chunk_columns = {key: [] for key in task_columns}
+    task_count = 0
+    failures = 0
+    rate_limited = 0  # 429s in a row for the current page
+    has_more = True
+    next_cursor = None
+    
+    while has_more:
+        payload = {
+            'filter': {
+                'and': [
+                    {
+                        'property': 'Done?',
+                        'checkbox': {
+                            'equals': True
+                        }
+                    },
+                    {
+                        'property': 'Due Date',
+                        'date': {
+                            'on_or_after': chunk_start.isoformat(),
+                            'on_or_before': chunk_end.isoformat()
                         }
-                    ]
-                }
+                    }
+                ]
             }
-            
-            if next_cursor:
-                payload['start_cursor'] = next_cursor
-            
-            try:
+        }
+        
+        if next_cursor:
+            payload['start_cursor'] = next_cursor
+        
+        try:
+            async with controller:
+                request_start = time.perf_counter()
                 async with session.post(
-                    f"https://api.notion.com/v1/databases/{DATABASE_ID}/query",
+                    f"{api_base}/databases/{DATABASE_ID}/query",
                     json=payload,
                     headers=headers
                 ) as response:
                     if response.status == 429:
-                        retry_after = int(response.headers.get('Retry-After', 1))
-                        await asyncio.sleep(retry_after)
+                        rate_limited += 1
+                        if rate_limited > rate_limit_retries:
+                            response.raise_for_status()  # Out of 429 budget: fail the chunk
+                        controller.record_rate_limit(int(response.headers.get('Retry-After', 1)))
                         continue
                     
                     response.raise_for_status()
                     result = await response.json()
-                    
-                    for task in result.get('results', []):
-                        due_date_prop = task['properties'].get('Due Date', {}).get('date')
-                        if due_date_prop:
-                            try:
-                                # Handle both date-only and datetime values
-                                date_str = due_date_prop.get('start')
-                                if date_str:
-                                    # Parse as datetime first
-                                    try:
-                                        date = datetime.datetime.fromisoformat(
-                                            date_str.replace('Z', '+00:00')
-                                        ).date()
-                                    except ValueError:
-                                        # If that fails, try parsing as date
-                                        date = datetime.date.fromisoformat(date_str)
-                                    
-                                    time_block = task['properties'].get('Time Block (Min)', {}).get('number', 0)
-                                    if time_block:
-                                        chunk_totals[date] = chunk_totals.get(date, 0) + time_block
-                            except ValueError:
-                                continue
-                    
-                    has_more = result.get('has_more', False)
-                    next_cursor = result.get('next_cursor')
-                    
-                    if has_more:
-                        await asyncio.sleep(0.1)  # Small delay between pagination requests
-                    
-            except aiohttp.ClientError as e:
-                print(f"Error fetching data chunk")  
-                break
+                controller.record_success(time.perf_counter() - request_start)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            failures += 1
+            if failures > retries or (isinstance(e, aiohttp.ClientResponseError) and e.status < 500):
+                raise
+            await asyncio.sleep(retry_delay * 2 ** (failures - 1))
+            continue
+        
+        rate_limited = 0
+        task_count += len(result.get('results', []))
+        for task in result.get('results', []):
+            chunk_columns['task_id'].append(task['id'])
+            chunk_columns['date'].append((task['properties'].get('Due Date', {}).get('date') or {}).get('start'))
+            chunk_columns['minutes'].append(task['properties'].get('Time Block (Min)', {}).get('number'))
         
-        return chunk_totals
-
-async def fetch_all_chunks(headers, DATABASE_ID, date_chunks):
-    """Fetch all chunks concurrently with rate limiting."""
-    semaphore = asyncio.Semaphore(3)  # Limit to 3 concurrent requests
-    async with aiohttp.ClientSession() as session:
-        tasks = [
-            fetch_chunk(session, headers, DATABASE_ID, chunk_start, chunk_end, semaphore)
-            for chunk_start, chunk_end in date_chunks
-        ]
-        results = await asyncio.gather(*tasks)
+        has_more = result.get('has_more', False)
+        next_cursor = result.get('next_cursor')
     
-    daily_totals = {}
-    for chunk_totals in results:
-        daily_totals.update(chunk_totals)
+    for key, values in chunk_columns.items():
+        task_columns[key].extend(values)
+    return task_count
+
+def aggregate_task_minutes(task_columns):
+    """
+    Reduce raw (task_id, date, minutes) columns from every page into daily totals.
+
+    Dates are the calendar-date part of the Notion date (date-only or datetime), so
+    one vectorized slice-and-parse replaces per-task parsing. Tasks seen in more than
+    one chunk are counted once, and all remaining minutes are summed per date in a
+    single groupby.
+
+    Returns:
+        tuple: (dict of date -> minutes, list of (task_id, date, minutes) rows)
+    """
+    tasks = pd.DataFrame(task_columns, columns=['task_id', 'date', 'minutes'])
+    dates = tasks['date'].astype('string').str[:10]
+    tasks['date'] = pd.to_datetime(dates, format='%Y-%m-%d', errors='coerce').dt.date
+    tasks['minutes'] = pd.to_numeric(tasks['minutes'], errors='coerce')
+    tasks = tasks[tasks['date'].notna() & tasks['minutes'].notna() & (tasks['minutes'] != 0)]
+    tasks = tasks.drop_duplicates('task_id')
+
+    daily = tasks.groupby('date')['minutes'].sum()
+    daily_totals = dict(zip(daily.index, daily.tolist()))
+    task_rows = list(zip(tasks['task_id'], [date.isoformat() for date in tasks['date']], tasks['minutes'].tolist()))
+    return daily_totals, task_rows
+
+async def fetch_all_chunks(headers, DATABASE_ID, planner, task_rows=None, controller=None,
+                           api_base=NOTION_API_BASE, session=None, failed_ranges=None):
+    """
+    Fetch all chunks concurrently under an adaptive rate controller.
+
+    Workers pull chunks from the planner until it runs dry, so later chunks are
+    sized from the density seen in earlier ones. Prints the achieved request rate.
+    If task_rows is a list, a (task_id, date, minutes) row is appended for every
+    counted task so the caller can keep them in the raw_tasks table.
+    A chunk that still fails after fetch_chunk's retries is left out of the totals;
+    if failed_ranges is a list, its (start, end) is appended there so the caller
+    can leave those days unstored and fetch them again on the next run.
+    Pass a long-lived aiohttp session (e.g. the dashboard's shared pool) to reuse
+    its keep-alive connections; otherwise a session is opened for this run.
+    """
+    controller = controller or NotionRateController()
+    task_columns = {'task_id': [], 'date': [], 'minutes': []}
+    failed = []
+    
+    async def worker(session):
+        while (chunk := planner.next_chunk()) is not None:
+            try:
+                task_count = await fetch_chunk(
+                    session, headers, DATABASE_ID, chunk[0], chunk[1], controller, task_columns, api_base)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Notion: tasks from {chunk[0]} to {chunk[1]} could not be fetched ({e!r}), skipping them")
+                failed.append(chunk)
+                continue
+            planner.record(chunk[0], chunk[1], task_count)
+    
+    if session is not None:
+        await asyncio.gather(*(worker(session) for _ in range(controller.maximum)))
+    else:
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*(worker(session) for _ in range(controller.maximum)))
     
+    print(f"Notion: {controller.requests} requests, {controller.rate_limited} rate-limited, "
+          f"{controller.requests_per_second():.1f} req/s, final concurrency {int(controller.limit)}, "
+          f"{len(failed)} failed chunk(s)")
+    
+    daily_totals, rows = aggregate_task_minutes(task_columns)
+    if task_rows is not None:
+        task_rows.extend(rows)
+    if failed_ranges is not None:
+        failed_ranges.extend(sorted(failed))
     return daily_totals
 
-def fetch_local_completed_tasks_by_date_range(start_date, end_date):
-    """Fetch completed tasks for a date range and return daily totals."""
+def fetch_local_completed_tasks_by_date_range(start_date, end_date, task_rows=None):
+    """Fetch completed tasks for a date range and return daily totals (raw rows go to task_rows if given)."""
+    return fetch_local_completed_tasks_for_ranges([(start_date, end_date)], task_rows)
+
+def fetch_local_completed_tasks_for_ranges(date_ranges, task_rows=None, failed_ranges=None):
+    """
+    Fetch completed tasks for several disjoint date ranges in one concurrent run.
+
+    Args:
+        date_ranges: List of (start_date, end_date) tuples, both inclusive
+        task_rows: Optional list that receives a (task_id, date, minutes) row per task
+        failed_ranges: Optional list that receives the (start_date, end_date) of every
+            chunk that could not be fetched; those days are missing from the totals
+
+    Returns:
+        dict: Daily totals of Notion minutes
+    """
     headers, DATABASE_ID = get_notion_headers()
     
-    # Split the date range into smaller chunks for more efficient requests
-    date_chunks = []
-    current_date = start_date
-    while current_date < end_date:
-        chunk_end = min(current_date + datetime.timedelta(days=30), end_date)  # Reduced chunk size
-        date_chunks.append((current_date, chunk_end))
-        current_date = chunk_end + datetime.timedelta(days=1)
+    # Chunks are cut on demand, sized from the task density observed so far
+    planner = NotionChunkPlanner(date_ranges)
     
-    # Run the asynchronous fetching using asyncio.run
-    daily_totals = asyncio.run(fetch_all_chunks(headers, DATABASE_ID, date_chunks))
+    # Run the asynchronous fetching; every chunk of this run shares one pooled session
+    daily_totals = asyncio.run(fetch_all_chunks(headers, DATABASE_ID, planner, task_rows,
+                                                failed_ranges=failed_ranges))
     
     return daily_totals
 
@@ -269,16 +607,7 @@ def get_daily_summary(target_date):
     start_time = datetime.datetime.combine(target_date, datetime.time.min, tzinfo=central).astimezone(datetime.timezone.utc)
     end_time = datetime.datetime.combine(target_date, datetime.time.max, tzinfo=central).astimezone(datetime.timezone.utc)
     
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=start_time.isoformat(),
-        timeMax=end_time.isoformat(),
-        singleEvents=True,
-        orderBy='startTime',
-        maxResults=2500
-    ).execute()
-    
-    events = events_result.get('items', [])
+    events = iter_calendar_events(service, start_time.isoformat(), end_time.isoformat())
     calendar_hours = calculate_event_hours(events, target_date)
     calendar_minutes = int(calendar_hours * 60)
     
@@ -301,15 +630,20 @@ def convert_date(date_str):
 sqlite3.register_adapter(datetime.date, adapt_date)
 sqlite3.register_converter("DATE", convert_date)
 
-def setup_database():
-    """Setup SQLite database and tables."""
-    paths = get_config_paths()
-    db_path = paths['data_dir'] / 'dashboard_data.db'
-    paths['data_dir'].mkdir(parents=True, exist_ok=True)
+def setup_database(db_path=None):
+    """Setup SQLite database and tables (defaults to dashboard_data.db in the data dir)."""
+    if db_path is None:
+        paths = get_config_paths()
+        db_path = paths['data_dir'] / 'dashboard_data.db'
+        paths['data_dir'].mkdir(parents=True, exist_ok=True)
     
     conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
     cursor = conn.cursor()
     
+    # WAL lets readers run alongside a bulk write; NORMAL skips the per-commit fsync of the WAL
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS calendar_events (
             date DATE PRIMARY KEY,
@@ -324,6 +658,54 @@ def setup_database():
         )
     ''')
     
+    # Incremental calendar sync cursor
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            source TEXT PRIMARY KEY,
+            sync_token TEXT
+        )
+    ''')
+    
+    # Raw, normalized source records. calendar_events and notion_tasks are
+    # rebuilt from these locally, so rule changes need no API calls.
+    # summary_lower is folded with str.lower() (SQLite's lower() only folds ASCII), so the
+    # word filter in rebuild_calendar_totals matches the Python path for any summary
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS raw_events (
+            event_id TEXT PRIMARY KEY,
+            summary TEXT,
+            start_ts INTEGER,
+            end_ts INTEGER,
+            self_declined INTEGER,
+            summary_lower TEXT
+        )
+    ''')
+    
+    # Databases created before summary_lower: add and fill the column once
+    raw_event_columns = [row[1] for row in cursor.execute('PRAGMA table_info(raw_events)')]
+    if 'summary_lower' not in raw_event_columns:
+        conn.create_function('py_lower', 1, lambda text: text.lower() if text is not None else None, deterministic=True)
+        cursor.execute('ALTER TABLE raw_events ADD COLUMN summary_lower TEXT')
+        cursor.execute('UPDATE raw_events SET summary_lower = py_lower(summary)')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_raw_events_start_ts
+        ON raw_events (start_ts)
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS raw_tasks (
+            task_id TEXT PRIMARY KEY,
+            due_date DATE,
+            minutes FLOAT
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_raw_tasks_due_date
+        ON raw_tasks (due_date)
+    ''')
+    
     conn.commit()
     return conn
 
@@ -347,28 +729,296 @@ def get_stored_data(conn, start_date, end_date):
     
     return calendar_stored, notion_stored
 
+def store_daily_totals(conn, table, daily_totals):
+    """
+    Bulk-write daily totals with one executemany UPSERT inside a single transaction.
+
+    Dates are converted to ISO strings up front so the per-row adapt_date
+    adapter is never invoked.
+
+    Args:
+        conn: SQLite database connection
+        table: Daily table to write ('calendar_events' or 'notion_tasks')
+        daily_totals: dict of date -> minutes
+    """
+    rows = [(date.isoformat(), minutes) for date, minutes in daily_totals.items()]
+    with conn:
+        conn.executemany(f'''
+            INSERT INTO {table} (date, minutes)
+            VALUES (?, ?)
+            ON CONFLICT (date) DO UPDATE SET minutes = excluded.minutes
+        ''', rows)
+
 def store_calendar_data(conn, daily_totals):
     """Store calendar data in database."""
+    store_daily_totals(conn, 'calendar_events', daily_totals)
+
+def get_sync_token(conn, source):
+    """Return the stored API sync token for a source, or None."""
     cursor = conn.cursor()
-    for date, minutes in daily_totals.items():
-        cursor.execute('''
-            INSERT OR REPLACE INTO calendar_events (date, minutes)
-            VALUES (?, ?)
-        ''', (date.isoformat(), minutes))
+    cursor.execute('SELECT sync_token FROM sync_state WHERE source = ?', (source,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def store_sync_token(conn, source, sync_token):
+    """Persist the API sync token for a source."""
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO sync_state (source, sync_token)
+        VALUES (?, ?)
+    ''', (source, sync_token))
     conn.commit()
 
-def store_notion_data(conn, daily_totals):
-    """Store notion data in database."""
+def normalize_raw_event(event):
+    """
+    Flatten a Calendar event into a raw_events row, independent of any counting rule.
+
+    All-day events keep NULL timestamps. The summary is stored as is and lower-cased
+    with str.lower() for the word filter. Returns None for cancelled events.
+    """
+    if event.get('status') == 'cancelled':
+        return None
+
+    start = event.get('start', {}).get('dateTime')
+    end = event.get('end', {}).get('dateTime')
+    start_ts = end_ts = None
+    if start and end:
+        start_ts = int(datetime.datetime.fromisoformat(start.replace('Z', '+00:00')).timestamp())
+        end_ts = int(datetime.datetime.fromisoformat(end.replace('Z', '+00:00')).timestamp())
+
+    self_declined = any(attendee.get('self') and attendee.get('responseStatus') == 'declined'
+                        for attendee in event.get('attendees', []))
+
+    summary = event.get('summary', '')
+    return (event['id'], summary, start_ts, end_ts, int(self_declined), summary.lower())
+
+def local_date_from_timestamp(timestamp, tz_name):
+    """Local calendar date (ISO string) of a Unix timestamp; registered as a SQLite function."""
+    return datetime.datetime.fromtimestamp(timestamp, pytz.timezone(tz_name)).date().isoformat()
+
+def apply_calendar_changes(conn, events):
+    """
+    Apply a batch of changed Calendar events to raw_events.
+
+    Cancelled events are removed; everything else is upserted as a raw row. The
+    previous start times come from one lookup for the whole batch, and the writes
+    are one executemany UPSERT plus one executemany DELETE, as in store_daily_totals.
+
+    Args:
+        conn: SQLite database connection
+        events: Iterable of Google Calendar event dicts from a list/sync response
+
+    Returns:
+        set: Local dates whose totals may have changed (old and new date of each event)
+    """
+    latest = {event['id']: event for event in events}  # Last change wins if an event repeats
+    if not latest:
+        return set()
+
     cursor = conn.cursor()
-    for date, minutes in daily_totals.items():
-        cursor.execute('''
-            INSERT OR REPLACE INTO notion_tasks (date, minutes)
-            VALUES (?, ?)
-        ''', (date.isoformat(), minutes))
+    cursor.execute('''
+        SELECT start_ts FROM raw_events
+        WHERE event_id IN (SELECT value FROM json_each(?)) AND start_ts IS NOT NULL
+    ''', (json.dumps(list(latest)),))
+    start_timestamps = [row[0] for row in cursor.fetchall()]
+
+    upserts, deletes = [], []
+    for event_id, event in latest.items():
+        raw_event = normalize_raw_event(event)
+        if raw_event:
+            upserts.append(raw_event)
+            if raw_event[2] is not None:
+                start_timestamps.append(raw_event[2])
+        else:
+            deletes.append((event_id,))
+
+    cursor.executemany('''
+        INSERT INTO raw_events (event_id, summary, start_ts, end_ts, self_declined, summary_lower)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (event_id) DO UPDATE SET
+            summary = excluded.summary, start_ts = excluded.start_ts,
+            end_ts = excluded.end_ts, self_declined = excluded.self_declined,
+            summary_lower = excluded.summary_lower
+    ''', upserts)
+    cursor.executemany('DELETE FROM raw_events WHERE event_id = ?', deletes)
+
+    return {datetime.date.fromisoformat(local_date_from_timestamp(timestamp, TIMEZONE))
+            for timestamp in start_timestamps}
+
+def rebuild_calendar_totals(conn, start_date, end_date, tz_name=TIMEZONE,
+                            questionable_words=QUESTIONABLE_WORDS, skip_declined=True):
+    """
+    Rebuild calendar_events for a date range from raw_events in one SQL pass.
+
+    A window function carries the running max end time per day, which gives the
+    same de-duplicated totals as sweep_event_hours. Every day in the range is
+    written, zero-filled when it has no events.
+
+    Args:
+        conn: SQLite database connection
+        start_date: First date to rebuild (inclusive)
+        end_date: Last date to rebuild (inclusive)
+        tz_name: Timezone that defines day boundaries
+        questionable_words: Summary substrings that exclude an event
+        skip_declined: Exclude events the calendar owner declined
+
+    Returns:
+        dict: Rebuilt daily totals of calendar minutes
+    """
+    conn.create_function('local_date', 2, local_date_from_timestamp, deterministic=True)
+    word_filter = ''.join(' AND instr(summary_lower, ?) = 0' for _ in questionable_words)
+
+    # Pad the timestamp window by a day each side; the exact cut is on local date
+    window_start = datetime.datetime.combine(start_date - datetime.timedelta(days=1), datetime.time.min,
+                                             tzinfo=datetime.timezone.utc).timestamp()
+    window_end = datetime.datetime.combine(end_date + datetime.timedelta(days=2), datetime.time.min,
+                                           tzinfo=datetime.timezone.utc).timestamp()
+
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        INSERT OR REPLACE INTO calendar_events (date, minutes)
+        WITH RECURSIVE days(date) AS (
+            SELECT ?
+            UNION ALL
+            SELECT date(date, '+1 day') FROM days WHERE date < ?
+        ),
+        counted AS (
+            SELECT local_date(start_ts, ?) AS date, start_ts, end_ts
+            FROM raw_events
+            WHERE start_ts IS NOT NULL AND end_ts IS NOT NULL
+              AND start_ts >= ? AND start_ts < ?
+              AND NOT (? AND self_declined){word_filter}
+        ),
+        swept AS (
+            SELECT date, start_ts, end_ts,
+                   MAX(end_ts) OVER (
+                       PARTITION BY date ORDER BY start_ts, end_ts DESC
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                   ) AS prev_end
+            FROM counted
+        ),
+        totals AS (
+            SELECT date,
+                   SUM(CASE
+                           WHEN prev_end IS NULL OR start_ts >= prev_end THEN end_ts - start_ts
+                           WHEN end_ts > prev_end THEN end_ts - prev_end
+                           ELSE 0
+                       END) / 60.0 AS minutes
+            FROM swept
+            GROUP BY date
+        )
+        SELECT days.date, COALESCE(totals.minutes, 0)
+        FROM days LEFT JOIN totals ON totals.date = days.date
+    ''', (start_date.isoformat(), end_date.isoformat(), tz_name, window_start, window_end,
+          int(skip_declined), *[word.lower() for word in questionable_words]))
+    conn.commit()
+
+    cursor.execute('''
+        SELECT date, minutes FROM calendar_events
+        WHERE date BETWEEN ? AND ?
+    ''', (start_date, end_date))
+    return {date: minutes for date, minutes in cursor.fetchall()}
+
+def store_raw_tasks(conn, task_rows, start_date, end_date):
+    """Replace raw_tasks for a fetched date range with the tasks returned for it."""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM raw_tasks WHERE due_date BETWEEN ? AND ?', (start_date, end_date))
+    cursor.executemany('''
+        INSERT OR REPLACE INTO raw_tasks (task_id, due_date, minutes)
+        VALUES (?, ?, ?)
+    ''', task_rows)
+    conn.commit()
+
+def rebuild_notion_totals(conn, start_date, end_date):
+    """
+    Rebuild notion_tasks for a date range from raw_tasks in one SQL pass.
+
+    Days without tasks are stored as zero so they count as fetched.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO notion_tasks (date, minutes)
+        WITH RECURSIVE days(date) AS (
+            SELECT ?
+            UNION ALL
+            SELECT date(date, '+1 day') FROM days WHERE date < ?
+        ),
+        totals AS (
+            SELECT due_date, SUM(minutes) AS minutes FROM raw_tasks
+            WHERE due_date BETWEEN ? AND ?
+            GROUP BY due_date
+        )
+        SELECT days.date, COALESCE(totals.minutes, 0)
+        FROM days LEFT JOIN totals ON totals.due_date = days.date
+    ''', (start_date.isoformat(), end_date.isoformat(), start_date, end_date))
     conn.commit()
 
+    cursor.execute('''
+        SELECT date, minutes FROM notion_tasks
+        WHERE date BETWEEN ? AND ?
+    ''', (start_date, end_date))
+    return {date: minutes for date, minutes in cursor.fetchall()}
+
+def rebuild_daily_totals(conn, start_date, end_date, **calendar_rules):
+    """
+    Re-aggregate both daily tables from the raw stores, with no API calls.
+
+    Use after changing QUESTIONABLE_WORDS, the timezone or the declined rule;
+    calendar_rules are passed through to rebuild_calendar_totals.
+    """
+    calendar_stored = rebuild_calendar_totals(conn, start_date, end_date, **calendar_rules)
+    notion_stored = rebuild_notion_totals(conn, start_date, end_date)
+    return calendar_stored, notion_stored
+
+def collapse_date_gaps(dates):
+    """
+    Collapse dates into sorted (start, end) runs of consecutive days.
+
+    Example: Jan 1, Jan 2, Jan 3, Jan 9 -> [(Jan 1, Jan 3), (Jan 9, Jan 9)]
+    """
+    gaps = []
+    for date in sorted(set(dates)):
+        if gaps and date == gaps[-1][1] + datetime.timedelta(days=1):
+            gaps[-1] = (gaps[-1][0], date)
+        else:
+            gaps.append((date, date))
+    return gaps
+
+def store_notion_gaps(conn, notion_gaps, task_rows, failed_ranges=()):
+    """
+    Store the raw tasks fetched for each Notion gap and rebuild its daily totals.
+
+    Days inside a failed range are skipped: they stay missing from notion_tasks and
+    are fetched again on the next run, instead of being stored as zero minutes.
+
+    Args:
+        conn: SQLite database connection
+        notion_gaps: List of (start_date, end_date) ranges that were fetched
+        task_rows: (task_id, date, minutes) rows returned for those ranges
+        failed_ranges: (start_date, end_date) chunks that could not be fetched
+
+    Returns:
+        dict: Rebuilt daily totals of Notion minutes for the stored days
+    """
+    failed_dates = {failed_start + datetime.timedelta(days=x)
+                    for failed_start, failed_end in failed_ranges
+                    for x in range((failed_end - failed_start).days + 1)}
+    # Sort the rows by date once; each run's rows are then one bisected slice
+    task_rows = sorted(task_rows, key=lambda row: row[1])
+    row_dates = [row[1] for row in task_rows]
+    notion_stored = {}
+    for gap_start, gap_end in notion_gaps:
+        gap_dates = (gap_start + datetime.timedelta(days=x) for x in range((gap_end - gap_start).days + 1))
+        for run_start, run_end in collapse_date_gaps(date for date in gap_dates if date not in failed_dates):
+            run_rows = task_rows[bisect.bisect_left(row_dates, run_start.isoformat()):
+                                 bisect.bisect_right(row_dates, run_end.isoformat())]
+            store_raw_tasks(conn, run_rows, run_start, run_end)
+            notion_stored.update(rebuild_notion_totals(conn, run_start, run_end))
+    return notion_stored
+
 # Break down main() into smaller functions
-def fetch_and_process_data(start_date: datetime.date, end_date: datetime.date, conn: sqlite3.Connection):
+def fetch_and_process_data(start_date: datetime.date, end_date: datetime.date, conn: sqlite3.Connection,
+                           incremental: bool = True):
     """
     Fetch and process both calendar and notion data for the given date range.
     
@@ -376,40 +1026,42 @@ def fetch_and_process_data(start_date: datetime.date, end_date: datetime.date, c
         start_date: Start date for data collection
         end_date: End date for data collection
         conn: SQLite database connection
+        incremental: Use Calendar sync tokens so edits to older events are picked up
         
     Returns:
         tuple: Calendar data and Notion data dictionaries
     """
     calendar_stored, notion_stored = get_stored_data(conn, start_date, end_date)
     
-    # Fetch calendar data
+    # Only the missing days are fetched, grouped into contiguous gaps
+    all_dates = [start_date + datetime.timedelta(days=x) for x in range((end_date - start_date).days + 1)]
+    calendar_missing = [date for date in all_dates if date not in calendar_stored]
+    notion_gaps = collapse_date_gaps(date for date in all_dates if date not in notion_stored)
+    
     service = get_calendar_service()
-    dates_to_fetch = [
-        date for date in (start_date + datetime.timedelta(days=x) 
-        for x in range((end_date - start_date).days + 1)) 
-        if date not in calendar_stored
-    ]
-    
-    if dates_to_fetch:
-        calendar_fetch_start = min(dates_to_fetch)
-        if calendar_fetch_start <= end_date:
-            new_calendar_totals = fetch_calendar_data(service, calendar_fetch_start, end_date)
+    task_rows = []
+    failed_ranges = []
+    
+    # Notion and the Calendar gap fetches run side by side on worker threads; the DB connection
+    # stays on this thread, so the incremental sync (which writes raw_events) runs here
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        notion_future = executor.submit(fetch_local_completed_tasks_for_ranges, notion_gaps, task_rows,
+                                        failed_ranges) if notion_gaps else None
+        
+        if incremental:
+            # Rebuilt totals are written to calendar_events by the sync itself
+            calendar_stored.update(sync_calendar_data(service, conn, start_date, end_date, calendar_missing))
+        elif calendar_missing:
+            new_calendar_totals = executor.submit(fetch_calendar_gaps, service,
+                                                  collapse_date_gaps(calendar_missing)).result()
             store_calendar_data(conn, new_calendar_totals)
             calendar_stored.update(new_calendar_totals)
+        
+        if notion_future:
+            notion_future.result()
     
-    # Fetch Notion data
-    dates_to_fetch = [
-        date for date in (start_date + datetime.timedelta(days=x) 
-        for x in range((end_date - start_date).days + 1)) 
-        if date not in notion_stored
-    ]
-    
-    if dates_to_fetch:
-        notion_fetch_start = min(dates_to_fetch)
-        if notion_fetch_start <= end_date:
-            new_notion_totals = fetch_local_completed_tasks_by_date_range(notion_fetch_start, end_date)
-            store_notion_data(conn, new_notion_totals)
-            notion_stored.update(new_notion_totals)
+    # Days in failed chunks are left unstored, so the next run fetches them again
+    notion_stored.update(store_notion_gaps(conn, notion_gaps, task_rows, failed_ranges))
             
     return calendar_stored, notion_stored
 
@@ -509,26 +1161,81 @@ def fetch_calendar_data(service, start_date, end_date):
     start_utc = pytz.timezone('US/Central').localize(start_datetime).astimezone(datetime.timezone.utc)
     end_utc = pytz.timezone('US/Central').localize(end_datetime).astimezone(datetime.timezone.utc)
     
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=start_utc.isoformat(),
-        timeMax=end_utc.isoformat(),
-        singleEvents=True,
-        orderBy='startTime',
-        maxResults=2500
-    ).execute()
-    
-    events = events_result.get('items', [])
-    
-    # Process events into daily totals
+    # Stream events page by page into a single parse-and-sweep pass
+    events = iter_calendar_events(service, start_utc.isoformat(), end_utc.isoformat())
+    return calculate_daily_event_minutes(events, start_date, end_date)
+
+def fetch_calendar_gaps(service, gaps):
+    """
+    Fetch calendar totals for several (start_date, end_date) gaps, one after another.
+
+    The gaps share one service object, which is not thread-safe, so they are not
+    fetched concurrently with each other; the whole call runs beside the Notion fetch.
+
+    Returns:
+        dict: Daily totals of calendar minutes for every day of the gaps
+    """
     daily_totals = {}
-    current_date = start_date
-    while current_date <= end_date:
-        daily_totals[current_date] = calculate_event_hours(events, current_date) * 60  # Convert hours to minutes
-        current_date += datetime.timedelta(days=1)
-    
+    for gap_start, gap_end in gaps:
+        daily_totals.update(fetch_calendar_data(service, gap_start, gap_end))
     return daily_totals
 
+def sync_calendar_data(service, conn, start_date, end_date, missing_dates=()):
+    """
+    Bring calendar totals up to date using the Calendar API sync token.
+
+    The first run (or a run after the token expires) does one full listing from
+    start_date onward, including future events, into raw_events and saves
+    nextSyncToken. Later runs send only that token, apply just the events changed
+    since, and rebuild the days those changes touch plus any days not yet stored.
+    Steady-state runs therefore cost a single API call.
+
+    Args:
+        service: Google Calendar service object
+        conn: SQLite database connection
+        start_date: Start date of the tracked range
+        end_date: End date of the tracked range
+        missing_dates: Dates in range with no stored total yet
+
+    Returns:
+        dict: Recomputed daily totals of calendar minutes
+    """
+    sync_token = get_sync_token(conn, 'calendar')
+    if sync_token and not conn.execute('SELECT 1 FROM raw_events LIMIT 1').fetchone():
+        sync_token = None  # Raw store is empty, so the cursor can't be trusted
+    dates_to_compute = set(missing_dates)
+    next_sync_token = None
+
+    try:
+        if sync_token:
+            for events_result in iter_calendar_event_pages(service, syncToken=sync_token):
+                dates_to_compute |= apply_calendar_changes(conn, events_result.get('items', []))
+                next_sync_token = events_result.get('nextSyncToken', next_sync_token)
+    except HttpError as e:
+        if e.resp.status != 410:
+            raise
+        print("Calendar sync token expired, running a full sync")
+        sync_token = None
+
+    if not sync_token:
+        conn.execute('DELETE FROM raw_events')
+        start_datetime = datetime.datetime.combine(start_date, datetime.time.min)
+        start_utc = pytz.timezone('US/Central').localize(start_datetime).astimezone(datetime.timezone.utc)
+        for events_result in iter_calendar_event_pages(service, timeMin=start_utc.isoformat()):
+            apply_calendar_changes(conn, events_result.get('items', []))
+            next_sync_token = events_result.get('nextSyncToken', next_sync_token)
+        dates_to_compute = {start_date + datetime.timedelta(days=x)
+                            for x in range((end_date - start_date).days + 1)}
+
+    conn.commit()
+    if next_sync_token:
+        store_sync_token(conn, 'calendar', next_sync_token)
+
+    dates_to_compute = {date for date in dates_to_compute if start_date <= date <= end_date}
+    if not dates_to_compute:
+        return {}
+    return rebuild_calendar_totals(conn, min(dates_to_compute), max(dates_to_compute))
+
 def prepare_visualization_data(start_date, end_date, calendar_stored, notion_stored):
     """
     Prepare data for visualization by aligning calendar and notion data.
@@ -611,6 +1318,170 @@ def get_notion_headers():
         'Content-Type': 'application/json'
     }, notion_database_id
 
+def make_synthetic_events(num_events, start_date, end_date, seed=0):
+    """Generate random timed Calendar events (with overlaps) for benchmarking."""
+    rng = random.Random(seed)
+    central = pytz.timezone('US/Central')
+    span_minutes = ((end_date - start_date).days + 1) * 24 * 60
+    range_start = central.localize(datetime.datetime.combine(start_date, datetime.time.min))
+
+    events = []
+    for i in range(num_events):
+        start = range_start + datetime.timedelta(minutes=rng.randrange(span_minutes))
+        end = start + datetime.timedelta(minutes=rng.choice([15, 30, 45, 60, 90, 120]))
+        events.append({
+            'summary': rng.choice(['Focus block', 'Meeting', 'Gym', 'Call tbd', 'Lunch']),
+            'start': {'dateTime': start.astimezone(datetime.timezone.utc).isoformat().replace('+00:00', 'Z')},
+            'end': {'dateTime': end.astimezone(datetime.timezone.utc).isoformat()},
+        })
+    return events
+
+def benchmark_event_minutes(num_events=50000, num_days=730, sample_days=10):
+    """
+    Compare the per-day calculate_event_hours loop against calculate_daily_event_minutes.
+
+    The per-day loop is O(days x events), so it is timed on a sample of days and
+    extrapolated to the full range; the sampled days are also checked for equality.
+    """
+    start_date = START_DATE
+    end_date = start_date + datetime.timedelta(days=num_days - 1)
+    events = make_synthetic_events(num_events, start_date, end_date)
+
+    t0 = time.perf_counter()
+    daily_totals = calculate_daily_event_minutes(events, start_date, end_date)
+    sweep_seconds = time.perf_counter() - t0
+
+    sample = random.Random(1).sample(sorted(daily_totals), min(sample_days, num_days))
+    t0 = time.perf_counter()
+    for date in sample:
+        legacy_minutes = calculate_event_hours(events, date) * 60
+        if legacy_minutes != daily_totals[date]:
+            raise AssertionError(f"Mismatch on {date}: {legacy_minutes} != {daily_totals[date]}")
+    legacy_seconds = (time.perf_counter() - t0) / len(sample) * num_days
+
+    print(f"{num_events} events over {num_days} days")
+    print(f"Per-day loop (estimated from {len(sample)} days): {legacy_seconds:.2f}s")
+    print(f"Bucket + sweep: {sweep_seconds:.2f}s  ({legacy_seconds / sweep_seconds:.0f}x faster)")
+
+def benchmark_daily_writes(years=10):
+    """
+    Compare the old per-row INSERT OR REPLACE loop against store_daily_totals.
+
+    Each variant writes `years` of daily rows into a fresh database file: the old
+    loop on a default-journal connection, the new path on a setup_database one.
+    """
+    num_days = years * 365
+    daily_totals = {START_DATE + datetime.timedelta(days=x): float(x % 600) for x in range(num_days)}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = sqlite3.connect(Path(tmp_dir) / 'per_row.db', detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.execute('CREATE TABLE calendar_events (date DATE PRIMARY KEY, minutes FLOAT)')
+        t0 = time.perf_counter()
+        cursor = conn.cursor()
+        for date, minutes in daily_totals.items():
+            cursor.execute('''
+                INSERT OR REPLACE INTO calendar_events (date, minutes)
+                VALUES (?, ?)
+            ''', (date, minutes))
+        conn.commit()
+        per_row_seconds = time.perf_counter() - t0
+        conn.close()
+
+        conn = setup_database(Path(tmp_dir) / 'batched.db')
+        t0 = time.perf_counter()
+        store_calendar_data(conn, daily_totals)
+        batched_seconds = time.perf_counter() - t0
+        conn.close()
+
+    print(f"{num_days} daily rows ({years} years)")
+    print(f"Per-row INSERT OR REPLACE: {per_row_seconds * 1000:.1f}ms")
+    print(f"executemany UPSERT (WAL): {batched_seconds * 1000:.1f}ms  ({per_row_seconds / batched_seconds:.1f}x faster)")
+
+def make_notion_stub_app(tasks, rate=3.0, burst=10, base_latency=0.2):
+    """
+    Local aiohttp app that mimics Notion's database query endpoint for benchmarking.
+
+    Serves `tasks` (Notion page dicts) filtered by the Due Date range in 100-result
+    pages, adds latency that grows with load, and answers 429 with Retry-After once
+    a token bucket of `rate` requests/second (with `burst` capacity) runs dry.
+    """
+    bucket = {'tokens': float(burst), 'updated': time.perf_counter(), 'in_flight': 0}
+
+    async def query(request):
+        now = time.perf_counter()
+        bucket['tokens'] = min(burst, bucket['tokens'] + (now - bucket['updated']) * rate)
+        bucket['updated'] = now
+        if bucket['tokens'] < 1:
+            return web.json_response({'object': 'error', 'code': 'rate_limited'}, status=429,
+                                     headers={'Retry-After': '1'})
+        bucket['tokens'] -= 1
+
+        bucket['in_flight'] += 1
+        try:
+            await asyncio.sleep(base_latency * (1 + 0.1 * bucket['in_flight']))
+        finally:
+            bucket['in_flight'] -= 1
+
+        payload = await request.json()
+        date_filter = payload['filter']['and'][1]['date']
+        matches = [task for task in tasks
+                   if date_filter['on_or_after'] <= task['properties']['Due Date']['date']['start'] <= date_filter['on_or_before']]
+        offset = int(payload.get('start_cursor', 0))
+        page = matches[offset:offset + 100]
+        has_more = offset + 100 < len(matches)
+        return web.json_response({'results': page, 'has_more': has_more,
+                                  'next_cursor': str(offset + 100) if has_more else None})
+
+    app = web.Application()
+    app.router.add_post('/databases/{database_id}/query', query)
+    return app
+
+def benchmark_notion_fetch(num_days=730, seed=0):
+    """
+    Compare fixed 31-day chunks at concurrency 3 against the adaptive scheduler.
+
+    Both run against make_notion_stub_app on localhost. The synthetic history gets
+    denser over time, which is the case fixed chunk sizes handle worst.
+    """
+    rng = random.Random(seed)
+    start_date = START_DATE
+    end_date = start_date + datetime.timedelta(days=num_days - 1)
+    tasks = []
+    for x in range(num_days):
+        date = start_date + datetime.timedelta(days=x)
+        # Sparse first year (about one task every few days), busier second year
+        for _ in range(rng.choice([0, 0, 0, 1]) if x < num_days // 2 else rng.randint(0, 6)):
+            tasks.append({'id': f'task-{len(tasks)}', 'properties': {
+                'Due Date': {'date': {'start': date.isoformat()}},
+                'Time Block (Min)': {'number': rng.choice([15, 30, 45, 60])}
+            }})
+    expected = {}
+    for task in tasks:
+        date = datetime.date.fromisoformat(task['properties']['Due Date']['date']['start'])
+        expected[date] = expected.get(date, 0) + task['properties']['Time Block (Min)']['number']
+
+    async def run(name, planner, controller):
+        # Fresh stub per variant so each starts with a full rate-limit bucket
+        runner = web.AppRunner(make_notion_stub_app(tasks))
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        api_base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        try:
+            print(name)
+            t0 = time.perf_counter()
+            daily_totals = await fetch_all_chunks({}, 'benchmark', planner, controller=controller,
+                                                  api_base=api_base)
+            print(f"  {time.perf_counter() - t0:.2f}s, totals match: {daily_totals == expected}")
+        finally:
+            await runner.cleanup()
+
+    print(f"{len(tasks)} tasks over {num_days} days")
+    asyncio.run(run('Fixed (31-day chunks, 3 concurrent)',
+                    NotionChunkPlanner([(start_date, end_date)], initial_days=31, min_days=31, max_days=31),
+                    NotionRateController(initial=3, minimum=3, maximum=3)))
+    asyncio.run(run('Adaptive', NotionChunkPlanner([(start_date, end_date)]), NotionRateController()))
+
 def main():
     """Main execution function."""
     local_tz = datetime.datetime.now().astimezone().tzinfo  # Use system timezone
@@ -634,5 +1505,10 @@ def main():
         conn.close()
 
 if __name__ == '__main__':
-    fig = main()
-    fig.show()  # Only show if run directly
+    if '--benchmark' in sys.argv:
+        benchmark_event_minutes()
+        benchmark_daily_writes()
+        benchmark_notion_fetch()
+    else:
+        fig = main()
+        fig.show()  # Only show if run directly
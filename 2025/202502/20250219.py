@@ -1,16 +1,54 @@
 # photos_dropbox_get_standalone.py
 #initial version by Claude 3.5 Sonnet
-import dropbox
 import random
 import tempfile
 from PIL import Image
 import os
+from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import plotly.graph_objects as go
 from io import BytesIO
 import json
 import plotly.io as pio
 import time
 
+class DropboxHttpClient:
+    """
+    The few Dropbox API v2 calls this script needs, over one pooled requests session.
+
+    Requests reuse its keep-alive connections and one retry/backoff policy (connection errors,
+    429 and 5xx, honouring Retry-After). Responses are the API's JSON dicts.
+    """
+    API_URL = "https://api.dropboxapi.com/2"
+    CONTENT_URL = "https://content.dropboxapi.com/2"
+
+    def __init__(self, access_token, session=None):
+        self.headers = {"Authorization": f"Bearer {access_token}"}
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(max_retries=Retry(
+                total=5, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=None)))
+        self.session = session
+
+    def post(self, url, **kwargs):
+        response = self.session.post(url, headers={**self.headers, **kwargs.pop("headers", {})}, timeout=30, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def files_list_folder(self, path, limit=100):
+        return self.post(f"{self.API_URL}/files/list_folder", json={"path": path, "limit": limit}).json()
+
+    def files_list_folder_continue(self, cursor):
+        return self.post(f"{self.API_URL}/files/list_folder/continue", json={"cursor": cursor}).json()
+
+    def files_download(self, path):
+        """Return (file metadata dict, file bytes); the metadata comes back with the download."""
+        response = self.post(f"{self.CONTENT_URL}/files/download",
+                             headers={"Dropbox-API-Arg": json.dumps({"path": path})})
+        return json.loads(response.headers["Dropbox-API-Result"]), response.content
+
 def get_all_photos_recursive(dbx, path, max_files=80, timeout_seconds=30):
     """
     Recursively get all photo files from Dropbox folder and subfolders
@@ -39,37 +77,37 @@ def get_all_photos_recursive(dbx, path, max_files=80, timeout_seconds=30):
         files_processed = 0
         
         while True:
-            for entry in result.entries:
+            for entry in result['entries']:
                 # Check timeout
                 if time.time() - start_time > timeout_seconds:
                     print(f"Timeout after {timeout_seconds} seconds")
                     return image_files
 
                 files_processed += 1
-                print(f"Processing file {files_processed}: {entry.path_display}")
+                print(f"Processing file {files_processed}: {entry['path_display']}")
                 
                 # Check file limit
                 if files_processed >= max_files:
                     print(f"Reached maximum file limit of {max_files}")
                     return image_files
                 
-                if isinstance(entry, dropbox.files.FileMetadata):
-                    if any(entry.path_lower.endswith(ext) for ext in photo_extensions):
-                        image_files.append(entry.path_display)
-                        print(f"Found image ({len(image_files)}): {entry.path_display}")
+                if entry['.tag'] == 'file':
+                    if any(entry['path_lower'].endswith(ext) for ext in photo_extensions):
+                        image_files.append(entry['path_display'])
+                        print(f"Found image ({len(image_files)}): {entry['path_display']}")
                 
                 # Only process immediate files, skip subfolders for now
-                # elif isinstance(entry, dropbox.files.FolderMetadata):
+                # elif entry['.tag'] == 'folder':
                 #     subfolder_files = get_all_photos_recursive(
-                #         dbx, entry.path_display, 
+                #         dbx, entry['path_display'], 
                 #         max_files - files_processed,
                 #         timeout_seconds - (time.time() - start_time)
                 #     )
                 #     image_files.extend(subfolder_files)
             
-            if result.has_more:
+            if result['has_more']:
                 print("Loading more files...")
-                result = dbx.files_list_folder_continue(result.cursor)
+                result = dbx.files_list_folder_continue(result['cursor'])
             else:
                 break
                 
@@ -78,10 +116,8 @@ def get_all_photos_recursive(dbx, path, max_files=80, timeout_seconds=30):
                 print(f"Timeout after {timeout_seconds} seconds")
                 return image_files
                 
-    except dropbox.exceptions.ApiError as e:
+    except requests.HTTPError as e:
         print(f"Dropbox API Error: {e}")
-        if hasattr(e, 'error') and hasattr(e.error, 'is_path'):
-            print(f"Path error details: {e.error}")
     except Exception as e:
         print(f"Error accessing path {path}: {e}")
         
@@ -92,7 +128,7 @@ def get_dropbox_client():
     """Initialize Dropbox client with automatic token refresh"""
     # This is a placeholder function. In a real application, you would need to implement
     # proper authentication and token management.
-    return dropbox.Dropbox("mock_access_token")
+    return DropboxHttpClient("mock_access_token")
 
 def display_random_photo(folder_path="/Photos"):
     """
@@ -131,8 +167,7 @@ def display_random_photo(folder_path="/Photos"):
             print(f"Processing image {idx+1}/{len(random_images)}: {image_path}")
             
             # Download the file to memory
-            _, response = dbx.files_download(image_path)
-            image_data = response.content
+            file_metadata, image_data = dbx.files_download(image_path)
             
             # Open image using PIL
             img = Image.open(BytesIO(image_data))
@@ -141,10 +176,9 @@ def display_random_photo(folder_path="/Photos"):
             if img.mode != 'RGB':
                 img = img.convert('RGB')
             
-            # Get file metadata for dates
-            file_metadata = dbx.files_get_metadata(image_path)
-            created_date = file_metadata.client_modified.strftime("%Y-%m-%d %H:%M:%S")
-            modified_date = file_metadata.server_modified.strftime("%Y-%m-%d %H:%M:%S")
+            # Dates from the metadata returned with the download
+            created_date = datetime.strptime(file_metadata['client_modified'], "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S")
+            modified_date = datetime.strptime(file_metadata['server_modified'], "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S")
             
             # Add image to figure with domain coordinates
             row, col = positions[idx]
@@ -212,8 +246,11 @@ def display_random_photo(folder_path="/Photos"):
         if time.time() - start_time > 30:  # 30 seconds timeout
             print("Warning: Image processing took longer than expected. Consider optimizing the code.")
 
-    except dropbox.exceptions.AuthError:
-        print("Authentication failed. Please check your access token.")
+    except requests.HTTPError as e:
+        if e.response.status_code == 401:
+            print("Authentication failed. Please check your access token.")
+        else:
+            print(f"An error occurred: {str(e)}")
     except Exception as e:
         print(f"An error occurred: {str(e)}")
 
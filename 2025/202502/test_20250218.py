@@ -0,0 +1,364 @@
+#Tests for 20250218.py (Calendar/Notion time totals) against in-memory fake services.
+#Run with: python -m pytest 2025/202502
+import asyncio
+import datetime
+import importlib.util
+import sqlite3
+import threading
+from pathlib import Path
+
+import aiohttp
+import httplib2
+import pytest
+from aiohttp import web
+from googleapiclient.errors import HttpError
+
+spec = importlib.util.spec_from_file_location('time_totals', Path(__file__).with_name('20250218.py'))
+time_totals = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(time_totals)
+
+START = datetime.date(2024, 3, 4)
+END = datetime.date(2024, 3, 8)
+
+def make_event(event_id, day, hour, minutes, summary='Focus block', **extra):
+    # US/Central is UTC-6 in early March, so 15:00Z is 9:00 local on the same date
+    start = datetime.datetime.combine(day, datetime.time(hour), tzinfo=datetime.timezone.utc)
+    end = start + datetime.timedelta(minutes=minutes)
+    return {'id': event_id, 'summary': summary, 'start': {'dateTime': start.isoformat().replace('+00:00', 'Z')},
+            'end': {'dateTime': end.isoformat().replace('+00:00', 'Z')}, **extra}
+
+class FakeRequest:
+    def __init__(self, respond):
+        self.respond = respond
+
+    def execute(self):
+        return self.respond()
+
+class FakeCalendarService:
+    """
+    Stands in for the Calendar API client: events().list(...).execute().
+
+    Full listings are served page_limit items at a time with pageToken offsets; a syncToken
+    request returns the changes queued since that token in one page, or raises 410 if the
+    token was expired.
+    """
+    def __init__(self, events, page_limit=2):
+        self.listed = list(events)
+        self.page_limit = page_limit
+        self.changes = []
+        self.expired_tokens = set()
+        self.calls = []
+        self.token_count = 0
+
+    def new_sync_token(self):
+        self.token_count += 1
+        return f'token-{self.token_count}'
+
+    def events(self):
+        return self
+
+    def list(self, **params):
+        self.calls.append(params)
+        return FakeRequest(lambda: self.respond(params))
+
+    def respond(self, params):
+        if params.get('syncToken'):
+            if params['syncToken'] in self.expired_tokens:
+                raise HttpError(httplib2.Response({'status': 410}), b'{"error": {"message": "Sync token expired"}}')
+            changes, self.changes = self.changes, []
+            return {'items': changes, 'nextSyncToken': self.new_sync_token()}
+
+        offset = int(params.get('pageToken') or 0)
+        page_size = min(params['maxResults'], self.page_limit)
+        page = self.listed[offset:offset + page_size]
+        if offset + page_size < len(self.listed):
+            return {'items': page, 'nextPageToken': str(offset + page_size)}
+        return {'items': page, 'nextSyncToken': self.new_sync_token()}
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = time_totals.setup_database(tmp_path / 'dashboard_data.db')
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def service():
+    return FakeCalendarService([
+        make_event('a', START, 15, 60),
+        make_event('b', START, 15, 30),  # Inside 'a', counted once
+        make_event('c', START + datetime.timedelta(days=2), 16, 45),
+    ])
+
+def test_sweep_matches_calculate_event_hours_on_overlaps():
+    day, next_day = START, START + datetime.timedelta(days=1)
+    declined = {'attendees': [{'self': True, 'responseStatus': 'declined'}]}
+    events = [
+        make_event('outer', day, 15, 180),  # 9:00-12:00 local
+        make_event('nested', day, 16, 30),  # Inside 'outer'
+        make_event('same-start', day, 15, 60),  # Same start, shorter: sorted after 'outer'
+        make_event('partial', day, 17, 120),  # Runs 1h past 'outer'
+        make_event('chained', day, 19, 30),  # Starts when 'partial' ends
+        make_event('separate', day, 21, 15),
+        make_event('questionable', day, 22, 60, summary='Lunch TBD'),
+        make_event('declined', day, 23, 60, **declined),
+        {'id': 'all-day', 'summary': 'Holiday', 'start': {'date': day.isoformat()}, 'end': {'date': next_day.isoformat()}},
+        make_event('late', next_day, 4, 90),  # 22:00 local on `day`, ends after midnight: counted on its start date
+        make_event('next', next_day, 15, 45),
+        make_event('next-overlap', next_day, 15, 60),
+    ]
+
+    swept = time_totals.calculate_daily_event_minutes(events, day, next_day + datetime.timedelta(days=1))
+
+    for date in [day, next_day, next_day + datetime.timedelta(days=1)]:
+        assert swept[date] == time_totals.calculate_event_hours(events, date) * 60
+    assert swept[day] == 4 * 60 + 30 + 15 + 90  # 9:00-13:00, 13:00-13:30, 15:00-15:15, 22:00-23:30
+    assert swept[next_day] == 60
+
+def test_store_daily_totals_upserts_in_one_transaction(conn, monkeypatch):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    adapted = []  # Dates are written as ISO text: the registered date adapter must not run once per row
+    monkeypatch.setitem(sqlite3.adapters, (datetime.date, sqlite3.PrepareProtocol),
+                        lambda date: adapted.append(date) or date.isoformat())
+    days = [START + datetime.timedelta(days=x) for x in range(4)]
+
+    time_totals.store_daily_totals(conn, 'notion_tasks', {day: 10.0 for day in days[:3]})
+    time_totals.store_daily_totals(conn, 'notion_tasks', {days[1]: 0.0, days[3]: 40.0})  # Update one, insert one
+    assert adapted == []
+
+    _, notion_stored = time_totals.get_stored_data(conn, START, days[-1])
+    assert notion_stored == {days[0]: 10.0, days[1]: 0.0, days[2]: 10.0, days[3]: 40.0}
+    assert conn.execute("SELECT DISTINCT typeof(date) FROM notion_tasks").fetchall() == [('text',)]
+    assert conn.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+    assert sum(statement.startswith('COMMIT') for statement in statements) == 2  # One transaction per call
+
+def test_iter_calendar_event_pages_follows_page_tokens(service):
+    pages = list(time_totals.iter_calendar_event_pages(service, timeMin='2024-03-04T00:00:00Z'))
+
+    assert [len(page['items']) for page in pages] == [2, 1]
+    assert [call.get('pageToken') for call in service.calls] == [None, '2']
+    assert pages[-1]['nextSyncToken'] == 'token-1'
+
+def test_full_sync_pages_through_listing(conn, service):
+    totals = time_totals.sync_calendar_data(service, conn, START, END)
+
+    assert len(service.calls) == 2
+    assert totals[START] == 60
+    assert totals[START + datetime.timedelta(days=2)] == 45
+    assert totals[END] == 0
+    assert time_totals.get_sync_token(conn, 'calendar') == 'token-1'
+
+def test_incremental_sync_is_one_call(conn, service):
+    time_totals.sync_calendar_data(service, conn, START, END)
+    service.calls.clear()
+    service.changes = [make_event('c', START + datetime.timedelta(days=2), 16, 90),
+                       {'id': 'a', 'status': 'cancelled'}]
+
+    totals = time_totals.sync_calendar_data(service, conn, START, END)
+
+    assert len(service.calls) == 1
+    assert service.calls[0]['syncToken'] == 'token-1'
+    assert totals[START] == 30  # 'a' removed, 'b' left
+    assert totals[START + datetime.timedelta(days=2)] == 90
+    assert time_totals.get_sync_token(conn, 'calendar') == 'token-2'
+
+def test_expired_sync_token_falls_back_to_full_sync(conn, service):
+    time_totals.sync_calendar_data(service, conn, START, END)
+    service.calls.clear()
+    service.expired_tokens.add('token-1')
+    service.listed.append(make_event('d', END, 17, 15))
+
+    totals = time_totals.sync_calendar_data(service, conn, START, END)
+
+    assert [call.get('syncToken') for call in service.calls] == ['token-1', None, None]
+    assert totals[START] == 60
+    assert totals[END] == 15
+    assert time_totals.get_sync_token(conn, 'calendar') == 'token-2'
+
+def test_setup_database_keeps_existing_tables(tmp_path):
+    db_path = tmp_path / 'dashboard_data.db'
+    conn = time_totals.setup_database(db_path)
+    conn.execute('CREATE TABLE calendar_sync_events (event_id TEXT PRIMARY KEY, date DATE)')
+    conn.execute("INSERT INTO calendar_sync_events VALUES ('a', '2024-03-04')")
+    conn.commit()
+    conn.close()
+
+    conn = time_totals.setup_database(db_path)
+    assert conn.execute('SELECT COUNT(*) FROM calendar_sync_events').fetchone()[0] == 1
+    conn.close()
+
+def test_apply_calendar_changes_reports_old_and_new_dates(conn):
+    moved_from, moved_to = START, START + datetime.timedelta(days=3)
+    time_totals.apply_calendar_changes(conn, [make_event('a', moved_from, 15, 60), make_event('b', START, 18, 30)])
+
+    touched = time_totals.apply_calendar_changes(conn, [make_event('a', moved_to, 15, 60),
+                                                        {'id': 'b', 'status': 'cancelled'},
+                                                        {'id': 'unknown', 'status': 'cancelled'}])
+
+    assert touched == {moved_from, moved_to}
+    assert conn.execute('SELECT event_id FROM raw_events').fetchall() == [('a',)]
+
+def test_rebuild_folds_non_ascii_summaries_like_python(conn, monkeypatch):
+    # 'É' only folds with str.lower(); SQLite's lower() would leave it upper-case
+    monkeypatch.setattr(time_totals, 'QUESTIONABLE_WORDS', ['étude', 'prev complete'])
+    events = [make_event('a', START, 15, 60, summary='RÉVISION Prev Complete'),
+              make_event('b', START, 18, 30, summary='ÉTUDE'),
+              make_event('c', START, 20, 15, summary='Révision')]
+    time_totals.apply_calendar_changes(conn, events)
+
+    totals = time_totals.rebuild_calendar_totals(conn, START, START, questionable_words=time_totals.QUESTIONABLE_WORDS)
+
+    assert totals[START] == 15
+    assert totals[START] == time_totals.calculate_daily_event_minutes(events, START, START)[START]
+
+def test_setup_database_adds_summary_lower_to_old_raw_events(tmp_path):
+    db_path = tmp_path / 'dashboard_data.db'
+    old = time_totals.sqlite3.connect(db_path)
+    old.execute('CREATE TABLE raw_events (event_id TEXT PRIMARY KEY, summary TEXT, start_ts INTEGER, '
+                'end_ts INTEGER, self_declined INTEGER)')
+    old.execute("INSERT INTO raw_events VALUES ('a', 'Ünterricht', 0, 60, 0)")
+    old.commit()
+    old.close()
+
+    conn = time_totals.setup_database(db_path)
+    assert conn.execute('SELECT summary, summary_lower FROM raw_events').fetchall() == [('Ünterricht', 'ünterricht')]
+    conn.close()
+
+def make_task(task_id, day, minutes):
+    return {'id': task_id, 'properties': {'Due Date': {'date': {'start': day.isoformat()}},
+                                          'Time Block (Min)': {'number': minutes}}}
+
+def run_notion_app(handler, fetch):
+    """Serve a fake Notion query endpoint on localhost and run fetch(session, api_base) against it."""
+    async def run():
+        app = web.Application()
+        app.router.add_post('/databases/{database_id}/query', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        api_base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await fetch(session, api_base)
+        finally:
+            await runner.cleanup()
+    return asyncio.run(run())
+
+def test_aggregate_task_minutes_counts_each_task_once():
+    task_columns = {
+        'task_id': ['a', 'b', 'a', 'c', 'd', 'e', 'f'],
+        'date': ['2024-03-04', '2024-03-04T09:30:00.000-06:00', '2024-03-04', '2024-03-05', 'not a date', '2024-03-05', None],
+        'minutes': [30, 15.5, 30, 20, 10, 0, 5],  # 'a' came back in two overlapping chunks
+    }
+
+    daily_totals, task_rows = time_totals.aggregate_task_minutes(task_columns)
+
+    assert daily_totals == {START: 45.5, START + datetime.timedelta(days=1): 20}
+    assert task_rows == [('a', '2024-03-04', 30), ('b', '2024-03-04', 15.5), ('c', '2024-03-05', 20)]
+
+def test_failed_notion_chunk_is_reported_and_not_counted():
+    days = [START + datetime.timedelta(days=x) for x in range(10)]
+    tasks = [make_task(f'task-{i}', day, 30) for i, day in enumerate(days)]
+    broken_day = days[6].isoformat()
+
+    async def query(request):
+        date_filter = (await request.json())['filter']['and'][1]['date']
+        if date_filter['on_or_after'] <= broken_day <= date_filter['on_or_before']:
+            return web.json_response({'object': 'error'}, status=400)
+        return web.json_response({'has_more': False, 'results': [
+            task for task in tasks
+            if date_filter['on_or_after'] <= task['properties']['Due Date']['date']['start'] <= date_filter['on_or_before']]})
+
+    planner = time_totals.NotionChunkPlanner([(days[0], days[-1])], initial_days=5, min_days=5, max_days=5)
+    failed_ranges, task_rows = [], []
+    totals = run_notion_app(query, lambda session, api_base: time_totals.fetch_all_chunks(
+        {}, 'db', planner, task_rows, api_base=api_base, session=session, failed_ranges=failed_ranges))
+
+    assert failed_ranges == [(days[5], days[9])]
+    assert totals == {day: 30 for day in days[:5]}
+    assert len(task_rows) == 5
+
+def test_notion_chunk_retries_server_errors():
+    attempts = []
+
+    async def query(request):
+        attempts.append(request)
+        if len(attempts) == 1:
+            return web.json_response({'object': 'error'}, status=503)
+        return web.json_response({'has_more': False, 'results': [make_task('task-0', START, 45)]})
+
+    task_columns = {'task_id': [], 'date': [], 'minutes': []}
+    task_count = run_notion_app(query, lambda session, api_base: time_totals.fetch_chunk(
+        session, {}, 'db', START, END, time_totals.NotionRateController(), task_columns, api_base, retry_delay=0))
+
+    assert task_count == 1
+    assert len(attempts) == 2
+    assert task_columns['task_id'] == ['task-0']
+
+def test_store_notion_gaps_leaves_failed_days_unstored(conn):
+    task_rows = [('task-0', START.isoformat(), 30.0), ('task-1', END.isoformat(), 15.0)]
+    failed_day = START + datetime.timedelta(days=2)
+
+    stored = time_totals.store_notion_gaps(conn, [(START, END)], task_rows, [(failed_day, failed_day)])
+
+    assert failed_day not in stored
+    assert stored[START] == 30
+    assert stored[END] == 15
+    assert stored[START + datetime.timedelta(days=1)] == 0
+    _, notion_stored = time_totals.get_stored_data(conn, START, END)
+    assert sorted(notion_stored) == sorted(stored)
+
+def test_store_notion_gaps_assigns_rows_to_their_gap(conn):
+    second_start = START + datetime.timedelta(days=10)
+    task_rows = [('late', (second_start + datetime.timedelta(days=1)).isoformat(), 20.0),
+                 ('outside', (START + datetime.timedelta(days=6)).isoformat(), 99.0),
+                 ('early', START.isoformat(), 30.0),
+                 ('early-2', START.isoformat(), 5.0)]
+
+    stored = time_totals.store_notion_gaps(conn, [(START, END), (second_start, second_start + datetime.timedelta(days=2))],
+                                           task_rows)
+
+    assert stored[START] == 35
+    assert stored[second_start + datetime.timedelta(days=1)] == 20
+    assert START + datetime.timedelta(days=6) not in stored
+    assert conn.execute('SELECT COUNT(*) FROM raw_tasks').fetchone()[0] == 3
+
+def test_calendar_gaps_fetched_beside_notion(conn, monkeypatch):
+    # Non-incremental mode: the Calendar gaps and the Notion fetch must be in flight at the same time
+    both_started = threading.Barrier(2, timeout=5)
+
+    def fetch_calendar_data(service, gap_start, gap_end):
+        if gap_start == START:
+            both_started.wait()
+        return {gap_start + datetime.timedelta(days=x): 10.0 for x in range((gap_end - gap_start).days + 1)}
+
+    def fetch_notion(date_ranges, task_rows=None, failed_ranges=None):
+        both_started.wait()
+        return {}
+
+    monkeypatch.setattr(time_totals, 'get_calendar_service', lambda: object())
+    monkeypatch.setattr(time_totals, 'fetch_calendar_data', fetch_calendar_data)
+    monkeypatch.setattr(time_totals, 'fetch_local_completed_tasks_for_ranges', fetch_notion)
+
+    calendar_stored, notion_stored = time_totals.fetch_and_process_data(START, END, conn, incremental=False)
+
+    assert calendar_stored[END] == 10.0
+    assert notion_stored[END] == 0
+
+def test_endless_rate_limiting_fails_the_chunk():
+    attempts = []
+
+    async def query(request):
+        attempts.append(request)
+        return web.json_response({'object': 'error'}, status=429, headers={'Retry-After': '0'})
+
+    task_columns = {'task_id': [], 'date': [], 'minutes': []}
+    with pytest.raises(aiohttp.ClientResponseError) as error:
+        run_notion_app(query, lambda session, api_base: time_totals.fetch_chunk(
+            session, {}, 'db', START, END, time_totals.NotionRateController(), task_columns, api_base,
+            rate_limit_retries=3))
+
+    assert error.value.status == 429
+    assert len(attempts) == 4
+    assert task_columns['task_id'] == []